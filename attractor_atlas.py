@@ -0,0 +1,233 @@
+"""
+Precomputed atlas of all equilibria on a dense (fb, fd) lattice, with fast lookup and interpolation along branches
+
+Fig2a-c, Fig2d-e, Fig4, equilibrium_densities_stable_points.py and total_feedback.py all need the
+equilibria for the same values of farmer support. The atlas computes them once for a whole lattice
+(with equilibrium_enumeration.py, all lattice points in one batch) and stores for every lattice point
+and every equilibrium:
+- X -> coordinates PH, PS, CB, CG
+- stability -> code of the stability type (index into stability_names), n_unstable, dominant_eigenvalue
+- state -> basin label, 0 = grassy, 1 = encroached (PS > PS_threshold)
+
+Empty slots are nan (X, dominant_eigenvalue) or -1. The arrays are saved as .npy files in one directory
+and loaded memory-mapped, so that scripts only read the lattice points they use.
+
+Queries:
+- lookup() -> equilibria at the nearest lattice point (O(1), index arithmetic on the regular lattice)
+- interpolate() -> bilinear interpolation between the four surrounding lattice points, matching every
+  equilibrium to the closest one of the same kind (state label, number of unstable directions and extinct
+  populations) at the other lattice points, i.e. along its branch
+- warm_start() -> interpolated grassy or encroached attractor, as initial condition or instead of a long run
+
+Attractors that are not equilibria (limit cycles) are not contained in the atlas.
+
+Output: attractor_atlas/ and a comparison with simulated attractors (drought_resistance.find_attractors)
+"""
+
+import os
+import time
+
+import numpy as np
+
+import savanna_setup as ss
+import equilibrium_enumeration as ee
+
+#threshold for shrub density that separates grassy and encroached states
+PS_threshold = 1.3
+
+#stability types of stability_classification.stability_type(), in the order of the stored codes
+stability_names = ["stable node", "stable focus", "saddle", "unstable node", "unstable focus"]
+
+#names of the stored arrays
+fields = ['X', 'stability', 'n_unstable', 'dominant_eigenvalue', 'state']
+
+#-----------------------------------------------------------------------
+#Atlas
+#-----------------------------------------------------------------------
+class AttractorAtlas:
+
+    """
+    Equilibria on the regular lattice fb_vals x fd_vals. Every array has the shape (n_fb, n_fd, n_slots, ...),
+    with the equilibria of a lattice point sorted by PS.
+    """
+
+    def __init__(self, fb_vals, fd_vals, arrays):
+
+        self.fb_vals = np.asarray(fb_vals)
+        self.fd_vals = np.asarray(fd_vals)
+        self.arrays = arrays
+        self.n_slots = arrays['X'].shape[2]
+
+
+    @classmethod
+    def build(cls, fb_vals, fd_vals, params = None):
+
+        "Enumerates all equilibria for every lattice point (fb_vals and fd_vals must be evenly spaced)"
+
+        fb_vals = np.asarray(fb_vals, dtype = float)
+        fd_vals = np.asarray(fd_vals, dtype = float)
+        FB, FD = np.meshgrid(np.arange(len(fb_vals)), np.arange(len(fd_vals)), indexing = 'ij')
+        points = ee.enumerate_equilibria(fb_vals[FB.ravel()], fd_vals[FD.ravel()], params)
+
+        #lattice point and slot of every equilibrium
+        i = np.searchsorted(fb_vals, points['fb'].to_numpy())
+        j = np.searchsorted(fd_vals, points['fd'].to_numpy())
+        points = points.assign(i = i, j = j).sort_values(['i', 'j', 'PS'])
+        slot = points.groupby(['i', 'j']).cumcount().to_numpy()
+        i, j = points['i'].to_numpy(), points['j'].to_numpy()
+        n_slots = slot.max() + 1
+
+        shape = (len(fb_vals), len(fd_vals), n_slots)
+        arrays = {'X': np.full(shape + (4,), np.nan), 'stability': np.full(shape, -1, dtype = np.int8),
+                  'n_unstable': np.full(shape, -1, dtype = np.int8), 'dominant_eigenvalue': np.full(shape, np.nan),
+                  'state': np.full(shape, -1, dtype = np.int8)}
+        arrays['X'][i, j, slot] = points[ss.state_names].to_numpy()
+        arrays['stability'][i, j, slot] = [stability_names.index(name) for name in points['stability']]
+        arrays['n_unstable'][i, j, slot] = points['n_unstable'].to_numpy()
+        arrays['dominant_eigenvalue'][i, j, slot] = points['dominant_eigenvalue'].to_numpy()
+        arrays['state'][i, j, slot] = points['PS'].to_numpy() > PS_threshold
+
+        return cls(fb_vals, fd_vals, arrays)
+
+
+    def save(self, path):
+
+        "Saves the atlas as .npy files in the directory path"
+
+        os.makedirs(path, exist_ok = True)
+        np.save(os.path.join(path, 'fb_vals.npy'), self.fb_vals)
+        np.save(os.path.join(path, 'fd_vals.npy'), self.fd_vals)
+        for name in fields:
+            np.save(os.path.join(path, name + '.npy'), self.arrays[name])
+
+
+    @classmethod
+    def load(cls, path, mmap_mode = 'r'):
+
+        "Loads a saved atlas, memory-mapped by default"
+
+        arrays = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode = mmap_mode) for name in fields}
+        return cls(np.load(os.path.join(path, 'fb_vals.npy')), np.load(os.path.join(path, 'fd_vals.npy')), arrays)
+
+
+    def position(self, fb, fd):
+
+        "Continuous lattice coordinates of (fb, fd), clipped to the lattice"
+
+        u = (np.asarray(fb, dtype = float) - self.fb_vals[0])/(self.fb_vals[1] - self.fb_vals[0])
+        v = (np.asarray(fd, dtype = float) - self.fd_vals[0])/(self.fd_vals[1] - self.fd_vals[0])
+        return np.clip(u, 0, len(self.fb_vals) - 1), np.clip(v, 0, len(self.fd_vals) - 1)
+
+
+    def lookup(self, fb, fd, stable_only = True):
+
+        """
+        Equilibria at the lattice point nearest to (fb, fd), for arrays of queries.
+        Returns a dictionary with the stored arrays, each of shape fb.shape + (n_slots, ...);
+        with stable_only, slots of unstable equilibria are emptied.
+        """
+
+        u, v = self.position(fb, fd)
+        i, j = np.rint(u).astype(int), np.rint(v).astype(int)
+        result = {name: np.asarray(self.arrays[name][i, j]) for name in fields}
+        if stable_only:
+            result = empty_slots(result, result['n_unstable'] != 0)
+        return result
+
+
+    def interpolate(self, fb, fd, stable_only = True, max_jump = 0.2):
+
+        """
+        Equilibria at (fb, fd), interpolated bilinearly along their branches between the four surrounding lattice points.
+        The equilibria of the nearest lattice point are matched to the closest equilibrium of the same kind at the
+        other points (at most max_jump away). Equilibria without a match at all four points (close to a fold)
+        keep the values of the nearest lattice point. Returns a dictionary as lookup().
+        """
+
+        u, v = self.position(fb, fd)
+        i0 = np.minimum(np.floor(u).astype(int), len(self.fb_vals) - 2)
+        j0 = np.minimum(np.floor(v).astype(int), len(self.fd_vals) - 2)
+        du, dv = u - i0, v - j0
+
+        result = self.lookup(fb, fd, stable_only = False)
+        base = result['X']
+        base_extinct = base < ss.epsilon
+
+        X_new = np.zeros(base.shape)
+        matched = np.ones(base.shape[:-1], dtype = bool)
+        for di, dj, weight in [(0, 0, (1 - du)*(1 - dv)), (1, 0, du*(1 - dv)), (0, 1, (1 - du)*dv), (1, 1, du*dv)]:
+            corner = {name: np.asarray(self.arrays[name][i0 + di, j0 + dj]) for name in fields}
+            same_kind = (result['state'][..., :, None] == corner['state'][..., None, :]) & \
+                        (result['n_unstable'][..., :, None] == corner['n_unstable'][..., None, :]) & \
+                        np.all(base_extinct[..., :, None, :] == (corner['X'] < ss.epsilon)[..., None, :, :], axis = -1)
+            distance = np.linalg.norm(base[..., :, None, :] - corner['X'][..., None, :, :], axis = -1)
+            distance = np.where(same_kind & np.isfinite(distance), distance, np.inf)
+            nearest = np.argmin(distance, axis = -1)
+            matched &= np.take_along_axis(distance, nearest[..., None], axis = -1)[..., 0] < max_jump
+            X_new += np.asarray(weight)[..., None, None]*np.take_along_axis(corner['X'], nearest[..., None], axis = -2)
+
+        result['X'] = np.where(matched[..., None], X_new, base)
+        if stable_only:
+            result = empty_slots(result, result['n_unstable'] != 0)
+        return result
+
+
+    def warm_start(self, fb, fd, state = "grassy"):
+
+        "Interpolated stable equilibrium with the given label ('grassy' or 'encroached') at (fb, fd), nan where there is none"
+
+        result = self.interpolate(fb, fd)
+        present = result['state'] == ["grassy", "encroached"].index(state)
+        slot = np.argmax(present, axis = -1)
+        X = np.take_along_axis(result['X'], slot[..., None, None], axis = -2)[..., 0, :]
+        return np.where(np.any(present, axis = -1)[..., None], X, np.nan)
+
+
+def empty_slots(result, empty):
+
+    "Sets the slots marked in empty (shape (..., n_slots)) to nan or -1"
+
+    result = dict(result)
+    for name in fields:
+        fill = -1 if result[name].dtype.kind == 'i' else np.nan
+        mask = empty[..., None] if result[name].ndim > empty.ndim else empty
+        result[name] = np.where(mask, fill, result[name]).astype(result[name].dtype)
+    return result
+
+#-----------------------------------------------------------------------
+#Build the atlas for the parameter space of Fig. 2a-c
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+
+    import drought_resistance as dr
+
+    f_vals = np.linspace(0.0, 0.8, 81)
+
+    start = time.perf_counter()
+    AttractorAtlas.build(f_vals, f_vals).save("attractor_atlas")
+    print("atlas with {} lattice points: {:.1f} s".format(len(f_vals)**2, time.perf_counter() - start))
+
+    atlas = AttractorAtlas.load("attractor_atlas")
+    rng = np.random.default_rng(0)
+    fb, fd = rng.uniform(0, 0.8, (2, 100000))
+    start = time.perf_counter()
+    found = atlas.lookup(fb, fd)
+    print("100000 lookups: {:.3f} s, bistable at {:.1%} of the queries".format(
+        time.perf_counter() - start, np.mean(np.sum(found['n_unstable'] == 0, axis = -1) == 2)))
+
+    #attractors between the lattice points, compared with long simulations
+    fb_vals = np.linspace(0.3, 0.75, 40)
+    start = time.perf_counter()
+    grassy, encroached = dr.find_attractors(fb_vals)
+    time_simulation = time.perf_counter() - start
+    start = time.perf_counter()
+    grassy_atlas = atlas.warm_start(fb_vals, 0.0, "grassy")
+    encroached_atlas = atlas.warm_start(fb_vals, 0.0, "encroached")
+    time_atlas = time.perf_counter() - start
+
+    #in the monostable region, find_attractors returns the same state twice
+    error = np.nanmax(np.abs(np.concatenate([grassy_atlas - np.where((grassy[:, 1] > PS_threshold)[:, None], np.nan, grassy),
+                                              encroached_atlas - np.where((encroached[:, 1] > PS_threshold)[:, None], encroached, np.nan)])), axis = -1)
+    #the largest differences are found where a population goes extinct between two lattice points
+    print("attractors for 40 fb values: simulation {:.2f} s, atlas {:.4f} s, median difference {:.1e}, largest difference {:.1e}".format(
+        time_simulation, time_atlas, np.nanmedian(error), np.nanmax(error)))
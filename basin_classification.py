@@ -0,0 +1,223 @@
+"""
+Classification of trajectories by the basin of attraction they have entered
+
+Instead of integrating for a fixed time and asking where a trajectory ended up, every run is
+stopped as soon as it is inside a neighbourhood of a stable equilibrium from which it converges
+according to a sampled (heuristic) Lyapunov certificate.
+
+The neighbourhoods come from the linearisation: for the Jacobian J at a stable equilibrium x*,
+the Lyapunov equation J^T P + P J = -I gives the quadratic function V(x) = (x - x*)^T P (x - x*),
+which decreases along all trajectories close enough to x*. The largest level c for which
+dV/dt < 0 holds on sampled points of every level set V = c' <= c (with non-negative densities)
+is used as the size of the neighbourhood. Once V(x) < c, the run is labelled.
+
+The certificate is not a proof: dV/dt is only checked at n_samples points on each of the discrete
+levels, so states between the samples or between two levels are not covered.
+
+Output: comparison of classification times for the drought scenarios of Fig. 4
+"""
+
+import time
+
+import numpy as np
+
+import savanna_setup as ss
+
+#-----------------------------------------------------------------------
+#Neighbourhoods of stable equilibria
+#-----------------------------------------------------------------------
+def lyapunov_matrix(J):
+
+    "Solution P of J^T P + P J = -I for a stack of Jacobians J (shape (..., n, n))"
+
+    n = J.shape[-1]
+    eye = np.eye(n)
+    Jt = np.swapaxes(J, -1, -2)
+    #row-major vectorisation: vec(J^T P) = (J^T x I) vec(P), vec(P J) = (I x J^T) vec(P)
+    A = np.einsum('...ij,kl->...ikjl', Jt, eye) + np.einsum('ij,...kl->...ikjl', eye, Jt)
+    A = A.reshape(J.shape[:-2] + (n*n, n*n))
+    P = np.linalg.solve(A, np.broadcast_to(-eye.ravel(), J.shape[:-2] + (n*n,))[..., None])[..., 0]
+    P = P.reshape(J.shape)
+
+    return (P + np.swapaxes(P, -1, -2))/2
+
+
+def attraction_neighbourhood(x_eq, fb, fd, params = None, threshold = ss.epsilon, levels = np.geomspace(1e-8, 10, 50),
+                             n_samples = 500, seed = 0):
+
+    """
+    Quadratic neighbourhoods {V(x) < c} of a stack of equilibria x_eq (shape (..., 4)) in which dV/dt < 0
+    at all sampled points (n_samples per level, heuristic, not a rigorous bound). Populations below the extinction threshold are treated as frozen,
+    the neighbourhood then only contains states in which they are extinct as well.
+    Returns P (shape (..., 4, 4)) and c (shape x_eq.shape[:-1]). c = 0 for equilibria that are not stable.
+    """
+
+    x_eq = np.asarray(x_eq, dtype = float)
+    batch = x_eq.shape[:-1]
+    J = ss.jacobian_vec(x_eq, fb, fd, params)
+
+    #extinct populations stay extinct (extinction threshold), so only the surviving ones are perturbed
+    extinct = x_eq < threshold
+    J = np.where(extinct[..., :, None] | extinct[..., None, :], 0.0, J) - np.where(extinct, 1.0, 0.0)[..., None]*np.eye(4)
+    finite = np.all(np.isfinite(J), axis = (-1, -2))
+    J = np.where(finite[..., None, None], J, -np.eye(4))
+    stable = finite & (np.max(np.linalg.eigvals(J).real, axis = -1) < 0)
+    J = np.where(stable[..., None, None], J, -np.eye(4))
+
+    P = lyapunov_matrix(J)
+    L_inv_T = np.swapaxes(np.linalg.inv(np.linalg.cholesky(P)), -1, -2)
+
+    #points on the unit sphere, mapped onto the level sets V = level
+    rng = np.random.default_rng(seed)
+    u = rng.standard_normal((n_samples, 4))
+    u = u/np.linalg.norm(u, axis = -1, keepdims = True)
+    directions = np.where(extinct, 0.0, np.einsum('...ij,sj->s...i', L_inv_T, u))
+
+    c = np.zeros(batch)
+    ok = stable.copy()
+    fb_s = np.broadcast_to(fb, batch)[None]
+    fd_s = np.broadcast_to(fd, batch)[None]
+    for level in levels:
+        dx = np.sqrt(level)*directions
+        X = x_eq + dx
+        dV = 2*np.einsum('s...i,...ij,s...j->s...', dx, P, ss.savannas_vec(X, fb_s, fd_s, params, threshold))
+        #trajectories cannot leave the non-negative orthant, so points outside of it do not matter
+        violated = np.any((dV >= 0) & np.all(X >= 0, axis = -1), axis = 0)
+        ok = ok & ~violated
+        c = np.where(ok, level, c)
+        if not np.any(ok):
+            break
+
+    return P, c
+
+
+def attractor_set(attractors, fb, fd, params = None):
+
+    """
+    Equilibria (refined with Newton's method) and their neighbourhoods for a stack of attractor
+    estimates of shape (n, m, 4), e.g. end points of long simulations. Attractors that are not
+    stable equilibria (e.g. limit cycles) get a neighbourhood of size 0.
+    Returns a dictionary with the entries x_eq, P and c.
+    """
+
+    attractors = np.asarray(attractors, dtype = float)
+    fb = np.broadcast_to(np.asarray(fb, dtype = float)[..., None], attractors.shape[:-1])
+    fd = np.broadcast_to(np.asarray(fd, dtype = float)[..., None], attractors.shape[:-1])
+
+    x_eq, residual = ss.newton_vec(attractors, fb, fd, params)
+    converged = (residual < 1e-8) & np.all(x_eq >= 0, axis = -1) & \
+                (np.linalg.norm(x_eq - attractors, axis = -1) < 0.05*np.linalg.norm(attractors, axis = -1))
+    x_eq = np.where(converged[..., None], x_eq, attractors)
+
+    P, c = attraction_neighbourhood(x_eq, fb, fd, params)
+    c = np.where(converged, c, 0.0)
+
+    return {'x_eq': x_eq, 'P': P, 'c': c}
+
+
+def inside(X, attractors):
+
+    "V(x) < c (and the same populations extinct) for every attractor, X of shape (..., n, 4) -> array of shape (..., n, m)"
+
+    x_eq = attractors['x_eq']
+    extinct = x_eq < ss.epsilon
+    dx = np.where(extinct, 0.0, X[..., None, :] - x_eq)
+    V = np.einsum('...mi,...mij,...mj->...m', dx, attractors['P'], dx)
+    return (V < attractors['c']) & np.all((X[..., None, :] < ss.epsilon) | ~extinct, axis = -1)
+
+#-----------------------------------------------------------------------
+#Classification
+#-----------------------------------------------------------------------
+def classify_by_basin(X0, fb, fd, attractors, params = None, t_chunk = 10.0, n_out = 10, t_max = 2000.0):
+
+    """
+    Index of the attractor (from attractor_set(), shape (n, m, 4)) that every trajectory starting at X0
+    (shape (n, 4)) converges to. Runs are integrated in chunks (starting at t_chunk and doubling up to 100 time units,
+    with n_out output times each) and removed from the batch at the first output time at which they are inside
+    a neighbourhood. Runs that have not entered any neighbourhood at t_max are labelled by the closest attractor.
+    Returns the labels, the entry times (t_max for the fallback) and whether the label comes from the
+    sampled certificate (False for the fallback).
+    """
+
+    X = np.array(X0, dtype = float)
+    n = len(X)
+    fb = np.broadcast_to(np.asarray(fb, dtype = float), (n,))
+    fd = np.broadcast_to(np.asarray(fd, dtype = float), (n,))
+    labels = np.zeros(n, dtype = int)
+    entry_time = np.full(n, float(t_max))
+    sampled_certificate = np.zeros(n, dtype = bool)
+
+    #runs that start inside a neighbourhood
+    hit = inside(X, attractors)
+    done = hit.any(axis = -1)
+    labels[done] = np.argmax(hit[done], axis = -1)
+    entry_time[done] = 0.0
+    sampled_certificate[done] = True
+    open_runs = np.nonzero(~done)[0]
+
+    t = 0.0
+    chunk = t_chunk
+    while len(open_runs) > 0 and t < t_max:
+        t_out = np.linspace(0, min(chunk, t_max - t), n_out + 1)
+        sub = {key: value[open_runs] for key, value in attractors.items()}
+        traj = ss.integrate_vec(X[open_runs], t_out, fb[open_runs], fd[open_runs], params)
+
+        hit = inside(traj, sub)
+        entered = hit.any(axis = -1)
+        done = entered.any(axis = 0)
+        first = np.argmax(entered, axis = 0)
+
+        runs = open_runs[done]
+        labels[runs] = np.argmax(hit[first[done], np.nonzero(done)[0]], axis = -1)
+        entry_time[runs] = t + t_out[first[done]]
+        sampled_certificate[runs] = True
+
+        X[open_runs] = traj[-1]
+        t = t + t_out[-1]
+        chunk = min(2*chunk, 100.0)
+        open_runs = open_runs[~done]
+
+    distance = np.linalg.norm(X[open_runs, None, :] - attractors['x_eq'][open_runs], axis = -1)
+    labels[open_runs] = np.argmin(distance, axis = -1)
+
+    return labels, entry_time, sampled_certificate
+
+#-----------------------------------------------------------------------
+#Drought scenarios of Fig. 4: early exit versus full runs
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+
+    import drought_resistance as dr
+
+    fb_vals = np.linspace(0.3, 0.75, 40)
+    disturbance = np.linspace(0, 99, 40)
+    grassy, encroached = dr.find_attractors(fb_vals)
+    attractors = attractor_set(np.stack([grassy, encroached], axis = 1), fb_vals, 0.0)
+
+    x_ref = ss.integrate_vec(dr.x0_grassy, [0, 1000], 0.3, 0)[-1]
+    pre = ss.integrate_vec(np.broadcast_to(x_ref, (len(fb_vals), 4)), [0, 1000], fb_vals, 0)[-1]
+    FB, D = np.meshgrid(np.arange(len(fb_vals)), disturbance, indexing = 'ij')
+    X0 = dr.drought(pre[FB.ravel()], D.ravel())
+    sub = {key: value[FB.ravel()] for key, value in attractors.items()}
+
+    start = time.perf_counter()
+    labels, entry_time, sampled_certificate = classify_by_basin(X0, fb_vals[FB.ravel()], 0.0, sub)
+    time_early = time.perf_counter() - start
+
+    start = time.perf_counter()
+    X_end = ss.integrate_vec(X0, [0, 1000], fb_vals[FB.ravel()], 0.0)[-1]
+    time_full = time.perf_counter() - start
+
+    #as in Fig4, with output at every time unit
+    start = time.perf_counter()
+    ss.integrate_vec(X0, np.arange(0, 1000, 1.0), fb_vals[FB.ravel()], 0.0)
+    time_fig4 = time.perf_counter() - start
+    labels_full = np.argmin(np.linalg.norm(X_end[:, None, :] - sub['x_eq'], axis = -1), axis = -1)
+
+    #in the monostable region both attractors are the same state
+    rows = np.arange(len(X0))
+    same = np.linalg.norm(sub['x_eq'][rows, labels] - sub['x_eq'][rows, labels_full], axis = -1) < 1e-6
+
+    print("early exit: {:.1f} s, full runs: {:.1f} s, full runs with output as in Fig4: {:.1f} s".format(time_early, time_full, time_fig4))
+    print("median entry time: {:.0f}, labelled by the sampled certificate: {:.1%}, agreement with full runs: {:.1%}".format(
+        np.median(entry_time), sampled_certificate.mean(), np.mean(same)))
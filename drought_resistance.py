@@ -0,0 +1,121 @@
+"""
+Critical drought severity for every level of farmer support fb, found by bisection
+
+Fig4_resistance_to_drought_heatmap.py scans 40 drought severities for every fb value.
+Here the drought severity d at which the state after the drought switches from the grassy
+to the encroached basin is bracketed and bisected instead, for all fb values at once.
+Runs are stopped as soon as they have entered a neighbourhood of one of the two attractors in which
+a sampled Lyapunov certificate indicates convergence (see basin_classification.py).
+
+A drought of severity d kills d% of grass biomass and d/5% of shrub biomass (as in Fig4).
+
+Output: critical_disturbance.csv and a plot of the resistance curve
+"""
+
+import numpy as np
+import pandas as pd
+from matplotlib import pyplot as plt
+
+import savanna_setup as ss
+import basin_classification as bc
+
+#initial conditions that lead to the grassy and the encroached state (same as in Fig1b_example_timeseries.py)
+x0_grassy = [1.0, 0.2, 0.5, 0.1]
+x0_encroached = [0.2, 1.0, 0.1, 0.5]
+
+#threshold for shrub density that separates grassy and encroached states
+PS_threshold = 1.3
+
+#-----------------------------------------------------------------------
+#Define functions
+#-----------------------------------------------------------------------
+def find_attractors(fb_vals, fd = 0.0, t_end = 3000):
+
+    """
+    Grassy and encroached attractor for every fb value (arrays of shape (n_fb, 4)).
+    If the system is monostable, both arrays contain the same state.
+    """
+
+    x0 = np.array([x0_grassy, x0_encroached])[None, :, :]
+    X = ss.integrate_vec(x0, [0, t_end], np.asarray(fb_vals, dtype = float)[:, None], fd)[-1]
+
+    return X[:, 0], X[:, 1]
+
+
+def drought(X, d):
+
+    "State directly after a drought of severity d (in %)"
+
+    d = np.asarray(d, dtype = float)
+    return X*np.stack(np.broadcast_arrays(1 - d/100, 1 - d/500, np.ones_like(d), np.ones_like(d)), axis = -1)
+
+
+def classify_outcome(X0, fb, fd, attractors, t_max = 2000):
+
+    """
+    Label (True = encroached) of the attractor that the trajectories starting at X0 (shape (n, 4)) end up in.
+    attractors is the output of basin_classification.attractor_set() for the grassy and the encroached state.
+    Runs are stopped as soon as they are inside the sampled Lyapunov neighbourhood of one of the attractors.
+    Returns the labels and the time at which each run was classified.
+    """
+
+    labels, entry_time, _ = bc.classify_by_basin(X0, fb, fd, attractors, t_max = t_max)
+
+    return labels == 1, entry_time
+
+
+def critical_disturbance(fb_vals, fd = 0.0, bracket = (0.0, 99.9), tol = 0.1, x_start = None):
+
+    """
+    Drought severity (in %) at which the post-drought state switches basin, for all fb values.
+
+    The pre-drought state is reached from x_start (by default the end point of a reference run at fb = 0.3,
+    as in Fig4). nan is returned where the system is monostable, where it is already encroached before
+    the drought, or where even the strongest drought in the bracket does not cause a transition.
+    """
+
+    fb_vals = np.asarray(fb_vals, dtype = float)
+    n = len(fb_vals)
+    grassy, encroached = find_attractors(fb_vals, fd)
+    bistable = np.linalg.norm(grassy - encroached, axis = -1) > 1e-3
+    attractors = bc.attractor_set(np.stack([grassy, encroached], axis = 1), fb_vals, fd)
+
+    if x_start is None:
+        x_start = ss.integrate_vec(x0_grassy, [0, 1000], 0.3, fd)[-1]
+    pre = ss.integrate_vec(np.broadcast_to(x_start, (n, 4)), [0, 1000], fb_vals, fd)[-1]
+    pre_label, _ = classify_outcome(pre, fb_vals, fd, attractors)
+    pre_label = np.where(bistable, pre_label, pre[:, 1] > PS_threshold)
+
+    #check both ends of the bracket
+    low = np.full(n, bracket[0])
+    high = np.full(n, bracket[1])
+    label_high, _ = classify_outcome(drought(pre, high), fb_vals, fd, attractors)
+    valid = bistable & ~pre_label & label_high
+
+    #bisection, all fb values at once
+    idx = np.nonzero(valid)[0]
+    while len(idx) > 0 and np.max(high[idx] - low[idx]) > tol:
+        mid = (low[idx] + high[idx])/2
+        label, _ = classify_outcome(drought(pre[idx], mid), fb_vals[idx], fd, {key: value[idx] for key, value in attractors.items()})
+        high[idx] = np.where(label, mid, high[idx])
+        low[idx] = np.where(label, low[idx], mid)
+
+    critical = np.where(valid, (low + high)/2, np.nan)
+
+    return pd.DataFrame({'fb': fb_vals, 'critical_disturbance': critical, 'bistable': bistable,
+                         'encroached_before_drought': pre_label})
+
+#-----------------------------------------------------------------------
+#Resistance curve
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+
+    results = critical_disturbance(np.linspace(0.0, 0.8, 401))
+    results.to_csv("critical_disturbance.csv")
+
+    fig = plt.figure(figsize = (8, 5))
+    plt.plot(results['fb'], results['critical_disturbance'], 'k-')
+    plt.xlabel('farmer support $f_{b}$', fontsize = 20)
+    plt.ylabel('critical severity of drought $d$', fontsize = 20)
+    plt.tight_layout()
+    fig.savefig("output/critical_disturbance.png", dpi = 300)
@@ -0,0 +1,295 @@
+"""
+Streaming early-warning indicators for approaching transitions from the grassy to the encroached state
+
+The indicators are updated with every new time step, with constant cost and memory per step
+(exponentially weighted moments instead of stored windows):
+- variance
+- lag-1 autocorrelation
+- skewness
+- recovery rate after each drought pulse
+
+All indicators work on whole ensembles at once (one value per member).
+Kendall's tau of the recorded indicator values tests for increasing trends.
+
+Input: output of simulate_droughts() (Fig3_timeseries_transitions.py), any stored simulation,
+or the stochastic ensembles of stochastic_rainfall.py (via the callback argument of simulate_ensemble).
+
+Output (run as a script): checks of the recovery rate and of Kendall's tau against analytic values and scipy,
+and the indicators of the drought scenario of Fig. 3a and of a stochastic ensemble
+"""
+
+import numpy as np
+from scipy.stats import norm
+
+#-----------------------------------------------------------------------
+#Define functions
+#-----------------------------------------------------------------------
+class StreamingIndicators:
+
+    """
+    Exponentially weighted indicators of one observable for a batch of time series.
+
+    shape -> shape of the batch (e.g. (n_members,) or () for a single time series)
+    halflife -> number of time steps after which the weight of an observation has halved
+    recovery_lag -> number of time steps after a drought pulse at which the recovery rate is measured
+    dt -> time between two updates (only used to scale the recovery rate)
+    """
+
+    def __init__(self, shape = (), halflife = 100, recovery_lag = 20, dt = 1.0):
+
+        self.alpha = 1 - 0.5**(1/halflife)
+        self.recovery_lag = recovery_lag
+        self.dt = dt
+
+        self.n = 0
+        self.reference = np.zeros(shape)     # first observation, subtracted to avoid cancellation
+        self.m1 = np.zeros(shape)            # weighted moments of x
+        self.m2 = np.zeros(shape)
+        self.m3 = np.zeros(shape)
+        self.lag_m1 = np.zeros(shape)        # weighted moments of the previous value
+        self.lag_m2 = np.zeros(shape)
+        self.cross = np.zeros(shape)         # weighted mean of x_t*x_(t-1)
+        self.previous = np.zeros(shape)
+
+        self.steps_since_pulse = np.full(shape, -1)
+        self.baseline = np.zeros(shape)
+        self.deviation_0 = np.zeros(shape)
+        self.recovery_rate = np.full(shape, np.nan)
+
+    def update(self, x):
+
+        "Adds the next value of every time series in the batch"
+
+        x = np.asarray(x, dtype = float)
+        if self.n == 0:
+            self.reference = x.copy()
+        y = x - self.reference
+        a = self.alpha
+
+        if self.n > 0:
+            self.lag_m1 += a*(self.previous - self.lag_m1)
+            self.lag_m2 += a*(self.previous**2 - self.lag_m2)
+            self.cross += a*(y*self.previous - self.cross)
+        else:
+            self.lag_m1 = y.copy()
+            self.lag_m2 = y**2
+            self.cross = y**2
+
+        if self.n > 0:
+            self.m1 += a*(y - self.m1)
+            self.m2 += a*(y**2 - self.m2)
+            self.m3 += a*(y**3 - self.m3)
+        else:
+            self.m1, self.m2, self.m3 = y.copy(), y**2, y**3
+
+        self.previous = y
+        self.n += 1
+
+        #recovery after the last drought pulse (the value passed to pulse() is step 0)
+        waiting = self.steps_since_pulse >= 0
+        done = self.steps_since_pulse == self.recovery_lag
+        if np.any(done):
+            deviation = np.abs(x - self.baseline)
+            with np.errstate(divide = 'ignore', invalid = 'ignore'):
+                rate = np.log(self.deviation_0/deviation)/(self.recovery_lag*self.dt)
+            self.recovery_rate = np.where(done, rate, self.recovery_rate)
+        self.steps_since_pulse = np.where(waiting & ~done, self.steps_since_pulse + 1, -1)
+
+    def pulse(self, x_after, members = None):
+
+        """
+        Registers a drought pulse. x_after is the value directly after the pulse, which is passed to update() next;
+        the current weighted mean is taken as the pre-drought baseline.
+        members -> boolean mask of the members that experienced the pulse (default: all)
+        """
+
+        x_after = np.asarray(x_after, dtype = float)
+        mask = np.ones(self.m1.shape, dtype = bool) if members is None else np.asarray(members)
+        baseline = self.m1 + self.reference
+        self.baseline = np.where(mask, baseline, self.baseline)
+        self.deviation_0 = np.where(mask, np.abs(x_after - baseline), self.deviation_0)
+        self.steps_since_pulse = np.where(mask, 0, self.steps_since_pulse)
+
+    @property
+    def mean(self):
+        return self.m1 + self.reference
+
+    @property
+    def variance(self):
+        return np.maximum(self.m2 - self.m1**2, 0)
+
+    @property
+    def autocorrelation(self):
+        cov = self.cross - self.m1*self.lag_m1
+        var_lag = np.maximum(self.lag_m2 - self.lag_m1**2, 0)
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            return cov/np.sqrt(self.variance*var_lag)
+
+    @property
+    def skewness(self):
+        third = self.m3 - 3*self.m1*self.m2 + 2*self.m1**3
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            return third/self.variance**1.5
+
+    def values(self):
+
+        "All indicators as a dictionary"
+
+        return {'variance': self.variance, 'autocorrelation': self.autocorrelation,
+                'skewness': self.skewness, 'recovery_rate': self.recovery_rate}
+
+
+def kendall_trend(series, chunk = 256):
+
+    """
+    Kendall's tau (tau-a) and a two-sided p-value (normal approximation) for the trend of every
+    series along the last axis. Works for a whole batch of indicator series (shape (..., T)) at once.
+    nan values are ignored. The pairs are counted in blocks of chunk rows, so memory grows with chunk*T.
+    """
+
+    series = np.asarray(series, dtype = float)
+    T = series.shape[-1]
+    valid = ~np.isnan(series)
+
+    #sum of sign(x_j - x_i) over i < j, pairs with a nan value count 0
+    S = np.zeros(series.shape[:-1])
+    for start in range(0, T, chunk):
+        rows = np.arange(start, min(start + chunk, T))
+        diff = series[..., None, :] - series[..., rows, None]            # x_j - x_i
+        upper = np.arange(T) > rows[:, None]
+        S += np.sum(np.where(upper, np.sign(np.nan_to_num(diff)), 0), axis = (-2, -1))
+    n = valid.sum(axis = -1)
+    n_pairs = n*(n - 1)/2
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        tau = S/n_pairs
+        z = S/np.sqrt(n*(n - 1)*(2*n + 5)/18)
+    p = 2*norm.sf(np.abs(z))
+
+    return tau, p
+
+
+def indicators_from_series(N, variable = 1, pulse_indices = (), halflife = 100, recovery_lag = 20, record_every = 10, dt = 1.0):
+
+    """
+    Streams a stored simulation N (shape (T, ..., 4), e.g. the output of simulate_droughts) through the indicators.
+    variable -> index of the state variable to monitor (1 = shrubs)
+    pulse_indices -> rows of N directly after a drought pulse
+    dt -> time between two rows of N (the recovery rate is per time unit)
+
+    Returns the recording times (in rows) and a dictionary of indicator series (shape (n_records, ...)).
+    """
+
+    N = np.asarray(N, dtype = float)
+    indicators = StreamingIndicators(N.shape[1:-1], halflife, recovery_lag, dt)
+    pulse_indices = set(pulse_indices)
+
+    times = []
+    records = {name: [] for name in ['variance', 'autocorrelation', 'skewness', 'recovery_rate']}
+
+    for t in range(N.shape[0]):
+        x = N[t, ..., variable]
+        if t in pulse_indices:
+            indicators.pulse(x)
+        indicators.update(x)
+
+        if t % record_every == 0:
+            times.append(t)
+            for name, value in indicators.values().items():
+                records[name].append(np.copy(value))
+
+    return np.array(times), {name: np.array(values) for name, values in records.items()}
+
+
+def score_ensemble(records, start = 0):
+
+    """
+    Kendall's tau of the variance and autocorrelation series of every member, from record index start on.
+    Returns a dictionary with (tau, p) for both indicators.
+    """
+
+    return {name: kendall_trend(np.moveaxis(records[name][start:], 0, -1)) for name in ['variance', 'autocorrelation']}
+
+
+def check_indicators(rate = 0.1, recovery_lag = 20, dt = 0.5, seed = 0):
+
+    """
+    Checks against known answers: exponential recovery x(t) = baseline + d0*exp(-rate*t) after a pulse must give
+    recovery_rate = rate, and kendall_trend must agree with scipy.stats.kendalltau (series without ties, where
+    tau-a = tau-b). Returns the largest errors of both.
+    """
+
+    from scipy.stats import kendalltau
+
+    baseline = np.array([1.0, 2.0, 3.0])
+    d0 = np.array([0.5, -1.0, 0.01])
+    indicators = StreamingIndicators(baseline.shape, recovery_lag = recovery_lag, dt = dt)
+    for k in range(200):
+        indicators.update(baseline)
+    for k in range(2*recovery_lag):
+        x = baseline + d0*np.exp(-rate*k*dt)
+        if k == 0:
+            indicators.pulse(x)
+        indicators.update(x)
+    error_rate = np.max(np.abs(indicators.recovery_rate - rate))
+
+    rng = np.random.default_rng(seed)
+    series = np.cumsum(rng.normal(size = (5, 600)), axis = -1) + 0.01*np.arange(600)
+    tau, p = kendall_trend(series, chunk = 64)
+    reference = np.array([kendalltau(np.arange(600), x) for x in series])
+    error_tau = np.max(np.abs(np.stack([tau, p], axis = -1) - reference))
+
+    return error_rate, error_tau
+
+#-----------------------------------------------------------------------
+#Checks, and indicators of simulated droughts and of a stochastic ensemble
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+
+    import parareal as pr
+    import stochastic_rainfall as sr
+
+    error_rate, error_tau = check_indicators()
+    print("largest error of the recovery rate: {:.1e}, of Kendall's tau and p: {:.1e}".format(error_rate, error_tau))
+
+    #drought scenario of Fig. 3a (output of simulate_droughts, one row per time unit)
+    f_values = [0, 0, 0.35, 0.35, 0, 0]
+    d_values = [0.95, 0, 0.95, 0, 0, 0]
+    introduce_browsers = [0, 0, 0, 0, 1, 0]
+    season_length = 1000
+    N = pr.simulate_droughts_serial(len(f_values), season_length, [1.0, 0.2, 0.5, 0.1], f_values, d_values, introduce_browsers)
+
+    #the state after a pulse is stored twice (end of a section, start of the next), the second row starts the recovery
+    pulses = [(k + 1)*(season_length + 1) + 1 for k in range(len(f_values) - 1) if d_values[k] > 0]
+    #grasses, which lose 95% in a drought and then grow back
+    times, records = indicators_from_series(N, 0, pulses, recovery_lag = 20, record_every = 1, dt = 1.0)
+    for row in pulses:
+        print("grasses, drought at row {}: recovery rate {:.4f}".format(row, records['recovery_rate'][row + 20]))
+    for name, (tau, p) in score_ensemble(records).items():
+        print("grasses, trend of the {} over the scenario: tau = {:.2f}, p = {:.1e}".format(name, tau, p))
+
+    #stochastic ensemble at fb = 0.35, indicators updated with every step of the integrator
+    n_members = 200
+    dt = 0.05
+    record_stride = int(round(10/dt))
+    indicators = StreamingIndicators((n_members,), halflife = int(round(50/dt)), dt = dt)
+    ensemble_records = {'variance': [], 'autocorrelation': []}
+
+    def callback(t, X):
+        indicators.update(X[:, 1])
+        if int(round(t/dt)) % record_stride == 0:
+            for name in ensemble_records:
+                ensemble_records[name].append(getattr(indicators, name))
+
+    result = sr.simulate_ensemble([1.2, 0.64, 0.29, 1.45], n_members, 500, 0.35, sigma_H = 0.2, sigma_S = 0.2, rho = 0.5,
+                                  dt = dt, seed = 1, callback = callback)
+
+    #only the records before the first passage into the encroached state count
+    record_times = record_stride*dt*np.arange(1, len(ensemble_records['variance']) + 1)
+    before = ~(record_times[:, None] >= result['first_passage'][None, :])
+    ensemble_records = {name: np.where(before, np.array(values), np.nan) for name, values in ensemble_records.items()}
+    scores = score_ensemble(ensemble_records, start = 5)
+    tipped = ~np.isnan(result['first_passage'])
+    for name, (tau, p) in scores.items():
+        print("ensemble, {}: median tau {:.2f} for {} members that tip, {:.2f} for {} that do not".format(
+            name, np.nanmedian(tau[tipped]), tipped.sum(), np.nanmedian(tau[~tipped]), (~tipped).sum()))
@@ -0,0 +1,201 @@
+"""
+Enumerates all equilibria of the model without time integration
+
+For fixed plant densities, the consumer equations have the solutions CB = 0 or
+CB = (e*(FHB + FSB) - mb)/md, and CG = 0 or CG = (e*(FHG + FSG) - mb*(1-fb))/(md*(1-fd)).
+Similarly, every plant equation is PH * (per capita growth rate) = 0. Each combination of
+present and absent populations ("branch") therefore leaves a root problem in (PH, PS) only:
+- present plants -> per capita growth rate = 0
+- absent plants -> density = 0
+
+For every branch, both residuals are evaluated on a grid over [0, KH] x [0, KS]. Newton's method
+is started in every grid cell in which both residuals change sign, and the roots are polished
+with the full 4-D Newton method. This gives all equilibria, including unstable points and boundary
+points with extinct populations, for a whole array of fb values at once.
+
+Output: all_equilibria.csv and the full equilibrium structure of Fig. 2d-e
+"""
+
+import itertools
+import time
+
+import numpy as np
+import pandas as pd
+from matplotlib import pyplot as plt
+
+import savanna_setup as ss
+import stability_classification as sc
+
+#all combinations of present (True) and absent (False) populations, in the order PH, PS, CB, CG
+branches = list(itertools.product([True, False], repeat = 4))
+
+#-----------------------------------------------------------------------
+#Reduced equations
+#-----------------------------------------------------------------------
+def consumer_densities(PH, PS, fb, fd, browsers = True, grazers = True, params = None):
+
+    "Non-trivial consumer equilibria for given plant densities (0 for absent consumers). Can be negative."
+
+    p = ss.get_parameters(params)
+    FHB = (p['a'] * PH * p['pHB'])/(1 + p['a'] * p['h'] * PH * p['pHB'])
+    FHG = (p['a'] * PH * p['pHG'])/(1 + p['a'] * p['h'] * PH * p['pHG'])
+    FSB = (p['a'] * PS * p['pSB'])/(1 + p['a'] * p['h'] * PS * p['pSB'])
+    FSG = (p['a'] * PS * p['pSG'])/(1 + p['a'] * p['h'] * PS * p['pSG'])
+
+    CB = (p['e']*(FHB + FSB) - p['mb'])/p['md'] if browsers else 0.0*PH
+    CG = (p['e']*(FHG + FSG) - p['mb']*(1-fb))/(p['md']*(1-fd)) if grazers else 0.0*PH
+
+    return CB, CG
+
+
+def reduced_residual(PH, PS, fb, fd, branch, params = None):
+
+    "Residuals of the 2-D root problem of one branch, shape PH.shape + (2,)"
+
+    p = ss.get_parameters(params)
+    CB, CG = consumer_densities(PH, PS, fb, fd, branch[2], branch[3], params)
+
+    #per capita growth rates of the plants (the plant equations divided by PH and PS)
+    gH = p['rH'] * (1 - (PH + p['c']*PS)/p['KH']) - p['a']*p['pHB']*CB/(1 + p['a']*p['h']*PH*p['pHB']) \
+         - p['a']*p['pHG']*CG/(1 + p['a']*p['h']*PH*p['pHG'])
+    gS = p['rS'] * (1 - (PS + p['c']*PH)/p['KS']) - p['a']*p['pSB']*CB/(1 + p['a']*p['h']*PS*p['pSB']) \
+         - p['a']*p['pSG']*CG/(1 + p['a']*p['h']*PS*p['pSG'])
+
+    return np.stack(np.broadcast_arrays(gH if branch[0] else PH, gS if branch[1] else PS), axis = -1)
+
+
+def newton_2d(PH, PS, fb, fd, branch, params = None, tol = 1e-12, max_iter = 30, step = 1e-7):
+
+    "Newton's method for the reduced problem of one branch, for 1-D arrays of starting points"
+
+    x = np.stack([PH, PS], axis = -1)
+    for i in range(max_iter):
+        G = reduced_residual(x[:, 0], x[:, 1], fb, fd, branch, params)
+        if np.all(np.abs(G) < tol):
+            break
+        #finite difference Jacobian of the reduced problem
+        J = np.stack([(reduced_residual(x[:, 0] + step, x[:, 1], fb, fd, branch, params) - G)/step,
+                      (reduced_residual(x[:, 0], x[:, 1] + step, fb, fd, branch, params) - G)/step], axis = -1)
+        #Cramer's rule for the 2x2 systems
+        det = J[:, 0, 0]*J[:, 1, 1] - J[:, 0, 1]*J[:, 1, 0]
+        with np.errstate(all = 'ignore'):
+            dx = np.stack([J[:, 1, 1]*G[:, 0] - J[:, 0, 1]*G[:, 1], J[:, 0, 0]*G[:, 1] - J[:, 1, 0]*G[:, 0]], axis = -1)/det[:, None]
+        x = np.where(np.isfinite(dx), x - dx, x)
+
+    return x[:, 0], x[:, 1]
+
+#-----------------------------------------------------------------------
+#Enumeration
+#-----------------------------------------------------------------------
+def sign_change_cells(G):
+
+    """
+    Grid cells (corner index) in which both residuals change sign, for residuals G of shape (n, n_PH, n_PS, 2).
+    Axes of length 1 (absent plants) are not split into cells.
+    """
+
+    lo = hi = np.sign(G).astype(np.int8)
+    if G.shape[1] > 1:
+        lo, hi = np.minimum(lo[:, :-1], lo[:, 1:]), np.maximum(hi[:, :-1], hi[:, 1:])
+    if G.shape[2] > 1:
+        lo, hi = np.minimum(lo[:, :, :-1], lo[:, :, 1:]), np.maximum(hi[:, :, :-1], hi[:, :, 1:])
+
+    return np.nonzero(np.all((lo <= 0) & (hi >= 0), axis = -1))
+
+
+def enumerate_equilibria(fb_vals, fd = 0.0, params = None, grid = (50, 75), chunk_size = 100, tol = 1e-9):
+
+    """
+    All non-negative equilibria for every value of fb_vals. fd can be a scalar or an array of the same length
+    (e.g. fd = fb_vals for the second column of Fig. 2d-e). Parameter values must be scalars.
+
+    Returns a data frame with one row per equilibrium and the columns fb, fd, PH, PS, CB, CG, n_extinct,
+    together with the stability columns of stability_classification.classify_equilibria().
+    """
+
+    p = ss.get_parameters(params)
+    fb_vals = np.atleast_1d(np.asarray(fb_vals, dtype = float))
+    fd_vals = np.broadcast_to(np.asarray(fd, dtype = float), fb_vals.shape)
+
+    found = []
+    for start in range(0, len(fb_vals), chunk_size):
+        fb_chunk = fb_vals[start:start + chunk_size]
+        fd_chunk = fd_vals[start:start + chunk_size]
+
+        for branch in branches:
+            PH_grid = np.linspace(0, p['KH'], grid[0]) if branch[0] else np.zeros(1)
+            PS_grid = np.linspace(0, p['KS'], grid[1]) if branch[1] else np.zeros(1)
+            PH, PS = np.meshgrid(PH_grid, PS_grid, indexing = 'ij')
+
+            #without grazers, the branch does not depend on fb and fd
+            n = len(fb_chunk) if branch[3] else 1
+            G = reduced_residual(PH[None], PS[None], fb_chunk[:n, None, None], fd_chunk[:n, None, None], branch, params)
+            k, i, j = sign_change_cells(G)
+            if len(k) == 0:
+                continue
+
+            #start Newton in the centre of every candidate cell, several cells can lead to the same root
+            PH0 = (PH_grid[i] + PH_grid[np.minimum(i + 1, len(PH_grid) - 1)])/2
+            PS0 = (PS_grid[j] + PS_grid[np.minimum(j + 1, len(PS_grid) - 1)])/2
+            PH_eq, PS_eq = newton_2d(PH0, PS0, fb_chunk[k], fd_chunk[k], branch, params)
+            roots = np.unique(np.column_stack([k, np.round(PH_eq, 8), np.round(PS_eq, 8)]), axis = 0)
+            if n == 1:
+                roots = np.column_stack([np.repeat(np.arange(len(fb_chunk)), len(roots)), np.tile(roots[:, 1:], (len(fb_chunk), 1))])
+
+            k = roots[:, 0].astype(int)
+            CB_eq, CG_eq = consumer_densities(roots[:, 1], roots[:, 2], fb_chunk[k], fd_chunk[k], branch[2], branch[3], params)
+            found.append(np.column_stack([start + k, roots[:, 1], roots[:, 2], CB_eq, CG_eq]))
+
+    found = np.concatenate(found)
+    idx = found[:, 0].astype(int)
+    X = found[:, 1:]
+
+    #polish with the full system and keep non-negative, converged points
+    X, _ = ss.newton_vec(X, fb_vals[idx], fd_vals[idx], params)
+    residual = np.max(np.abs(ss.savannas_vec(X, fb_vals[idx], fd_vals[idx], params, threshold = None)), axis = -1)
+    keep = (residual < tol) & np.all(X > -1e-9, axis = -1)
+    X = np.maximum(X[keep], 0.0)
+    idx = idx[keep]
+
+    #the same equilibrium can be found from several cells and branches
+    points = pd.DataFrame(X, columns = ss.state_names)
+    points.insert(0, 'fd', fd_vals[idx])
+    points.insert(0, 'fb', fb_vals[idx])
+    rounded = pd.DataFrame(np.round(X, 6), columns = ss.state_names)
+    rounded['fb'] = idx
+    points = points.loc[~rounded.duplicated().to_numpy()]
+    points['n_extinct'] = np.sum(points[ss.state_names].to_numpy() < ss.epsilon, axis = -1)
+
+    points = sc.classify_equilibria(points.sort_values(['fb', 'PS'], ignore_index = True), params = params)
+
+    return points
+
+#-----------------------------------------------------------------------
+#Full equilibrium structure of Fig. 2d-e
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+
+    f_list = np.arange(0.0, 0.8, 0.001)
+
+    start = time.perf_counter()
+    points_fb = enumerate_equilibria(f_list, 0.0)
+    points_fb_fd = enumerate_equilibria(f_list, f_list)
+    print("enumeration time: {:.2f} s".format(time.perf_counter() - start))
+
+    points_fb['variant'] = "fb"
+    points_fb_fd['variant'] = "fb_fd"
+    pd.concat([points_fb, points_fb_fd], ignore_index = True).to_csv("all_equilibria.csv")
+
+    label_size = 20
+    fig = plt.figure(figsize = (18, 10))
+    for col, (points, xlabel) in enumerate([(points_fb, "farmer support $f_b$"), (points_fb_fd, "farmer support $f_b$, $f_d$")]):
+        stable = points['n_unstable'] == 0
+        for row, (var, name) in enumerate([('PS', 'Shrubs ($P_S$)'), ('PH', 'Grasses ($P_H$)')]):
+            ax = fig.add_subplot(2, 2, 2*row + col + 1)
+            ax.plot(points.loc[stable, 'fb'], points.loc[stable, var], 'k.', markersize = 2, label = 'stable')
+            ax.plot(points.loc[~stable, 'fb'], points.loc[~stable, var], '.', color = 'grey', markersize = 1, label = 'unstable')
+            ax.set_ylabel(name, fontsize = label_size)
+            ax.set_xlabel(xlabel, fontsize = label_size)
+        ax.legend()
+    plt.tight_layout()
+    fig.savefig("output/all_equilibria.png", dpi = 300)
@@ -0,0 +1,260 @@
+"""
+Local interactive explorer for the heatmaps of Fig. 2a-c and Fig. 4
+
+Starts a small web server on localhost that serves heatmap tiles at any zoom level:
+- space "fb_fd" -> shrub_ratio, browser_ratio, survivors over farmer support fb (x) and fd (y), as in Fig. 2a-c
+- space "fb_disturbance" -> shrub_ratio, browser_ratio, grazers after a drought over fb (x) and drought severity (y), as in Fig. 4
+
+Tiles are computed on demand with the batched integrator and cached by tile key.
+The browser first requests a coarse preview of the whole 3 x 3 view (all missing tiles in one batched
+integration, with loose tolerances) and then the detailed tiles one by one.
+
+Usage: python explorer.py, then open http://localhost:8000
+"""
+
+import io
+import re
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib import pyplot as plt
+
+import savanna_setup as ss
+
+#set carrying capacities (used for initial conditions)
+KH = 2     # carrying capacity of producer 1 (grasses)   2
+KS = 3
+
+#extent of both parameter spaces: (x_min, x_max, y_min, y_max)
+spaces = {'fb_fd': (0.0, 0.8, 0.0, 0.8), 'fb_disturbance': (0.0, 0.8, 0.0, 100.0)}
+
+#colour range of every quantity (same as in the figures)
+quantities = {'shrub_ratio': (0, 1), 'browser_ratio': (0, 0.5), 'survivors': (1, 4), 'grazers': (0.6, 1.8)}
+
+#define time array for simulations
+t_end = 1000
+t_stationary = np.arange(t_end - 300, t_end + 1, 10)     # stationary part of the time series
+
+#tolerances of the detailed tiles and of the coarse preview of a whole view
+tolerances = {'detail': (1e-6, 1e-9), 'preview': (1e-4, 1e-7)}
+
+#-----------------------------------------------------------------------
+#Tile computation
+#-----------------------------------------------------------------------
+_cache = {}
+_cache_lock = threading.Lock()
+_reference = {}
+
+
+def tile_coordinates(space, z, x, y, res):
+
+    "Cell centres of tile (z, x, y) with res x res cells. y = 0 is the bottom row of tiles."
+
+    x_min, x_max, y_min, y_max = spaces[space]
+    n = 2**z
+    width = (x_max - x_min)/n
+    height = (y_max - y_min)/n
+    xs = x_min + width*(x + (np.arange(res) + 0.5)/res)
+    ys = y_min + height*(y + (np.arange(res) + 0.5)/res)
+
+    return np.meshgrid(xs, ys)
+
+
+def stationary_outcomes(X):
+
+    "Shrub ratio, browser ratio, number of survivors and grazer density from the stationary part of the runs"
+
+    PH, PS, CB, CG = [X[..., i] for i in range(4)]
+    return {'shrub_ratio': PS.mean(axis = 0)/(PH + PS).mean(axis = 0),
+            'browser_ratio': CB.mean(axis = 0)/(CB + CG).mean(axis = 0),
+            'survivors': np.sum(X[-1] > ss.epsilon, axis = -1),
+            'grazers': CG.mean(axis = 0)}
+
+
+def compute_tiles(space, z, tiles, res, quality = 'detail'):
+
+    """
+    All quantities of several tiles [(x, y), ...] of zoom level z in one batched integration,
+    with the tolerances of the given quality ('detail' or 'preview'). Returns a list with a dictionary of arrays of shape (res, res) for every tile.
+    """
+
+    rtol, atol = tolerances[quality]
+    coordinates = [tile_coordinates(space, z, x, y, res) for x, y in tiles]
+    FB = np.stack([c[0] for c in coordinates])
+    FY = np.stack([c[1] for c in coordinates])
+
+    if space == 'fb_fd':
+        #random initial conditions, as in Fig. 2a-c
+        x0 = np.stack([np.random.default_rng([z, x, y, res]).random((res, res, 4)) for x, y in tiles])*[KH/2, KS, KS/5, KH/2]
+        X = ss.integrate_vec(x0, np.concatenate([[0], t_stationary]), FB, FY, rtol = rtol, atol = atol)[1:]
+    else:
+        #as in Fig. 4: reach an attractor from the reference state, then apply the drought
+        if 'x_ref' not in _reference:
+            _reference['x_ref'] = ss.integrate_vec([KH/4, KS/10, KH/10, KS/4], [0, t_end], 0.3, 0)[-1]
+        X0 = ss.integrate_vec(np.broadcast_to(_reference['x_ref'], FB.shape + (4,)), [0, t_end], FB, 0, rtol = rtol, atol = atol)[-1]
+        d = FY/100
+        x0 = X0*np.stack([1 - d, 1 - d/5, np.ones_like(d), np.ones_like(d)], axis = -1)
+        X = ss.integrate_vec(x0, np.concatenate([[0], t_stationary]), FB, 0, rtol = rtol, atol = atol)[1:]
+
+    outcomes = stationary_outcomes(X)
+    return [{name: values[k] for name, values in outcomes.items()} for k in range(len(tiles))]
+
+
+def compute_tile(space, z, x, y, res):
+
+    "All quantities of one tile, each an array of shape (res, res)"
+
+    return compute_tiles(space, z, [(x, y)], res)[0]
+
+
+def get_tiles(space, z, tiles, res, quality = 'detail'):
+
+    "Cached tile values for several tiles of zoom level z, the missing ones are computed in one batch"
+
+    with _cache_lock:
+        missing = [(x, y) for x, y in tiles if (space, z, x, y, res, quality) not in _cache]
+    if missing:
+        for (x, y), values in zip(missing, compute_tiles(space, z, missing, res, quality)):
+            with _cache_lock:
+                _cache[(space, z, x, y, res, quality)] = values
+    with _cache_lock:
+        return [_cache[(space, z, x, y, res, quality)] for x, y in tiles]
+
+
+def get_tile(space, z, x, y, res):
+
+    "Cached tile values"
+
+    return get_tiles(space, z, [(x, y)], res)[0]
+
+
+def view_mosaic(space, z, x, y, res, quantity, size = 3):
+
+    "Coarse preview of one quantity of the size x size tiles starting at tile (x, y) as one array, nan outside of the parameter space"
+
+    n = 2**z
+    tiles = [(x + col, y + row) for row in range(size) for col in range(size) if x + col < n and y + row < n]
+    mosaic = np.full((size*res, size*res), np.nan)
+    for (tx, ty), values in zip(tiles, get_tiles(space, z, tiles, res, 'preview')):
+        row, col = ty - y, tx - x
+        mosaic[row*res:(row + 1)*res, col*res:(col + 1)*res] = values[quantity]
+
+    return {quantity: mosaic}
+
+
+def render_tile(values, quantity):
+
+    "PNG image of one quantity of a tile"
+
+    vmin, vmax = quantities[quantity]
+    buffer = io.BytesIO()
+    cmap = plt.get_cmap("viridis").with_extremes(bad = (0, 0, 0, 0))     # nan is transparent
+    plt.imsave(buffer, values[quantity][::-1], vmin = vmin, vmax = vmax, cmap = cmap, format = "png")
+    return buffer.getvalue()
+
+#-----------------------------------------------------------------------
+#Web server
+#-----------------------------------------------------------------------
+page = """<!DOCTYPE html>
+<html><head><title>Savanna explorer</title>
+<style>body{font-family:sans-serif} #view{position:relative;width:768px;height:768px}
+#coarse{position:absolute;left:0;top:0;width:768px;height:768px;image-rendering:pixelated}
+#grid img{width:256px;height:256px;image-rendering:pixelated;display:block;visibility:hidden}
+#grid{position:absolute;left:0;top:0;display:grid;grid-template-columns:repeat(3,256px)}</style></head>
+<body>
+<select id="space"><option>fb_fd</option><option>fb_disturbance</option></select>
+<select id="quantity"><option>shrub_ratio</option><option>browser_ratio</option><option>survivors</option><option>grazers</option></select>
+<button onclick="zoom(1)">+</button><button onclick="zoom(-1)">-</button>
+<button onclick="pan(-1,0)">&larr;</button><button onclick="pan(1,0)">&rarr;</button>
+<button onclick="pan(0,1)">&uarr;</button><button onclick="pan(0,-1)">&darr;</button>
+<span id="extent"></span>
+<div id="view"><img id="coarse"><div id="grid"></div></div>
+<script>
+var v = {z: 0, x: 0, y: 0}, drawn = 0;
+var ext = {fb_fd: [0, 0.8, 0, 0.8], fb_disturbance: [0, 0.8, 0, 100]};
+function draw() {
+  var space = document.getElementById("space").value, q = document.getElementById("quantity").value;
+  var grid = document.getElementById("grid"), coarse = document.getElementById("coarse"); grid.innerHTML = "";
+  var n = Math.pow(2, v.z), e = ext[space], current = ++drawn, urls = [];
+  for (var row = 2; row >= 0; row--) for (var col = 0; col < 3; col++) {
+    var img = document.createElement("img"), tx = v.x + col, ty = v.y + row;
+    img.onload = function() { this.style.visibility = "visible"; };
+    if (tx < n && ty < n) urls.push([img, "/tile/" + space + "/" + q + "/" + v.z + "/" + tx + "/" + ty + ".png?res=24"]);
+    grid.appendChild(img);
+  }
+  //coarse image of the whole view first, then the detailed tiles one after another
+  function detail(k) {
+    if (current != drawn || k >= urls.length) return;
+    urls[k][0].addEventListener("load", function() { detail(k + 1); });
+    urls[k][0].addEventListener("error", function() { detail(k + 1); });
+    urls[k][0].src = urls[k][1];
+  }
+  var preview = "/view/" + space + "/" + q + "/" + v.z + "/" + v.x + "/" + v.y + ".png?res=8";
+  if (coarse.complete && coarse.src.endsWith(preview)) detail(0);
+  else { coarse.onload = function() { detail(0); }; coarse.src = preview; }
+  var w = (e[1] - e[0]) / n, h = (e[3] - e[2]) / n;
+  document.getElementById("extent").textContent = "x: " + (e[0] + v.x * w).toFixed(3) + " - " + (e[0] + (v.x + 3) * w).toFixed(3) +
+    ", y: " + (e[2] + v.y * h).toFixed(2) + " - " + (e[2] + (v.y + 3) * h).toFixed(2);
+}
+function zoom(d) { if (v.z + d < 0) return; v.x = d > 0 ? 2 * v.x + 1 : Math.floor(v.x / 2); v.y = d > 0 ? 2 * v.y + 1 : Math.floor(v.y / 2); v.z += d; draw(); }
+function pan(dx, dy) { v.x = Math.max(0, v.x + dx); v.y = Math.max(0, v.y + dy); draw(); }
+document.getElementById("space").onchange = draw; document.getElementById("quantity").onchange = draw;
+draw();
+</script></body></html>
+"""
+
+tile_path = re.compile(r"^/(tile|view)/(\w+)/(\w+)/(\d+)/(\d+)/(\d+)\.png(?:\?res=(\d+))?$")
+
+
+class ExplorerHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path in ("/", "/index.html"):
+            return self.send(200, "text/html", page.encode())
+
+        match = tile_path.match(self.path)
+        if match is None:
+            return self.send(404, "text/plain", b"not found")
+
+        kind, space, quantity, z, x, y, res = match.groups()
+        z, x, y = int(z), int(x), int(y)
+        res = min(int(res or 16), 64)
+        if res < 1:
+            return self.send(400, "text/plain", b"res must be at least 1")
+        if space not in spaces or quantity not in quantities or x >= 2**z or y >= 2**z:
+            return self.send(404, "text/plain", b"unknown tile")
+
+        if kind == "view":
+            values = view_mosaic(space, z, x, y, res, quantity)
+        else:
+            values = get_tile(space, z, x, y, res)
+        self.send(200, "image/png", render_tile(values, quantity))
+
+    def send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port = 8000):
+
+    "Runs the explorer on http://localhost:port until interrupted"
+
+    server = ThreadingHTTPServer(("localhost", port), ExplorerHandler)
+    print("Savanna explorer running on http://localhost:{}".format(port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    serve()
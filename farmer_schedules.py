@@ -0,0 +1,150 @@
+"""
+Time-varying farmer support and rate-induced tipping
+
+Schedules are functions of time that can be passed as fb or fd to savanna_setup.savannas (with odeint)
+or to savanna_setup.integrate_vec. Their parameters can be arrays, so that a whole batch of different
+schedules (e.g. ramps with different rates) is integrated in one call.
+
+- ramp() -> linear change from f_start to f_end with a given rate
+- step() -> sudden change at a given time
+- periodic() -> sinusoidal variation around a mean value
+
+tipping_map() sweeps ramp rate x ramp end point and records whether and when each trajectory
+tips from the grassy to the encroached state. Grasses profit from farmer support, so tipping is
+caused by a decrease: the default map ramps fb down from the grassy state at fb = 0.5. Slow ramps
+follow the grassy branch. Fast ramps push the shrubs above PS_threshold (rate-induced tipping).
+The system stays encroached only for end points in the bistable region (bistable_range(), from the
+equilibrium enumeration) close to its lower edge: below the edge there is no encroached state,
+further inside the overshoot does not reach the encroached basin.
+
+Output: tipping_map.csv and a rate-versus-amplitude tipping map
+"""
+
+import numpy as np
+import pandas as pd
+from matplotlib import pyplot as plt
+
+import savanna_setup as ss
+import equilibrium_enumeration as ee
+
+#initial conditions that lead to the grassy state (same as in Fig1b_example_timeseries.py)
+x0_grassy = [1.0, 0.2, 0.5, 0.1]
+
+#threshold for shrub density that separates grassy and encroached states
+PS_threshold = 1.3
+
+#-----------------------------------------------------------------------
+#Schedules
+#-----------------------------------------------------------------------
+def ramp(f_start, f_end, rate, t_start = 0.0):
+
+    "Farmer support that changes linearly from f_start to f_end at the given rate (per time unit), starting at t_start"
+
+    f_start = np.asarray(f_start, dtype = float)
+    f_end = np.asarray(f_end, dtype = float)
+    rate = np.asarray(rate, dtype = float)
+
+    def schedule(t):
+        change = np.clip(rate*(np.asarray(t) - t_start), 0, np.abs(f_end - f_start))
+        return f_start + np.sign(f_end - f_start)*change
+
+    return schedule
+
+
+def step(f_before, f_after, t_step):
+
+    "Farmer support that jumps from f_before to f_after at time t_step"
+
+    def schedule(t):
+        return np.where(np.asarray(t) < t_step, f_before, f_after)
+
+    return schedule
+
+
+def periodic(f_mean, amplitude, period, phase = 0.0):
+
+    "Farmer support that oscillates around f_mean"
+
+    def schedule(t):
+        return f_mean + amplitude*np.sin(2*np.pi*np.asarray(t)/period + phase)
+
+    return schedule
+
+#-----------------------------------------------------------------------
+#Rate-induced tipping
+#-----------------------------------------------------------------------
+def bistable_range(fb_vals = np.arange(0.0, 0.8, 0.005), fd = 0.0):
+
+    "Smallest and largest of the fb values with a stable grassy and a stable encroached equilibrium"
+
+    points = ee.enumerate_equilibria(fb_vals, fd)
+    stable = points.loc[points['n_unstable'] == 0]
+    encroached = stable['PS'] > PS_threshold
+    both = stable.loc[encroached].groupby('fb').size().index.intersection(stable.loc[~encroached].groupby('fb').size().index)
+
+    return both.min(), both.max()
+
+
+def tipping_map(rates, f_ends, f_start = 0.5, parameter = "fb", fd = 0.0, t_settle = 1000.0, t_after = 1000.0):
+
+    """
+    Ramps fb (or fd, if parameter = "fd") from f_start to every value of f_ends with every rate in rates,
+    all combinations in one stacked integration. Every run starts on the grassy state at f_start.
+    After the ramp has ended, the system is integrated for another t_after time units.
+    Tipping (first crossing of PS_threshold) is located with the event detection of the integrator,
+    and only the end states are kept.
+
+    Returns a data frame with one row per (rate, f_end) combination: tipped and tipping_time for the first
+    crossing, PS_end and encroached for the state at the end.
+    """
+
+    rates = np.asarray(rates, dtype = float)
+    f_ends = np.asarray(f_ends, dtype = float)
+    R, F = np.meshgrid(rates, f_ends, indexing = 'ij')
+
+    #grassy state at the start of the ramp
+    if parameter == "fb":
+        x_start = ss.integrate_vec(x0_grassy, [0, t_settle], f_start, fd)[-1]
+    else:
+        x_start = ss.integrate_vec(x0_grassy, [0, t_settle], 0.0, f_start)[-1]
+
+    schedule = ramp(f_start, F, R)
+    t_end = np.max(np.abs(F - f_start)/R) + t_after
+
+    def shrubs_above(X, t):
+        return PS_threshold - X[..., 1]
+
+    X = np.broadcast_to(x_start, R.shape + (4,))
+    if parameter == "fb":
+        X, tipping_time = ss.integrate_vec(X, [0, t_end], schedule, fd, event = shrubs_above)
+    else:
+        X, tipping_time = ss.integrate_vec(X, [0, t_end], 0.0, schedule, event = shrubs_above)
+
+    return pd.DataFrame({'rate': R.ravel(), 'f_end': F.ravel(), 'tipped': ~np.isnan(tipping_time.ravel()),
+                         'tipping_time': tipping_time.ravel(), 'PS_end': X[-1, ..., 1].ravel(),
+                         'encroached': X[-1, ..., 1].ravel() > PS_threshold})
+
+#-----------------------------------------------------------------------
+#Rate-versus-amplitude tipping map
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+
+    rates = np.logspace(-4, 0, 40)
+    f_ends = np.linspace(0.1, 0.5, 40)
+    results = tipping_map(rates, f_ends)
+    results.to_csv("tipping_map.csv")
+    fb_low, fb_high = bistable_range()
+    print("bistable for fb from {:.3f} to {:.3f}".format(fb_low, fb_high))
+
+    fig = plt.figure(figsize = (16, 6))
+    for k, (column, title) in enumerate([('tipped', 'shrubs exceed $P_S$ threshold'), ('encroached', 'encroached at the end')]):
+        plt.subplot(1, 2, k + 1)
+        values = results[column].to_numpy().reshape(len(rates), len(f_ends)).T
+        plt.pcolor(rates, f_ends, values.astype(int), vmin = 0, vmax = 1)
+        plt.xscale('log')
+        plt.xlabel('rate of change of $f_{b}$', fontsize = 20)
+        plt.ylabel('final farmer support $f_{b}$', fontsize = 20)
+        plt.axhline(y = fb_low, color = 'w', linestyle = '--')
+        plt.title(title, fontsize = 20)
+    plt.tight_layout()
+    fig.savefig("output/tipping_map.png", dpi = 300)
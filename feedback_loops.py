@@ -0,0 +1,206 @@
+"""
+Automatic enumeration of feedback loops and their loop weights for any Jacobian structure
+
+The interaction graph of a Jacobian A has an edge j -> i for every non-zero element a_ij (j affects i).
+Its feedback loops are the elementary cycles of this graph, which are enumerated with Johnson's algorithm.
+The enumeration only depends on the sparsity pattern and is cached, so that it is done once per food web.
+
+The weight of a loop of length n is the geometric mean of its elements, sign(product) * |product|^(1/n),
+as in find_savannah_loop_weights() in total_feedback.py. Loop names list the elements along the loop,
+e.g. "a21a42a14" for grasses -> shrubs -> grazers -> grasses (indices start at 1).
+All loop weights of a stack of Jacobians are evaluated with one gather and one product.
+
+Output: equilibria_loop_weights.csv with the loop weights at all equilibria of Fig. 2d-e
+"""
+
+import functools
+
+import numpy as np
+import pandas as pd
+
+import savanna_setup as ss
+import food_web as fw
+
+#-----------------------------------------------------------------------
+#Elementary cycles (Johnson's algorithm)
+#-----------------------------------------------------------------------
+def strongly_connected_component(successors, nodes, start):
+
+    "Nodes of the strongly connected component of start in the subgraph induced by nodes"
+
+    def reachable(edges):
+        seen = {start}
+        stack = [start]
+        while stack:
+            for w in edges[stack.pop()]:
+                if w in nodes and w not in seen:
+                    seen.add(w)
+                    stack.append(w)
+        return seen
+
+    predecessors = {v: [u for u in successors if v in successors[u]] for v in successors}
+    return reachable(successors) & reachable(predecessors)
+
+
+@functools.lru_cache(maxsize = None)
+def _johnson(n, edges):
+
+    successors = {v: [] for v in range(n)}
+    for j, i in edges:
+        successors[j].append(i)
+
+    cycles = []
+    for start in range(n):
+        #cycles whose smallest node is start lie in its component of the subgraph of nodes >= start
+        component = strongly_connected_component(successors, set(range(start, n)), start)
+        blocked = set()
+        blocked_by = {v: set() for v in component}
+        path = [start]
+
+        def unblock(v):
+            blocked.discard(v)
+            while blocked_by[v]:
+                w = blocked_by[v].pop()
+                if w in blocked:
+                    unblock(w)
+
+        def circuit(v):
+            found = False
+            blocked.add(v)
+            for w in successors[v]:
+                if w not in component:
+                    continue
+                if w == start:
+                    cycles.append(tuple(path))
+                    found = True
+                elif w not in blocked:
+                    path.append(w)
+                    found = circuit(w) or found
+                    path.pop()
+            if found:
+                unblock(v)
+            else:
+                for w in successors[v]:
+                    if w in component:
+                        blocked_by[w].add(v)
+            return found
+
+        circuit(start)
+
+    return tuple(sorted(cycles, key = lambda cycle: (len(cycle), cycle)))
+
+
+def elementary_cycles(pattern, min_length = 2):
+
+    """
+    All elementary cycles of the interaction graph of a Jacobian sparsity pattern (shape (n, n), True where a_ij != 0).
+    Every cycle is a tuple of nodes (i1, i2, ..., ik) for the loop i1 -> i2 -> ... -> ik -> i1, starting at its
+    smallest node. The enumeration is cached per pattern. Self-loops (length 1) are left out by default.
+    """
+
+    pattern = np.asarray(pattern, dtype = bool)
+    i, j = np.nonzero(pattern)
+    cycles = _johnson(len(pattern), tuple(zip(j.tolist(), i.tolist())))
+    return [cycle for cycle in cycles if len(cycle) >= min_length]
+
+
+def loop_name(cycle):
+
+    "Name of a loop from its elements along the cycle, e.g. (0, 1, 3) -> 'a21a42a14', and (0, 1) -> 'a12a21'"
+
+    if len(cycle) == 2:
+        #pairs are named as in total_feedback.py
+        return "a{0}{1}a{1}{0}".format(cycle[0] + 1, cycle[1] + 1)
+    return "".join("a{}{}".format(cycle[(m + 1) % len(cycle)] + 1, cycle[m] + 1) for m in range(len(cycle)))
+
+#-----------------------------------------------------------------------
+#Loop weights
+#-----------------------------------------------------------------------
+@functools.lru_cache(maxsize = None)
+def _loop_index(n, edges, min_length):
+
+    pattern = np.zeros((n, n), dtype = bool)
+    if edges:
+        pattern[tuple(np.array(edges).T)] = True
+    cycles = elementary_cycles(pattern, min_length)
+    length = max([len(cycle) for cycle in cycles], default = 1)
+
+    #element indices of every loop, padded with the position of a constant 1 (index n*n of the extended array)
+    index = np.full((len(cycles), length), n*n)
+    for l, cycle in enumerate(cycles):
+        for m in range(len(cycle)):
+            index[l, m] = cycle[(m + 1) % len(cycle)]*n + cycle[m]
+
+    return index, np.array([len(cycle) for cycle in cycles]), [loop_name(cycle) for cycle in cycles]
+
+
+def loop_index(pattern, min_length = 2):
+
+    """
+    Flat element indices (shape (n_loops, max_length), padded with n*n), lengths and names of all loops of a pattern
+    """
+
+    pattern = np.asarray(pattern, dtype = bool)
+    return _loop_index(len(pattern), tuple(zip(*[v.tolist() for v in np.nonzero(pattern)])), min_length)
+
+
+def loop_weights(J, pattern = None, min_length = 2):
+
+    """
+    Weights of all feedback loops for a stack of Jacobians J (shape (..., n, n)).
+    The loops are taken from pattern (default: all elements that are non-zero in any Jacobian of the stack),
+    so that the columns are the same for all members of the stack.
+    Returns the weights (shape (..., n_loops)) and the loop names.
+    """
+
+    J = np.asarray(J, dtype = float)
+    n = J.shape[-1]
+    if pattern is None:
+        pattern = np.any(J.reshape((-1, n, n)) != 0, axis = 0)
+    index, length, names = loop_index(pattern, min_length)
+
+    flat = np.concatenate([J.reshape(J.shape[:-2] + (n*n,)), np.ones(J.shape[:-2] + (1,))], axis = -1)
+    product = np.prod(flat[..., index], axis = -1)
+    weights = np.sign(product)*np.abs(product)**(1/length)
+
+    return weights, names
+
+
+def loop_weight_table(J, pattern = None, min_length = 2):
+
+    "Loop weights for a stack of Jacobians of shape (m, n, n) as a data frame with one column per loop"
+
+    weights, names = loop_weights(J, pattern, min_length)
+    return pd.DataFrame(weights.reshape((-1, len(names))), columns = names)
+
+
+#sparsity pattern of the Jacobian of the savanna model
+savanna_pattern = fw.FoodWeb.savanna().pattern
+
+#-----------------------------------------------------------------------
+#Loop weights at all equilibria of Fig. 2d-e
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+
+    import time
+
+    import equilibrium_enumeration as ee
+
+    print("loops of the savanna model:", [loop_name(cycle) for cycle in elementary_cycles(savanna_pattern)])
+
+    points = ee.enumerate_equilibria(np.arange(0.0, 0.8, 0.001))
+    X = points[ss.state_names].to_numpy()
+    J = ss.jacobian_vec(X, points['fb'].to_numpy(), points['fd'].to_numpy())
+
+    start = time.perf_counter()
+    table = loop_weight_table(J, savanna_pattern)
+    print("{} equilibria, {} loops: {:.1f} ms".format(len(J), table.shape[1], 1000*(time.perf_counter() - start)))
+
+    #larger webs use the same routine
+    web = fw.random_web(10, 5)
+    J_web = web.jacobian(np.random.default_rng(0).random((1000, web.n)))
+    start = time.perf_counter()
+    weights, names = loop_weights(J_web, web.pattern)
+    print("random web with {} species: {} loops, 1000 Jacobians in {:.1f} ms".format(web.n, len(names), 1000*(time.perf_counter() - start)))
+
+    pd.concat([points, table], axis = 1).to_csv("equilibria_loop_weights.csv")
@@ -0,0 +1,246 @@
+"""
+Generalised food-web model with arbitrary numbers of producers and consumers in matrix form
+
+The savanna model is a special case of a web with n_p producers P and n_c consumers C:
+
+    dP_i/dt = r_i P_i (1 - sum_j A_ij P_j / K_i) - sum_k F_ik C_k
+    dC_k/dt = sum_i e_ik F_ik C_k - m_k (1 - fb s_k) C_k - d_k (1 - fd u_k) C_k^2
+
+with the type II functional responses F_ik = a_ik p_ik P_i/(1 + a_ik h_ik p_ik P_i). The web is defined by the
+competition matrix A, the preference, attack rate, handling time and efficiency matrices (n_p, n_c) and the
+vectors s, u of consumers that receive farmer support. Several shrub species, mixed feeders etc. are added by
+extending these matrices.
+
+The right hand side is evaluated with matrix operations for whole stacks of states. The Jacobian is computed
+only at its structural non-zeros (competition links, feeding links and the diagonal) and can be returned as
+entries, as dense matrices for stacks of states, or as a scipy.sparse matrix for large webs.
+
+Output: check that the matrix form reproduces savanna_setup.py and timings for webs of increasing size
+"""
+
+import time
+
+import numpy as np
+from scipy import sparse
+
+import savanna_setup as ss
+
+#-----------------------------------------------------------------------
+#Food web
+#-----------------------------------------------------------------------
+def concatenate(parts):
+
+    "Concatenates arrays along the last axis after broadcasting all other axes"
+
+    batch = np.broadcast_shapes(*[part.shape[:-1] for part in parts])
+    return np.concatenate([np.broadcast_to(part, batch + part.shape[-1:]) for part in parts], axis = -1)
+
+
+class FoodWeb:
+
+    """
+    Food web of producers and consumers. All matrices have shape (n_producers, n_consumers), except for the
+    competition matrix (n_producers, n_producers); vectors have one entry per producer or consumer.
+    Scalars are broadcast. Links with preference 0 do not exist.
+    """
+
+    def __init__(self, r, K, competition, preference, attack = 1.0, handling = 0.0, efficiency = 1.0,
+                 mortality = 0.0, density_mortality = 0.0, fb_support = 0.0, fd_support = 0.0,
+                 producer_names = None, consumer_names = None):
+
+        self.competition = np.atleast_2d(np.asarray(competition, dtype = float))
+        self.preference = np.atleast_2d(np.asarray(preference, dtype = float))
+        self.n_producers, self.n_consumers = self.preference.shape
+        self.n = self.n_producers + self.n_consumers
+
+        matrix = (self.n_producers, self.n_consumers)
+        self.r = np.broadcast_to(np.asarray(r, dtype = float), (self.n_producers,))
+        self.K = np.broadcast_to(np.asarray(K, dtype = float), (self.n_producers,))
+        self.attack = np.broadcast_to(np.asarray(attack, dtype = float), matrix)
+        self.handling = np.broadcast_to(np.asarray(handling, dtype = float), matrix)
+        self.efficiency = np.broadcast_to(np.asarray(efficiency, dtype = float), matrix)
+        self.mortality = np.broadcast_to(np.asarray(mortality, dtype = float), (self.n_consumers,))
+        self.density_mortality = np.broadcast_to(np.asarray(density_mortality, dtype = float), (self.n_consumers,))
+        self.fb_support = np.broadcast_to(np.asarray(fb_support, dtype = float), (self.n_consumers,))
+        self.fd_support = np.broadcast_to(np.asarray(fd_support, dtype = float), (self.n_consumers,))
+
+        self.producer_names = producer_names or ["P{}".format(i + 1) for i in range(self.n_producers)]
+        self.consumer_names = consumer_names or ["C{}".format(k + 1) for k in range(self.n_consumers)]
+        self.state_names = list(self.producer_names) + list(self.consumer_names)
+
+        #feeding links (producer i, consumer k) and competition links between different producers
+        self.link_producer, self.link_consumer = np.nonzero(self.preference)
+        self.competitor_row, self.competitor_col = np.nonzero(self.competition - np.diag(np.diag(self.competition)))
+        self.ap = (self.attack*self.preference)[self.link_producer, self.link_consumer]
+        self.aph = (self.attack*self.preference*self.handling)[self.link_producer, self.link_consumer]
+
+        #structural non-zeros of the Jacobian, in the order of jacobian_entries()
+        n_p = self.n_producers
+        diag = np.arange(self.n)
+        self.rows = np.concatenate([diag, self.competitor_row, self.link_producer, n_p + self.link_consumer])
+        self.cols = np.concatenate([diag, self.competitor_col, n_p + self.link_consumer, self.link_producer])
+        self.pattern = np.zeros((self.n, self.n), dtype = bool)
+        self.pattern[self.rows, self.cols] = True
+
+
+    @classmethod
+    def savanna(cls, params = None):
+
+        "The grass-shrub-browser-grazer model of savanna_setup.py"
+
+        p = ss.get_parameters(params)
+        return cls(r = [p['rH'], p['rS']], K = [p['KH'], p['KS']],
+                   competition = [[1.0, p['c']], [p['c'], 1.0]],
+                   preference = [[p['pHB'], p['pHG']], [p['pSB'], p['pSG']]],
+                   attack = p['a'], handling = p['h'], efficiency = p['e'],
+                   mortality = p['mb'], density_mortality = p['md'], fb_support = [0.0, 1.0], fd_support = [0.0, 1.0],
+                   producer_names = ['PH', 'PS'], consumer_names = ['CB', 'CG'])
+
+
+    def functional_responses(self, P):
+
+        "F_ik for a stack of producer densities P (shape (..., n_producers)) -> shape (..., n_producers, n_consumers)"
+
+        P = P[..., :, None]
+        return self.attack*self.preference*P/(1 + self.attack*self.handling*self.preference*P)
+
+
+    def rhs(self, X, fb = 0.0, fd = 0.0, threshold = ss.epsilon):
+
+        """
+        Right hand side for a stack of states X (shape (..., n)), fb and fd broadcast against X[..., 0].
+        Populations below the extinction threshold do not change, as in savanna_setup.savannas_vec().
+        """
+
+        X = np.asarray(X)
+        P = X[..., :self.n_producers]
+        C = X[..., self.n_producers:]
+        fb = np.asarray(fb)[..., None]
+        fd = np.asarray(fd)[..., None]
+
+        F = self.functional_responses(P)
+        dP = self.r*P*(1 - np.einsum('ij,...j->...i', self.competition, P)/self.K) - np.einsum('...ik,...k->...i', F, C)
+        dC = np.einsum('ik,...ik->...k', self.efficiency, F)*C - self.mortality*(1 - fb*self.fb_support)*C \
+             - self.density_mortality*(1 - fd*self.fd_support)*C*C
+
+        dX = concatenate([dP, dC])
+        if threshold is not None:
+            dX = np.where(X < threshold, 0.0, dX)
+
+        return dX
+
+
+    def jacobian_entries(self, X, fb = 0.0, fd = 0.0):
+
+        """
+        Jacobian entries at the structural non-zeros (self.rows, self.cols) for a stack of states X (shape (..., n)).
+        Only existing links are evaluated. Returns an array of shape (..., nnz). The extinction threshold is ignored.
+        """
+
+        X = np.asarray(X, dtype = float)
+        P = X[..., :self.n_producers]
+        C = X[..., self.n_producers:]
+        fb = np.asarray(fb)[..., None]
+        fd = np.asarray(fd)[..., None]
+        i, k = self.link_producer, self.link_consumer
+
+        #functional responses of the existing links and their derivatives
+        denom = 1 + self.aph*P[..., i]
+        F = self.ap*P[..., i]/denom
+        dF = self.ap/denom**2
+
+        #sums over links for every producer and consumer
+        def per_producer(values):
+            return np.einsum('...l,li->...i', values, np.eye(self.n_producers)[i])
+
+        def per_consumer(values):
+            return np.einsum('...l,lk->...k', values, np.eye(self.n_consumers)[k])
+
+        crowding = np.einsum('ij,...j->...i', self.competition, P)/self.K
+        d_producer = self.r*(1 - crowding) - self.r*P*np.diag(self.competition)/self.K - per_producer(dF*C[..., k])
+        d_consumer = per_consumer(self.efficiency[i, k]*F) - self.mortality*(1 - fb*self.fb_support) \
+                     - 2*self.density_mortality*(1 - fd*self.fd_support)*C
+
+        competitor = -self.r[self.competitor_row]*P[..., self.competitor_row] \
+                     *self.competition[self.competitor_row, self.competitor_col]/self.K[self.competitor_row]
+        eaten = -F
+        eating = self.efficiency[i, k]*dF*C[..., k]
+
+        return concatenate([d_producer, d_consumer, competitor, eaten, eating])
+
+
+    def jacobian(self, X, fb = 0.0, fd = 0.0):
+
+        "Dense Jacobian matrices for a stack of states X (shape (..., n)) -> shape (..., n, n)"
+
+        entries = self.jacobian_entries(X, fb, fd)
+        J = np.zeros(entries.shape[:-1] + (self.n, self.n))
+        J[..., self.rows, self.cols] = entries
+        return J
+
+
+    def jacobian_sparse(self, x, fb = 0.0, fd = 0.0):
+
+        "Jacobian of a single state x (shape (n,)) as a scipy.sparse CSR matrix"
+
+        return sparse.csr_matrix((self.jacobian_entries(x, fb, fd), (self.rows, self.cols)), shape = (self.n, self.n))
+
+
+    def integrate(self, X0, t, fb = 0.0, fd = 0.0, threshold = ss.epsilon, rtol = 1e-6, atol = 1e-9):
+
+        "Integrates a stack of initial conditions (shape (..., n)), returns an array of shape (len(t), ..., n)"
+
+        X0 = np.asarray(X0, dtype = float)
+        X0 = np.broadcast_to(X0, np.broadcast(X0[..., 0], fb, fd).shape + (self.n,))
+        return ss.dopri_vec(lambda X, tm: self.rhs(X, fb, fd, threshold), X0, t, rtol, atol)
+
+
+def random_web(n_producers, n_consumers, connectance = 0.3, seed = 0):
+
+    "Random web with parameters in the range of the savanna model, every consumer eats at least one producer"
+
+    rng = np.random.default_rng(seed)
+    competition = np.where(rng.random((n_producers, n_producers)) < connectance, rng.uniform(0, 0.5, (n_producers, n_producers)), 0.0)
+    np.fill_diagonal(competition, 1.0)
+    links = rng.random((n_producers, n_consumers)) < connectance
+    links[rng.integers(n_producers, size = n_consumers), np.arange(n_consumers)] = True
+    preference = np.where(links, rng.random((n_producers, n_consumers)), 0.0)
+    preference = preference/preference.sum(axis = 0)
+
+    return FoodWeb(r = rng.uniform(0.5, 1.0, n_producers), K = rng.uniform(2, 3, n_producers), competition = competition,
+                   preference = preference, attack = 1.0, handling = 3.0, efficiency = 0.45,
+                   mortality = 0.15, density_mortality = 0.05, fb_support = rng.random(n_consumers) < 0.5)
+
+#-----------------------------------------------------------------------
+#Reproduction of the savanna model and scaling
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+
+    web = FoodWeb.savanna()
+    rng = np.random.default_rng(0)
+
+    #random states and farmer support as in Fig. 2a-c
+    X = rng.random((10000, 4))*[2, 3, 1, 2]
+    fb = rng.uniform(0, 0.8, 10000)
+    fd = rng.uniform(0, 0.8, 10000)
+    print("largest difference of the right hand side: {:.1e}".format(np.max(np.abs(web.rhs(X, fb, fd) - ss.savannas_vec(X, fb, fd)))))
+    print("largest difference of the Jacobian: {:.1e}".format(np.max(np.abs(web.jacobian(X, fb, fd) - ss.jacobian_vec(X, fb, fd)))))
+
+    t = np.arange(0, 1000, 10.0)
+    X0 = np.broadcast_to([1.0, 0.2, 0.5, 0.1], (50, 4))
+    fb_vals = np.linspace(0, 0.8, 50)
+    difference = np.max(np.abs(web.integrate(X0, t, fb_vals, 0.0) - ss.integrate_vec(X0, t, fb_vals, 0.0)))
+    print("largest difference of 50 time series: {:.1e}".format(difference))
+
+    #batched sweeps for larger webs
+    for n_producers, n_consumers in [(2, 2), (10, 5), (20, 10), (40, 20)]:
+        web = random_web(n_producers, n_consumers)
+        X = rng.random((1000, web.n))
+        start = time.perf_counter()
+        web.rhs(X, 0.3, 0.0)
+        time_rhs = time.perf_counter() - start
+        start = time.perf_counter()
+        web.jacobian(X, 0.3, 0.0)
+        time_jac = time.perf_counter() - start
+        print("{} species, {:.0%} Jacobian entries non-zero: 1000 right hand sides {:.1f} ms, 1000 Jacobians {:.1f} ms".format(
+            web.n, web.pattern.mean(), 1000*time_rhs, 1000*time_jac))
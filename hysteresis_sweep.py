@@ -0,0 +1,153 @@
+"""
+Quasi-static sweeps of farmer support that reuse the previous equilibrium (natural parameter continuation)
+
+In Fig2d-e_bifurcation_diagram.py every f value starts from new random initial conditions and is
+integrated for 3000 time units. Here each step starts from the equilibrium of the previous step and
+is only integrated until it has settled, i.e. until Newton's method converges to a nearby stable equilibrium. A forward sweep (increasing f) follows
+the grassy branch, a backward sweep (decreasing f) follows the encroached branch, which shows the
+hysteresis loop directly.
+
+Both variants of Fig. 2d-e (vary fb with fd = 0, vary fb = fd) are swept forward and backward in one batch.
+
+Output: hysteresis_sweeps.csv and plots of both hysteresis loops
+"""
+
+import numpy as np
+import pandas as pd
+from matplotlib import pyplot as plt
+
+import savanna_setup as ss
+
+#initial conditions that lead to the grassy and the encroached state (same as in Fig1b_example_timeseries.py)
+x0_grassy = [1.0, 0.2, 0.5, 0.1]
+x0_encroached = [0.2, 1.0, 0.1, 0.5]
+
+#-----------------------------------------------------------------------
+#Define functions
+#-----------------------------------------------------------------------
+def is_stable(X, fb, fd, threshold = ss.epsilon):
+
+    "True for states whose Jacobian (restricted to the surviving populations) has only eigenvalues with negative real part"
+
+    J = ss.jacobian_vec(X, fb, fd)
+    extinct = X < threshold
+    J = np.where(extinct[..., :, None] | extinct[..., None, :], 0.0, J) - np.where(extinct, 1.0, 0.0)[..., None]*np.eye(4)
+
+    return np.max(np.linalg.eigvals(J).real, axis = -1) < 0
+
+
+def settle(X, fb, fd, tol = 1e-8, t_chunk = 2.0, t_max = 3000.0, max_jump = 0.05):
+
+    """
+    Integrates a stack of states X (shape (n, 4)) in chunks until it has settled.
+    After every chunk, the states are refined with Newton's method. A run has settled when Newton
+    converges to a stable equilibrium that is less than max_jump (relative distance) away,
+    i.e. when the trajectory is already close to the attractor it approaches.
+    The chunks start at t_chunk and double in length (up to 100 time units), so that runs
+    that do not settle (e.g. oscillations) do not need many chunks to reach t_max.
+    Returns the settled states, the integration time each run needed and whether it settled.
+    """
+
+    X = np.array(X, dtype = float)
+    fb = np.broadcast_to(np.asarray(fb, dtype = float), X.shape[:-1])
+    fd = np.broadcast_to(np.asarray(fd, dtype = float), X.shape[:-1])
+    time = np.zeros(len(X))
+    settled = np.zeros(len(X), dtype = bool)
+    open_runs = np.arange(len(X))
+    chunk = t_chunk
+
+    while len(open_runs) > 0:
+        #try to jump to the equilibrium with Newton's method
+        x = X[open_runs]
+        x_eq, residual = ss.newton_vec(x, fb[open_runs], fd[open_runs])
+        jump = np.linalg.norm(x_eq - x, axis = -1)/np.linalg.norm(x, axis = -1)
+        ok = (residual < tol) & (jump < max_jump) & (x_eq >= 0).all(axis = -1) & is_stable(x_eq, fb[open_runs], fd[open_runs])
+
+        X[open_runs[ok]] = x_eq[ok]
+        settled[open_runs[ok]] = True
+        open_runs = open_runs[~ok & (time[open_runs] < t_max)]
+
+        #otherwise, integrate for a while
+        if len(open_runs) > 0:
+            X[open_runs] = ss.integrate_vec(X[open_runs], [0, chunk], fb[open_runs], fd[open_runs])[-1]
+            time[open_runs] += chunk
+            chunk = min(2*chunk, 100.0)
+
+    return X, time, settled
+
+
+def quasi_static_sweep(f_list, fd_factors = (0.0, 1.0), reintroduce = 0.01, tol = 1e-8, t_chunk = 2.0, t_max = 500.0):
+
+    """
+    Forward and backward sweeps through f_list for every entry of fd_factors (fb = f, fd = factor*f).
+    The forward sweep starts on the grassy state, the backward sweep on the encroached state.
+    Populations that went extinct are reintroduced at density reintroduce before every step
+    (as browsers in simulate_droughts), so that they can recover once conditions allow it.
+
+    Returns a data frame with one row per f value, sweep direction and fd factor. As in Fig. 2d-e, it contains
+    the minimum and maximum of every population; they differ only for runs that did not settle
+    (e.g. oscillations), for which they are taken from a further window of 100 time units.
+    """
+
+    f_list = np.asarray(f_list, dtype = float)
+    fd_factors = np.asarray(fd_factors, dtype = float)
+    n_f = len(f_list)
+    n_chains = 2*len(fd_factors)
+
+    #chains: forward sweeps for all fd factors, then backward sweeps
+    factor = np.tile(fd_factors, 2)
+    forward = np.repeat([True, False], len(fd_factors))
+
+    #start from long runs at the first value of each sweep
+    start_f = np.where(forward, f_list[0], f_list[-1])
+    x0 = np.where(forward[:, None], np.array(x0_grassy)[None, :], np.array(x0_encroached)[None, :])
+    X = ss.integrate_vec(x0, [0, t_max], start_f, factor*start_f)[-1]
+
+    rows = []
+    for k in range(n_f):
+        f = np.where(forward, f_list[k], f_list[n_f - 1 - k])
+        if reintroduce:
+            X = np.where(X < ss.epsilon, reintroduce, X)
+        X, time, settled = settle(X, f, factor*f, tol, t_chunk, t_max)
+        X_min, X_max = X.copy(), X.copy()
+        if not np.all(settled):
+            window = ss.integrate_vec(X[~settled], np.arange(0, 100.5, 0.5), f[~settled], factor[~settled]*f[~settled])
+            X_min[~settled] = window.min(axis = 0)
+            X_max[~settled] = window.max(axis = 0)
+        for c in range(n_chains):
+            rows.append([f[c], factor[c], "forward" if forward[c] else "backward", *X[c], *X_min[c], *X_max[c], time[c], settled[c]])
+
+    columns = ['f', 'fd_factor', 'direction'] + ss.state_names + ['min_' + v for v in ss.state_names] + ['max_' + v for v in ss.state_names]
+    results = pd.DataFrame(rows, columns = columns + ['settling_time', 'settled'])
+    results['shrub_ratio'] = results['PS']/(results['PH'] + results['PS'])
+    results['browser_ratio'] = results['CB']/(results['CB'] + results['CG'])
+
+    return results.sort_values(['fd_factor', 'direction', 'f'], ignore_index = True)
+
+#-----------------------------------------------------------------------
+#Hysteresis loops for both bifurcation diagrams of Fig. 2d-e
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+
+    results = quasi_static_sweep(np.arange(0.0, 0.8, 0.001))
+    results.to_csv("hysteresis_sweeps.csv")
+    print("median settling time: ", results['settling_time'].median())
+
+    label_size = 20
+    for fd_factor, name in [(0.0, "fb"), (1.0, "fd_fb")]:
+        fig = plt.figure(figsize = (12, 9))
+        ax1 = fig.add_subplot(211)
+        ax2 = fig.add_subplot(212)
+        for direction, style in [("forward", "-"), ("backward", "--")]:
+            data = results.loc[(results['fd_factor'] == fd_factor) & (results['direction'] == direction)]
+            for var, colour, ax, label in [('PH', 'g', ax1, 'Grasses ($P_H$)'), ('PS', 'y', ax1, 'Shrubs ($P_S$)'),
+                                           ('CB', 'r', ax2, 'Browsers ($C_B$)'), ('CG', 'm', ax2, 'Grazers ($C_G$)')]:
+                ax.plot(data['f'], data['min_' + var], colour + style, label = label + ', ' + direction)
+                ax.plot(data['f'], data['max_' + var], colour + style)
+        ax1.set_ylabel("equilibrium \n population density", fontsize = label_size)
+        ax2.set_ylabel("equilibrium \n population density", fontsize = label_size)
+        ax2.set_xlabel("farmer support $f_b$" if fd_factor == 0 else "farmer support $f_b$, $f_d$", fontsize = label_size)
+        ax1.legend()
+        ax2.legend()
+        plt.tight_layout()
+        fig.savefig("output/Hysteresis_" + name + ".png", dpi = 300)
@@ -0,0 +1,192 @@
+"""
+Quasi-potential barriers and minimum-action transition paths between the grassy and the encroached state
+
+With small additive noise, dx = b(x) dt + sqrt(eps) * sigma dW, transitions between the two stable states follow
+the path that minimises the Freidlin-Wentzell action, and their rate scales as exp(-S/eps). The geometric
+minimum action method (gMAM) minimises the geometric action of a path phi,
+
+    S = sum over segments of ( |d phi| |b| - <d phi, b> ),    norms weighted with 1/sigma^2,
+
+which does not depend on the time parametrisation. S from an attractor to the saddle is the quasi-potential
+barrier of that attractor (the downhill part of the path does not contribute).
+
+All path nodes of all fb values are optimised together (L-BFGS-B with the analytic gradient, which uses the
+Jacobian from savanna_setup), and the nodes are redistributed to equal arc length between rounds.
+The end points and the initial paths (through the saddle) come from equilibrium_enumeration.py.
+
+Output: action_barriers.csv and a plot of both barriers against fb
+"""
+
+import numpy as np
+import pandas as pd
+from matplotlib import pyplot as plt
+from scipy import optimize
+
+import savanna_setup as ss
+import equilibrium_enumeration as ee
+
+#-----------------------------------------------------------------------
+#Geometric action
+#-----------------------------------------------------------------------
+def geometric_action(path, fb, fd, params = None, sigma = 1.0):
+
+    """
+    Geometric action of a stack of paths (shape (..., n_nodes, 4)) and its gradient with respect to all nodes.
+    fb and fd broadcast against path[..., 0, 0]. sigma is the noise intensity of every variable (scalar or shape (4,)).
+    Returns the action (shape path.shape[:-2]) and the gradient (shape of path).
+    """
+
+    w = 1/np.broadcast_to(np.asarray(sigma, dtype = float), (4,))**2
+    fb = np.asarray(fb)[..., None]
+    fd = np.asarray(fd)[..., None]
+
+    step = np.diff(path, axis = -2)
+    mid = (path[..., 1:, :] + path[..., :-1, :])/2
+    b = ss.savannas_vec(mid, fb, fd, params, threshold = None)
+    J = ss.jacobian_vec(mid, fb, fd, params)
+
+    step_norm = np.sqrt(np.sum(w*step**2, axis = -1))
+    b_norm = np.sqrt(np.sum(w*b**2, axis = -1))
+    action = np.sum(step_norm*b_norm - np.sum(w*step*b, axis = -1), axis = -1)
+
+    with np.errstate(all = 'ignore'):
+        grad_step = np.nan_to_num(w*step*(b_norm/step_norm)[..., None]) - w*b
+        grad_b = np.nan_to_num(w*b*(step_norm/b_norm)[..., None]) - w*step
+    grad_mid = np.einsum('...ji,...j->...i', J, grad_b)
+
+    grad = np.zeros_like(path)
+    grad[..., :-1, :] += -grad_step + grad_mid/2
+    grad[..., 1:, :] += grad_step + grad_mid/2
+
+    return action, grad
+
+
+def reparametrize(path, n_nodes = None):
+
+    "Redistributes the nodes of a stack of paths (shape (..., n, 4)) to n_nodes (default n) points of equal arc length"
+
+    n_nodes = path.shape[-2] if n_nodes is None else n_nodes
+    flat = path.reshape((-1,) + path.shape[-2:])
+    new = np.empty((len(flat), n_nodes, path.shape[-1]))
+    for k, p in enumerate(flat):
+        s = np.concatenate([[0], np.cumsum(np.linalg.norm(np.diff(p, axis = 0), axis = 1))])
+        s_new = np.linspace(0, s[-1], n_nodes)
+        new[k] = np.column_stack([np.interp(s_new, s, p[:, i]) for i in range(p.shape[1])])
+    return new.reshape(path.shape[:-2] + new.shape[-2:])
+
+
+def initial_path(x_start, x_end, n_nodes, x_via = None):
+
+    "Straight path between x_start and x_end (shape (..., 4)), or piecewise straight through x_via"
+
+    x_start = np.asarray(x_start, dtype = float)
+    x_end = np.asarray(x_end, dtype = float)
+    s = np.linspace(0, 1, n_nodes)[:, None]
+    if x_via is None:
+        return x_start[..., None, :] + s*(x_end - x_start)[..., None, :]
+    first = initial_path(x_start, x_via, n_nodes)
+    second = initial_path(x_via, x_end, n_nodes)
+    return reparametrize(np.concatenate([first, second[..., 1:, :]], axis = -2), n_nodes)
+
+
+def minimum_action_path(x_start, x_end, fb, fd = 0.0, x_via = None, n_nodes = 100, n_rounds = 20, iterations = 50,
+                        params = None, sigma = 1.0):
+
+    """
+    Minimum action paths from x_start to x_end (shape (..., 4)) for a stack of parameter values,
+    all optimised at once. Densities are kept non-negative.
+    Returns the paths (shape (..., n_nodes, 4)), their action and the cumulative action along every path.
+    """
+
+    path = initial_path(x_start, x_end, n_nodes, x_via)
+    shape = path.shape
+    fb = np.broadcast_to(np.asarray(fb, dtype = float), shape[:-2])
+    fd = np.broadcast_to(np.asarray(fd, dtype = float), shape[:-2])
+
+    def objective(inner):
+        path[..., 1:-1, :] = inner.reshape(shape[:-2] + (n_nodes - 2, 4))
+        action, grad = geometric_action(path, fb, fd, params, sigma)
+        return np.sum(action), grad[..., 1:-1, :].ravel()
+
+    for k in range(n_rounds):
+        result = optimize.minimize(objective, path[..., 1:-1, :].ravel(), jac = True, method = "L-BFGS-B",
+                                   bounds = [(0, None)]*path[..., 1:-1, :].size, options = {'maxiter': iterations})
+        path[..., 1:-1, :] = result.x.reshape(shape[:-2] + (n_nodes - 2, 4))
+        path = reparametrize(path)
+
+    action, _ = geometric_action(path, fb, fd, params, sigma)
+
+    #cumulative action along the path
+    w = 1/np.broadcast_to(np.asarray(sigma, dtype = float), (4,))**2
+    step = np.diff(path, axis = -2)
+    b = ss.savannas_vec((path[..., 1:, :] + path[..., :-1, :])/2, fb[..., None], fd[..., None], params, threshold = None)
+    local = np.sqrt(np.sum(w*step**2, axis = -1)*np.sum(w*b**2, axis = -1)) - np.sum(w*step*b, axis = -1)
+    profile = np.concatenate([np.zeros(shape[:-2] + (1,)), np.cumsum(local, axis = -1)], axis = -1)
+
+    return path, action, profile
+
+#-----------------------------------------------------------------------
+#Action barriers over fb
+#-----------------------------------------------------------------------
+def bistable_equilibria(fb_vals, fd = 0.0, params = None):
+
+    """
+    Grassy state, encroached state and the saddle between them for every fb value with two stable equilibria.
+    The saddle is the equilibrium with one unstable direction that lies closest to the straight line between them.
+    Returns the fb values and three arrays of shape (n, 4).
+    """
+
+    points = ee.enumerate_equilibria(fb_vals, fd, params)
+    rows = []
+    for fb, group in points.groupby('fb'):
+        stable = group.loc[group['n_unstable'] == 0].sort_values('PS')
+        saddles = group.loc[group['n_unstable'] == 1]
+        if len(stable) != 2 or len(saddles) == 0:
+            continue
+        grassy, encroached = stable[ss.state_names].to_numpy()
+        X = saddles[ss.state_names].to_numpy()
+        detour = np.linalg.norm(X - grassy, axis = 1) + np.linalg.norm(X - encroached, axis = 1)
+        rows.append((fb, grassy, encroached, X[np.argmin(detour)]))
+
+    fb, grassy, encroached, saddle = zip(*rows)
+    return np.array(fb), np.array(grassy), np.array(encroached), np.array(saddle)
+
+
+def action_barriers(fb_vals, fd = 0.0, n_nodes = 100, params = None, sigma = 1.0):
+
+    """
+    Minimum action of the transitions grassy -> encroached and encroached -> grassy for all bistable fb values.
+    The state with the higher barrier is the more stable one (its rate of noise-induced escape is lower).
+    Returns a data frame and the paths (shape (n, 2, n_nodes, 4)).
+    """
+
+    fb, grassy, encroached, saddle = bistable_equilibria(fb_vals, fd, params)
+    x_start = np.stack([grassy, encroached], axis = 1)
+    x_end = np.stack([encroached, grassy], axis = 1)
+    x_via = np.stack([saddle, saddle], axis = 1)
+
+    paths, action, profile = minimum_action_path(x_start, x_end, fb[:, None], fd, x_via, n_nodes, params = params, sigma = sigma)
+
+    results = pd.DataFrame({'fb': fb, 'action_grassy_to_encroached': action[:, 0], 'action_encroached_to_grassy': action[:, 1]})
+    results['more_stable'] = np.where(results['action_grassy_to_encroached'] > results['action_encroached_to_grassy'], "grassy", "encroached")
+
+    return results, paths
+
+#-----------------------------------------------------------------------
+#Barriers for the bistable region of Fig. 2d
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+
+    results, paths = action_barriers(np.arange(0.0, 0.8, 0.01))
+    results.to_csv("action_barriers.csv")
+    print(results.to_string())
+
+    label_size = 20
+    fig = plt.figure(figsize = (8, 5))
+    plt.semilogy(results['fb'], results['action_grassy_to_encroached'], 'g-', label = 'grassy $\\rightarrow$ encroached')
+    plt.semilogy(results['fb'], results['action_encroached_to_grassy'], 'y-', label = 'encroached $\\rightarrow$ grassy')
+    plt.xlabel('farmer support $f_{b}$', fontsize = label_size)
+    plt.ylabel('action barrier', fontsize = label_size)
+    plt.legend()
+    plt.tight_layout()
+    fig.savefig("output/action_barriers.png", dpi = 300)
@@ -0,0 +1,166 @@
+"""
+Multi-fidelity sweeps: a cheap pre-scan of all cells, then paper-grade runs only for ambiguous cells
+
+Most cells of the grids of Fig. 2a-c and Fig. 4 have an obvious outcome. All cells are first integrated
+at low fidelity (loose tolerances, short horizon, sparse output, float32), as one batch. A cell is
+flagged as uncertain if
+- residual -> the right hand side at the end point is still large (not settled: slow transients close
+  to a fold, oscillations or populations on their way to extinction)
+- threshold -> the shrub density at the end point is close to PS_threshold
+- neighbours -> its grassy/encroached label differs from one of its grid neighbours
+Only the flagged cells are integrated again at the settings of the figure scripts (odeint-like tolerances,
+1000 time units, output at every time step for the last 300), and their results replace the pre-scan.
+
+Output: fraction of escalated cells, time saved and agreement with a full high-fidelity sweep for both grids
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+import savanna_setup as ss
+import drought_resistance as dr
+
+#threshold for shrub density that separates grassy and encroached states
+PS_threshold = 1.3
+
+#set carrying capacities (used for initial conditions)
+KH = 2     # carrying capacity of producer 1 (grasses)   2
+KS = 3
+
+#integration settings: horizon, length of the stationary part, output step, tolerances and floating point type
+fidelity_levels = {'low': {'t_end': 600, 'window': 100, 'step': 10, 'rtol': 1e-3, 'atol': 1e-6, 'dtype': np.float32},
+                   'high': {'t_end': 1000, 'window': 300, 'step': 1, 'rtol': 1e-8, 'atol': 1e-10, 'dtype': np.float64}}
+
+#-----------------------------------------------------------------------
+#Cells of the sweeps
+#-----------------------------------------------------------------------
+def fig2_cells(num_vals = 40, seed = 0):
+
+    "Cells of Fig. 2a-c: fb (columns) and fd (rows) with random initial conditions, arrays of shape (num_vals, num_vals, ...)"
+
+    rng = np.random.default_rng(seed)
+    f_vals = np.linspace(0.0, 0.8, num_vals)
+    FD, FB = np.meshgrid(f_vals, f_vals, indexing = 'ij')
+    X0 = rng.random((num_vals, num_vals, 4))*[KH/2, KS, KS/5, KH/2]
+    return X0, FB, FD
+
+
+def fig4_cells(num_vals = 40):
+
+    "Cells of Fig. 4: fb (columns) and drought severity (rows), starting directly after the drought"
+
+    f_vals = np.linspace(0.0, 0.8, num_vals)
+    disturbance_vals = np.linspace(50, 99, num_vals)
+    reference = ss.integrate_vec(dr.x0_grassy, [0, 1000], 0.3, 0.0)[-1]
+    pre = ss.integrate_vec(np.broadcast_to(reference, (num_vals, 4)), [0, 1000], f_vals, 0.0)[-1]
+    D, FB = np.meshgrid(disturbance_vals, f_vals, indexing = 'ij')
+    X0 = dr.drought(np.broadcast_to(pre, (num_vals, num_vals, 4)), D)
+    return X0, FB, np.zeros_like(FB)
+
+#-----------------------------------------------------------------------
+#Runs and uncertainty
+#-----------------------------------------------------------------------
+def run_cells(X0, fb, fd, fidelity = 'high'):
+
+    """
+    Integrates a stack of cells (X0 of shape (..., 4)) at one fidelity level and returns the outcomes of
+    Fig. 2a-c and Fig. 4 (shrub_ratio, browser_ratio, grazer_absolute, survivors), the end point and the
+    residual (largest component of the right hand side at the end point, relative to the state)
+    """
+
+    settings = fidelity_levels[fidelity] if isinstance(fidelity, str) else fidelity
+    dtype = settings['dtype']
+    t = np.concatenate([[0], np.arange(settings['t_end'] - settings['window'], settings['t_end'], settings['step'])])
+    X = ss.integrate_vec(np.asarray(X0, dtype = dtype), t, np.asarray(fb, dtype = dtype), np.asarray(fd, dtype = dtype),
+                         rtol = settings['rtol'], atol = settings['atol'])[1:].astype(float)
+
+    X_end = X[-1]
+    dX = ss.savannas_vec(X_end, fb, fd)
+    residual = np.max(np.abs(dX), axis = -1)/np.maximum(np.max(np.abs(X_end), axis = -1), 1e-3)
+
+    return {'shrub_ratio': X[..., 1].mean(axis = 0)/(X[..., 0] + X[..., 1]).mean(axis = 0),
+            'browser_ratio': X[..., 2].mean(axis = 0)/(X[..., 2] + X[..., 3]).mean(axis = 0),
+            'grazer_absolute': X[..., 3].mean(axis = 0),
+            'survivors': np.sum(X_end > ss.epsilon, axis = -1),
+            'encroached': X_end[..., 1] > PS_threshold,
+            'X_end': X_end, 'residual': residual}
+
+
+def uncertain_cells(outcomes, residual_tol = 1e-3, margin = 0.1):
+
+    """
+    Flags cells of a 2-D grid (outcomes from run_cells()) with uncertain outcome.
+    Returns a dictionary of boolean arrays for the three criteria and their combination ('any').
+    """
+
+    encroached = outcomes['encroached']
+    flags = {'residual': ~(outcomes['residual'] < residual_tol),
+             'threshold': np.abs(outcomes['X_end'][..., 1] - PS_threshold) < margin,
+             'neighbours': np.zeros(encroached.shape, dtype = bool)}
+
+    #label differs from a grid neighbour (both cells of a disagreeing pair are flagged)
+    rows = encroached[1:, :] != encroached[:-1, :]
+    cols = encroached[:, 1:] != encroached[:, :-1]
+    flags['neighbours'][1:, :] |= rows
+    flags['neighbours'][:-1, :] |= rows
+    flags['neighbours'][:, 1:] |= cols
+    flags['neighbours'][:, :-1] |= cols
+
+    flags['any'] = flags['residual'] | flags['threshold'] | flags['neighbours']
+    return flags
+
+
+def multi_fidelity_sweep(X0, fb, fd, residual_tol = 1e-3, margin = 0.1):
+
+    """
+    Low-fidelity pre-scan of a 2-D grid of cells (X0 of shape (n_rows, n_cols, 4), fb and fd of shape (n_rows, n_cols)),
+    followed by high-fidelity runs of the uncertain cells.
+    Returns the outcomes on the grid (with an entry 'escalated') and a report with the fraction of escalated cells,
+    the number of cells flagged by every criterion and the time of both passes.
+    """
+
+    start = time.perf_counter()
+    outcomes = run_cells(X0, fb, fd, 'low')
+    time_low = time.perf_counter() - start
+
+    flags = uncertain_cells(outcomes, residual_tol, margin)
+    escalated = flags['any']
+
+    start = time.perf_counter()
+    if np.any(escalated):
+        rerun = run_cells(X0[escalated], fb[escalated], fd[escalated], 'high')
+        for key, value in rerun.items():
+            outcomes[key] = outcomes[key].copy()
+            outcomes[key][escalated] = value
+    time_high = time.perf_counter() - start
+
+    outcomes['escalated'] = escalated
+    report = {'cells': escalated.size, 'fraction_escalated': escalated.mean(),
+              'flagged_residual': flags['residual'].sum(), 'flagged_threshold': flags['threshold'].sum(),
+              'flagged_neighbours': flags['neighbours'].sum(), 'time_low': time_low, 'time_high': time_high}
+
+    return outcomes, report
+
+#-----------------------------------------------------------------------
+#Grids of Fig. 2a-c and Fig. 4, compared with full high-fidelity sweeps
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+
+    rows = []
+    for name, (X0, FB, FD) in [('Fig2a-c', fig2_cells()), ('Fig4', fig4_cells())]:
+        outcomes, report = multi_fidelity_sweep(X0, FB, FD)
+
+        start = time.perf_counter()
+        full = run_cells(X0, FB, FD, 'high')
+        time_full = time.perf_counter() - start
+
+        report['sweep'] = name
+        report['time_full'] = time_full
+        report['time_saved'] = 1 - (report['time_low'] + report['time_high'])/time_full
+        report['label_agreement'] = np.mean(outcomes['encroached'] == full['encroached'])
+        report['largest_shrub_ratio_error'] = np.max(np.abs(outcomes['shrub_ratio'] - full['shrub_ratio']))
+        rows.append(report)
+
+    print(pd.DataFrame(rows).set_index('sweep').T.to_string())
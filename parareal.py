@@ -0,0 +1,165 @@
+"""
+Parallel-in-time (parareal) integration of long multi-section drought scenarios
+
+simulate_droughts() in Fig3_timeseries_transitions.py integrates one section after another, each starting
+from the end point of the previous one after a drought pulse. Parareal predicts the start states of all
+sections with a cheap coarse propagator G (odeint with loose tolerances, end point only) and corrects
+them with fine integrations F of all sections, which run concurrently in a process pool:
+
+    U[k+1] <- G_k(U_new[k]) + F_k(U_old[k]) - G_k(U_old[k])
+
+Both propagators include the drought pulse (and the reintroduction of browsers) at the end of the section.
+After j iterations the first j sections are exact, so the iteration stops at the serial answer after at most
+sections_number iterations; usually it converges to tolerance after a few. Only sections whose start
+state has changed are integrated again.
+
+Output: comparison of serial and parareal runs for the scenarios of Fig. 3
+"""
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy import integrate as integ
+
+import savanna_setup as ss
+
+#-----------------------------------------------------------------------
+#Sections and propagators
+#-----------------------------------------------------------------------
+def drought_pulse(x, d, introduce_browsers, threshold = ss.epsilon):
+
+    "Drought at the end of a section (kills d of the grasses and d/5 of the shrubs), with optional reintroduction of browsers"
+
+    PH, PS, C1, C2 = x
+    if C1 < threshold and introduce_browsers:
+        C1 = 0.01
+    return np.array([PH*(1 - d), PS*(1 - 0.2*d), C1, C2])
+
+
+def fine_section(x0, season_length, fb, fd, d, introduce_browsers, rtol = None, atol = None):
+
+    "Section as in simulate_droughts(): stored time series (time steps 0, ..., season_length - 1) and the state after the pulse"
+
+    X = integ.odeint(ss.savannas, x0, np.arange(0, season_length), args = (fb, fd), rtol = rtol, atol = atol)
+    return X, drought_pulse(X[-1], d, introduce_browsers)
+
+
+def coarse_section(x0, season_length, fb, fd, d, introduce_browsers, rtol = 1e-3, atol = 1e-6):
+
+    "Cheap prediction of the state after the pulse at the end of a section"
+
+    X = integ.odeint(ss.savannas, x0, [0, season_length - 1], args = (fb, fd), rtol = rtol, atol = atol)
+    return drought_pulse(X[-1], d, introduce_browsers)
+
+
+def _fine_worker(arguments):
+    return fine_section(*arguments)
+
+
+def assemble(sections, N0):
+
+    "Time series in the layout of simulate_droughts(): N0, then every section followed by the state after its pulse"
+
+    return np.concatenate([np.atleast_2d(N0)] + [np.vstack([X, x_end]) for X, x_end in sections])
+
+#-----------------------------------------------------------------------
+#Serial and parareal scenario runs
+#-----------------------------------------------------------------------
+def simulate_droughts_serial(sections_number, season_length, N0, f_values, d_values, introduce_browsers, fd = 0.0):
+
+    "Reference: same as simulate_droughts() in Fig3_timeseries_transitions.py"
+
+    sections = []
+    x = np.asarray(N0, dtype = float)
+    for k in range(sections_number):
+        X, x = fine_section(x, season_length, f_values[k], fd, d_values[k], introduce_browsers[k])
+        sections.append((X, x))
+
+    return assemble(sections, N0)
+
+
+def simulate_droughts_parareal(sections_number, season_length, N0, f_values, d_values, introduce_browsers, fd = 0.0,
+                               tol = 1e-6, max_iter = None, n_workers = None, coarse_rtol = 1e-3, coarse_atol = 1e-6):
+
+    """
+    Parareal version of simulate_droughts(): same arguments and output, plus a dictionary with the number of
+    iterations, the number of fine section integrations and the largest change of the section start states
+    in every iteration. The iteration stops when no start state changes by more than tol (absolute).
+    """
+
+    K = sections_number
+    max_iter = K if max_iter is None else max_iter
+    args = [(season_length, f_values[k], fd, d_values[k], introduce_browsers[k]) for k in range(K)]
+
+    def coarse(k, x):
+        return coarse_section(x, *args[k], rtol = coarse_rtol, atol = coarse_atol)
+
+    #initial prediction of the start states U[0], ..., U[K] with the coarse propagator
+    U = np.empty((K + 1, 4))
+    U[0] = N0
+    G = np.empty((K, 4))
+    for k in range(K):
+        G[k] = coarse(k, U[k])
+        U[k + 1] = G[k]
+
+    sections = [None]*K
+    starts = np.full((K, 4), np.nan)
+    changes = []
+    n_fine = 0
+
+    with ProcessPoolExecutor(n_workers) as pool:
+        for iteration in range(1, max_iter + 1):
+
+            #fine integrations of all sections whose start state has changed, in parallel
+            todo = [k for k in range(K) if not np.array_equal(starts[k], U[k])]
+            for k, result in zip(todo, pool.map(_fine_worker, [(U[k],) + args[k] for k in todo])):
+                sections[k] = result
+                starts[k] = U[k]
+            n_fine += len(todo)
+
+            #serial correction with the coarse propagator
+            U_new = U.copy()
+            for k in range(K):
+                G_new = coarse(k, U_new[k])
+                U_new[k + 1] = G_new + sections[k][1] - G[k]
+                G[k] = G_new
+
+            changes.append(np.max(np.abs(U_new - U)))
+            U = U_new
+            if changes[-1] < tol:
+                break
+
+        #sections that start from a changed state are integrated once more, so that the output is continuous
+        todo = [k for k in range(K) if not np.array_equal(starts[k], U[k])]
+        for k, result in zip(todo, pool.map(_fine_worker, [(U[k],) + args[k] for k in todo])):
+            sections[k] = result
+        n_fine += len(todo)
+
+    return assemble(sections, N0), {'iterations': iteration, 'fine_sections': n_fine, 'changes': changes}
+
+#-----------------------------------------------------------------------
+#Scenarios of Fig. 3, and a long scenario with many sections
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+
+    N0 = [1.0, 0.2, 0.5, 0.1]
+    scenarios = {'Fig3a': ([0, 0, 0.35, 0.35, 0, 0], [0.95, 0, 0.95, 0, 0, 0], [0, 0, 0, 0, 1, 0]),
+                 'Fig3b': ([0, 0, 0.5, 0.5, 0, 0], [0.95, 0, 0.95, 0, 0, 0], [0, 0, 0, 0, 1, 0]),
+                 'long': (list(np.repeat([0, 0.35, 0.5, 0], 10)), [0.5, 0, 0, 0, 0]*8, [0, 0, 0, 0, 1]*8)}
+
+    for name, (f_values, d_values, introduce_browsers) in scenarios.items():
+        K = len(f_values)
+
+        start = time.perf_counter()
+        N_serial = simulate_droughts_serial(K, 1000, N0, f_values, d_values, introduce_browsers)
+        time_serial = time.perf_counter() - start
+
+        start = time.perf_counter()
+        N_parareal, info = simulate_droughts_parareal(K, 1000, N0, f_values, d_values, introduce_browsers)
+        time_parareal = time.perf_counter() - start
+
+        #with one worker per section, the wall time is about (iterations + 1) fine sections instead of K
+        print("{}: {} sections, {} iterations, {} fine sections, largest difference to serial {:.1e}, "
+              "serial {:.2f} s, parareal {:.2f} s".format(name, K, info['iterations'], info['fine_sections'],
+                                                          np.max(np.abs(N_parareal - N_serial)), time_serial, time_parareal))
@@ -0,0 +1,205 @@
+"""
+Probabilities of rare transitions to the encroached state under random droughts (adaptive multilevel splitting)
+
+Droughts are random, as a stochastic version of simulate_droughts() in Fig3_timeseries_transitions.py:
+every season starts with a drought of random severity d (Beta distributed, killing d of the grasses and d/5
+of the shrubs), followed by season_length time units of growth. A transition has happened when the shrub
+fraction PS/(PH + PS) at the end of a season is above z_B.
+
+Under mild drought regimes, transitions within the time horizon are rare. Adaptive multilevel splitting
+(AMS) estimates their probability with a reaction coordinate, the shrub fraction:
+1. n_replicas trajectories are simulated, each scored by its highest shrub fraction at the end of a season.
+2. The n_kill trajectories with the lowest scores are killed and replaced by copies of surviving trajectories,
+   which are resimulated with new droughts from the first season at which they exceeded the killed level.
+3. This is repeated until the killed level reaches z_B. The probability is the product of the survival
+   fractions (1 - n_killed/n_replicas) times the fraction of final trajectories that have made the transition.
+
+All replacements of one iteration are integrated as one batch. Independent repetitions run in parallel
+processes, and their spread gives the standard error of the estimate. Where the probability is large
+enough, plain Monte Carlo estimates with the same number of repetitions check the AMS estimates and compare
+the variance and cost per estimate.
+
+Output: rare_transitions.csv (AMS and Monte Carlo estimates, with variance and cost per estimate)
+"""
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import savanna_setup as ss
+
+#initial conditions that lead to the grassy state (same as in Fig1b_example_timeseries.py)
+x0_grassy = [1.0, 0.2, 0.5, 0.1]
+
+#-----------------------------------------------------------------------
+#Random drought seasons
+#-----------------------------------------------------------------------
+def shrub_fraction(X):
+
+    "Reaction coordinate PS/(PH + PS)"
+
+    return X[..., 1]/(X[..., 0] + X[..., 1])
+
+
+def run_seasons(X_start, first, n_seasons, fb, fd = 0.0, season_length = 20.0, severity = (2.0, 8.0), z_B = 0.9, rng = None):
+
+    """
+    Continues a batch of trajectories: X_start (shape (k, 4)) are the states at the end of season first - 1
+    (first can differ between members). Every season starts with a drought of Beta(*severity) distributed severity.
+    Members stop at the first season that ends with a shrub fraction above z_B.
+
+    Returns the states at the end of every season (shape (k, n_seasons, 4), nan after the transition),
+    the number of simulated seasons and the season of the transition (-1 if there was none).
+    """
+
+    rng = np.random.default_rng(rng)
+    X = np.array(X_start, dtype = float)
+    first = np.broadcast_to(np.asarray(first), (len(X),))
+    ends = np.full((len(X), n_seasons, 4), np.nan)
+    hit = np.full(len(X), -1)
+    n_simulated = 0
+
+    for j in range(first.min(), n_seasons):
+        active = np.nonzero((first <= j) & (hit < 0))[0]
+        #members with a later first season may still be waiting
+        if len(active) == 0:
+            continue
+        d = rng.beta(*severity, size = len(active))
+        x = X[active]*np.stack([1 - d, 1 - d/5, np.ones_like(d), np.ones_like(d)], axis = -1)
+        X[active] = ss.integrate_vec(x, [0, season_length], fb, fd)[-1]
+        ends[active, j] = X[active]
+        hit[active[shrub_fraction(X[active]) >= z_B]] = j
+        n_simulated += len(active)
+
+    return ends, n_simulated, hit
+
+
+def splitting(x0, n_seasons, fb, fd = 0.0, season_length = 20.0, severity = (2.0, 8.0), z_B = 0.9,
+              n_replicas = 1000, n_kill = 100, max_iter = 10000, seed = None):
+
+    """
+    One adaptive multilevel splitting estimate of the probability that a trajectory starting at x0 makes a
+    transition (shrub fraction above z_B at the end of a season) within n_seasons.
+    Returns a dictionary with the probability, the mean transition time of the trajectories that make the
+    transition, the number of iterations and the number of simulated seasons (cost).
+    """
+
+    rng = np.random.default_rng(seed)
+    X0 = np.broadcast_to(np.asarray(x0, dtype = float), (n_replicas, 4))
+    ends, cost, hit = run_seasons(X0, 0, n_seasons, fb, fd, season_length, severity, z_B, rng)
+    xi = shrub_fraction(ends)
+    score = np.nanmax(xi, axis = 1)
+    weight = 1.0
+
+    for iteration in range(max_iter):
+        level = np.sort(score)[n_kill - 1]
+        if level >= z_B:
+            break
+        killed = np.nonzero(score <= level)[0]
+        survivors = np.nonzero(score > level)[0]
+        if len(survivors) == 0:
+            weight = 0.0
+            break
+        weight *= 1 - len(killed)/n_replicas
+
+        #copy a random survivor up to the first season above the level, then resimulate with new droughts
+        parents = rng.choice(survivors, size = len(killed))
+        branch = np.argmax(xi[parents] > level, axis = 1)
+        ends[killed] = np.nan
+        for k, parent, j in zip(killed, parents, branch):
+            ends[k, :j + 1] = ends[parent, :j + 1]
+        #copies of a transition that happened in the branching season are already complete
+        complete = hit[parents] == branch
+        new_ends, n_simulated, new_hit = run_seasons(ends[killed, branch], np.where(complete, n_seasons, branch + 1),
+                                                    n_seasons, fb, fd, season_length, severity, z_B, rng)
+        keep = np.arange(n_seasons)[None, :] > branch[:, None]
+        ends[killed] = np.where(keep[..., None], new_ends, ends[killed])
+        hit[killed] = np.where(complete, branch, new_hit)
+        cost += n_simulated
+
+        xi[killed] = shrub_fraction(ends[killed])
+        score[killed] = np.nanmax(xi[killed], axis = 1)
+
+    reached = hit >= 0
+    return {'probability': weight*np.mean(reached),
+            'mean_transition_time': np.mean((hit[reached] + 1)*season_length) if np.any(reached) else np.nan,
+            'iterations': iteration, 'simulated_seasons': cost}
+
+
+def monte_carlo(x0, n_runs, n_seasons, fb, fd = 0.0, season_length = 20.0, severity = (2.0, 8.0), z_B = 0.9, seed = None):
+
+    "Plain Monte Carlo estimate of the same probability, for comparison"
+
+    X0 = np.broadcast_to(np.asarray(x0, dtype = float), (n_runs, 4))
+    _, cost, hit = run_seasons(X0, 0, n_seasons, fb, fd, season_length, severity, z_B, seed)
+    reached = hit >= 0
+    return {'probability': np.mean(reached),
+            'mean_transition_time': np.mean((hit[reached] + 1)*season_length) if np.any(reached) else np.nan,
+            'iterations': 0, 'simulated_seasons': cost}
+
+
+#estimators, called with the same arguments (monte_carlo additionally needs n_runs)
+estimators = {'splitting': splitting, 'monte_carlo': monte_carlo}
+
+
+def _estimate_worker(arguments):
+    method, kwargs, seed = arguments
+    start = time.perf_counter()
+    result = estimators[method](seed = seed, **kwargs)
+    result['wall_time'] = time.perf_counter() - start
+    return result
+
+
+def transition_probability(fb, n_seasons = 50, fd = 0.0, n_repeats = 8, n_workers = None, seed = 0, x0 = None,
+                           method = 'splitting', **kwargs):
+
+    """
+    Independent repetitions of an estimator ('splitting' or 'monte_carlo') in parallel processes, starting on the
+    grassy state at fb. Returns a data frame with one row per repetition and a summary with the mean probability,
+    the spread of the single estimates (std_estimate) and its standard error, the cost of one estimate
+    (simulated seasons and wall time), the work-normalised relative variance (std_estimate/p)^2 * seasons per
+    estimate (lower is better), the mean transition time and the mean first passage time, estimated as
+    -n_seasons*season_length/log(1 - p) (i.e. assuming that windows of n_seasons are independent).
+    """
+
+    if x0 is None:
+        x0 = ss.integrate_vec(x0_grassy, [0, 1000], fb, fd)[-1]
+    kwargs = dict(kwargs, x0 = x0, n_seasons = n_seasons, fb = fb, fd = fd)
+    seeds = np.random.SeedSequence(seed).spawn(n_repeats)
+
+    with ProcessPoolExecutor(n_workers) as pool:
+        runs = pd.DataFrame(list(pool.map(_estimate_worker, [(method, kwargs, s) for s in seeds])))
+
+    p = runs['probability'].mean()
+    std = runs['probability'].std()
+    seasons = runs['simulated_seasons'].mean()
+    horizon = n_seasons*kwargs.get('season_length', 20.0)
+    summary = {'fb': fb, 'method': method, 'probability': p, 'std_estimate': std, 'standard_error': std/np.sqrt(n_repeats),
+               'seasons_per_estimate': seasons, 'wall_time_per_estimate': runs['wall_time'].mean(),
+               'work_relative_variance': (std/p)**2*seasons if p > 0 else np.inf,
+               'mean_transition_time': runs['mean_transition_time'].mean(),
+               'mean_first_passage_time': -horizon/np.log1p(-p) if p > 0 else np.inf}
+
+    return runs, summary
+
+#-----------------------------------------------------------------------
+#AMS against plain Monte Carlo where transitions are frequent enough, then AMS alone for rare transitions
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+
+    rows = []
+    for fb in [0.4, 0.45, 0.5]:
+        for method, options in [('splitting', {'n_replicas': 200, 'n_kill': 20}), ('monte_carlo', {'n_runs': 2000})]:
+            runs, summary = transition_probability(fb, method = method, **options)
+            rows.append(summary)
+
+    #at fb = 0.35, 2000 Monte Carlo runs per estimate do not see any transition
+    runs, summary = transition_probability(0.35, n_replicas = 500, n_kill = 50)
+    rows.append(summary)
+
+    results = pd.DataFrame(rows)
+    print(results[['fb', 'method', 'probability', 'std_estimate', 'seasons_per_estimate', 'wall_time_per_estimate',
+                   'work_relative_variance']].to_string())
+    results.to_csv("rare_transitions.csv")
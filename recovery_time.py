@@ -0,0 +1,123 @@
+"""
+Recovery time and return rate after drought disturbances (engineering resilience), as maps over fb and drought severity
+
+Fig4_resistance_to_drought_heatmap.py records where the system ends up after a drought. This sweep
+additionally reports, from the same post-drought integration:
+- recovery_time -> first time at which the state is back within a relative distance tol of the pre-drought
+  equilibrium, located with event detection on the dense output of the integrator (inf if the system
+  does not return, e.g. after a transition to the encroached state)
+- return_rate -> linearised return rate -max Re(eigenvalue) of the Jacobian at the pre-drought equilibrium
+  (restricted to the surviving populations), for all cells in one batch
+- recovery_time_linear -> log(initial distance/tol)/return_rate, the recovery time predicted by the linearisation
+
+The pre-drought states are reached from the end point of a reference run at fb = 0.3 (as in Fig4) and refined
+with Newton's method. A drought of severity d kills d% of grass biomass and d/5% of shrub biomass.
+
+Output: recovery_time.csv and heatmaps of the recovery time and the return rate
+"""
+
+import numpy as np
+import pandas as pd
+from matplotlib import pyplot as plt
+
+import savanna_setup as ss
+import drought_resistance as dr
+
+#define time array for simulations (as in Fig4)
+t_end = 1000
+t_stationary = np.arange(t_end - 300, t_end)     # stationary part of the time series
+
+#-----------------------------------------------------------------------
+#Define functions
+#-----------------------------------------------------------------------
+def pre_drought_states(fb_vals, fd = 0.0, x_start = None):
+
+    "Pre-drought equilibria for all fb values, reached from x_start (default: end point of a reference run at fb = 0.3)"
+
+    fb_vals = np.asarray(fb_vals, dtype = float)
+    if x_start is None:
+        x_start = ss.integrate_vec(dr.x0_grassy, [0, t_end], 0.3, fd)[-1]
+    pre = ss.integrate_vec(np.broadcast_to(x_start, fb_vals.shape + (4,)), [0, t_end], fb_vals, fd)[-1]
+    x_eq, residual = ss.newton_vec(pre, fb_vals, fd)
+
+    return np.where((residual < 1e-8)[..., None], x_eq, pre)
+
+
+def recovery_sweep(fb_vals, disturbance_vals, fd = 0.0, tol = 0.01, x_start = None, recovery = True):
+
+    """
+    Fig4-style sweep over all combinations of fb_vals and disturbance_vals (in %).
+    Returns a data frame with one row per cell and the columns of Fig4 (shrub_ratio, browser_ratio,
+    grazer_absolute); with recovery = True also recovery_time, return_rate and recovery_time_linear.
+    All cells are integrated once, as one batch.
+    """
+
+    fb_vals = np.asarray(fb_vals, dtype = float)
+    x_eq = pre_drought_states(fb_vals, fd, x_start)
+
+    FB, D = np.meshgrid(np.arange(len(fb_vals)), np.asarray(disturbance_vals, dtype = float), indexing = 'ij')
+    FB = FB.ravel()
+    D = D.ravel()
+    target = x_eq[FB]
+    X0 = dr.drought(target, D)
+
+    #relative distance to the pre-drought equilibrium, recovered when below tol
+    scale = np.linalg.norm(target, axis = -1)
+
+    def returned(X, tm):
+        return np.linalg.norm(X - target, axis = -1)/scale - tol
+
+    t = np.concatenate([[0], t_stationary])
+    if recovery:
+        X, t_event = ss.integrate_vec(X0, t, fb_vals[FB], fd, event = returned)
+    else:
+        X = ss.integrate_vec(X0, t, fb_vals[FB], fd)
+    X = X[1:]
+
+    results = pd.DataFrame({'fb': fb_vals[FB], 'disturbance': D,
+                            'shrub_ratio': X[..., 1].mean(axis = 0)/(X[..., 0] + X[..., 1]).mean(axis = 0),
+                            'browser_ratio': X[..., 2].mean(axis = 0)/(X[..., 2] + X[..., 3]).mean(axis = 0),
+                            'grazer_absolute': X[..., 3].mean(axis = 0)})
+
+    if recovery:
+        #extinct populations stay extinct, so their directions do not count (very fast decay instead)
+        J = ss.jacobian_vec(x_eq, fb_vals, fd)
+        extinct = x_eq < ss.epsilon
+        J = np.where(extinct[..., :, None] | extinct[..., None, :], 0.0, J) - np.where(extinct, 1e6, 0.0)[..., None]*np.eye(4)
+        return_rate = -np.max(np.linalg.eigvals(J).real, axis = -1)[FB]
+        distance = np.linalg.norm(X0 - target, axis = -1)/scale
+        results['recovery_time'] = np.where(np.isnan(t_event), np.inf, t_event)
+        results['return_rate'] = return_rate
+        with np.errstate(all = 'ignore'):
+            results['recovery_time_linear'] = np.where(return_rate > 0, np.log(np.maximum(distance/tol, 1.0))/return_rate, np.inf)
+
+    return results
+
+#-----------------------------------------------------------------------
+#Recovery maps for the grid of Fig. 4
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+
+    import time
+
+    num_vals = 40
+    f_vals = np.linspace(0.0, 0.8, num_vals)
+    disturbance_vals = np.linspace(50, 99, num_vals)
+
+    start = time.perf_counter()
+    results = recovery_sweep(f_vals, disturbance_vals)
+    print("sweep with recovery times: {:.1f} s".format(time.perf_counter() - start))
+    results.to_csv("recovery_time.csv")
+
+    label_size = 20
+    fig = plt.figure(figsize = (12, 5), constrained_layout = True)
+    for k, (column, title) in enumerate([('recovery_time', "time to recover within 1% \n of the pre-drought state"),
+                                         ('return_rate', "linearised return rate \n at the pre-drought state")]):
+        plt.subplot(1, 2, k + 1)
+        values = results[column].to_numpy().reshape(num_vals, num_vals).T
+        plt.pcolor(f_vals, disturbance_vals, np.where(np.isfinite(values), values, np.nan))
+        plt.title(title, fontsize = label_size)
+        plt.xlabel('farmer support $f_{b}$', fontsize = label_size)
+        plt.ylabel('severity of drought $d$', fontsize = label_size)
+        plt.colorbar()
+    fig.savefig("output/recovery_time.png", dpi = 300)
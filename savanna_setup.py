@@ -0,0 +1,381 @@
+"""
+Model setup shared by all scripts: standard parameter values and the system of differential equations
+
+- savannas() -> right hand side for a single state, used with integ.odeint
+- savannas_vec() -> same equations evaluated for a whole stack of states at once
+- jacobian_vec() -> analytic Jacobian matrices for a stack of states
+"""
+
+import numpy as np
+
+#--------------------------------------------------------------------
+#define all parameter values
+#--------------------------------------------------------------------
+rH = 1.0   # intrinsic growth rate of producer 1 (grasses)    1.0
+rS = 0.5   # intrinsic growth rate of producer 2 (shrubs)     0.5
+
+KH = 2     # carrying capacity of producer 1 (grasses)   2
+KS = 3     # carrying capacity of producer 2 (shrubs)     3
+
+c = 0.3    # interspecific competition - shrubs affect grasses   0.2   or 0.3
+
+mb = 0.15   # consumer background mortality rate         0.15
+md = 0.05    # consumer density-dependent mortality rate     0.05
+
+fb = 0.0  # farmer support (reduce background mortality & respiration loss rate)
+fd = 0.0  # farmer support (reduce density dependent mortality)
+
+e = 0.45   # conversion efficiency
+a = 1      # attack rate
+h = 3      # handling time
+
+epsilon = 0.00001  # extinction threshold
+
+#preferences
+pHB = 0.3    # browser preference for grasses
+pSB = 1- pHB # browser preference for shrubs
+
+pHG = 0.7    # grazer preference for grasses
+pSG = 1- pHG # grazer preference for shrubs
+
+#all parameters, except for fb and fd, collected in one dictionary (same set as in total_feedback.py)
+our_parameter_set = {'rH': rH, 'rS': rS, 'KH': KH, 'KS': KS, 'c': c, 'mb': mb, 'md': md, 'e': e, 'a': a, 'h': h,
+                     'pHB': pHB, 'pHG': pHG, 'pSB': pSB, 'pSG': pSG}
+
+#names of the state variables, in the order used by all state arrays
+state_names = ['PH', 'PS', 'CB', 'CG']
+
+#--------------------------------------------------------------------
+#define the system of equations
+#--------------------------------------------------------------------
+def savannas(x, t, fb, fd, threshold = epsilon):
+
+        #farmer support can be given as a function of time (see farmer_schedules.py)
+        if callable(fb):
+            fb = fb(t)
+        if callable(fd):
+            fd = fd(t)
+
+        PH = x[0]  #Producer 1 -> grasses
+        PS = x[1]  #Producer 2 -> shrubs
+        CB = x[2]  #Consumer 1 -> browsers
+        CG = x[3]  #Consumer 2 -> grazers
+
+        #Functional responses
+        FHB = (a * PH * pHB)/(1 + a * h * PH * pHB)      #browsers eating grasses
+        FHG = (a * PH * pHG)/(1 + a * h * PH * pHG)      #grazers eating grasses
+        FSB = (a * PS * pSB)/(1 + a * h * PS * pSB)      #browsers eating shrubs
+        FSG = (a * PS * pSG)/(1 + a * h * PS * pSG)      #grazers eating shrubs
+
+        #Differential Equations
+
+        #if conditions are used to mimick an extinction threshold
+        if PH < threshold:
+            dPH_dt = 0
+        else:
+            dPH_dt = rH * PH * (1-((PH + c*PS) /KH))- FHB*CB - FHG*CG  # grasses
+
+        if PS < threshold:
+            dPS_dt = 0
+        else:
+            dPS_dt = rS * PS * (1-((PS + c*PH) /KS))- FSB*CB - FSG*CG   # shrubs
+
+        if CB < threshold:
+            dCB_dt = 0
+        else:
+            dCB_dt = e*(FHB+FSB)*CB - mb*CB - md*CB*CB        # browser
+
+        if CG < threshold:
+            dCG_dt = 0
+        else:
+            dCG_dt = e*(FHG+FSG)*CG - mb*(1-fb)*CG - md*(1-fd)*CG*CG  # grazer
+
+        return [dPH_dt, dPS_dt, dCB_dt, dCG_dt]
+
+#--------------------------------------------------------------------
+#vectorised versions
+#--------------------------------------------------------------------
+def get_parameters(params = None):
+
+    """
+    Returns the full parameter dictionary. Entries of params replace the standard values,
+    they can be scalars or arrays that broadcast against the stack of states.
+    """
+
+    p = dict(our_parameter_set)
+    if params is not None:
+        p.update(params)
+    return p
+
+
+def savannas_vec(X, fb, fd, params = None, threshold = epsilon):
+
+    """
+    Evaluates the differential equations for a stack of states X with shape (..., 4).
+    fb, fd and all entries of params broadcast against X[..., 0].
+    Returns an array with the same shape as X.
+    """
+
+    p = get_parameters(params)
+    X = np.asarray(X)
+    PH = X[..., 0]
+    PS = X[..., 1]
+    CB = X[..., 2]
+    CG = X[..., 3]
+
+    #Functional responses
+    FHB = (p['a'] * PH * p['pHB'])/(1 + p['a'] * p['h'] * PH * p['pHB'])
+    FHG = (p['a'] * PH * p['pHG'])/(1 + p['a'] * p['h'] * PH * p['pHG'])
+    FSB = (p['a'] * PS * p['pSB'])/(1 + p['a'] * p['h'] * PS * p['pSB'])
+    FSG = (p['a'] * PS * p['pSG'])/(1 + p['a'] * p['h'] * PS * p['pSG'])
+
+    dPH_dt = p['rH'] * PH * (1-((PH + p['c']*PS) /p['KH']))- FHB*CB - FHG*CG
+    dPS_dt = p['rS'] * PS * (1-((PS + p['c']*PH) /p['KS']))- FSB*CB - FSG*CG
+    dCB_dt = p['e']*(FHB+FSB)*CB - p['mb']*CB - p['md']*CB*CB
+    dCG_dt = p['e']*(FHG+FSG)*CG - p['mb']*(1-fb)*CG - p['md']*(1-fd)*CG*CG
+
+    dX = np.stack(np.broadcast_arrays(dPH_dt, dPS_dt, dCB_dt, dCG_dt), axis = -1)
+
+    #extinction threshold, same as the if conditions in savannas()
+    if threshold is not None:
+        dX = np.where(X < threshold, 0.0, dX)
+
+    return dX
+
+
+def jacobian_vec(X, fb, fd, params = None):
+
+    """
+    Analytic Jacobian matrices for a stack of states X with shape (..., 4).
+    Returns an array of shape (..., 4, 4) with J[..., i, j] = d(dx_i/dt)/dx_j.
+    The extinction threshold is ignored, as in total_feedback.py.
+    """
+
+    p = get_parameters(params)
+    X = np.asarray(X, dtype = float)
+    PH = X[..., 0]
+    PS = X[..., 1]
+    CB = X[..., 2]
+    CG = X[..., 3]
+
+    #functional responses and their derivatives with respect to the plant density
+    def holling(P, pref):
+        denom = 1 + p['a'] * p['h'] * P * pref
+        return p['a'] * P * pref / denom, p['a'] * pref / denom**2
+
+    FHB, dFHB = holling(PH, p['pHB'])
+    FHG, dFHG = holling(PH, p['pHG'])
+    FSB, dFSB = holling(PS, p['pSB'])
+    FSG, dFSG = holling(PS, p['pSG'])
+
+    J = np.zeros(np.broadcast(PH, fb, fd, *[np.asarray(v) for v in p.values()]).shape + (4, 4))
+
+    #grasses
+    J[..., 0, 0] = p['rH'] * (1 - (2*PH + p['c']*PS)/p['KH']) - dFHB*CB - dFHG*CG
+    J[..., 0, 1] = -p['rH'] * p['c'] * PH / p['KH']
+    J[..., 0, 2] = -FHB
+    J[..., 0, 3] = -FHG
+    #shrubs
+    J[..., 1, 0] = -p['rS'] * p['c'] * PS / p['KS']
+    J[..., 1, 1] = p['rS'] * (1 - (2*PS + p['c']*PH)/p['KS']) - dFSB*CB - dFSG*CG
+    J[..., 1, 2] = -FSB
+    J[..., 1, 3] = -FSG
+    #browsers
+    J[..., 2, 0] = p['e'] * dFHB * CB
+    J[..., 2, 1] = p['e'] * dFSB * CB
+    J[..., 2, 2] = p['e']*(FHB + FSB) - p['mb'] - 2*p['md']*CB
+    #grazers
+    J[..., 3, 0] = p['e'] * dFHG * CG
+    J[..., 3, 1] = p['e'] * dFSG * CG
+    J[..., 3, 3] = p['e']*(FHG + FSG) - p['mb']*(1-fb) - 2*p['md']*(1-fd)*CG
+
+    return J
+
+
+#--------------------------------------------------------------------
+#vectorised integration
+#--------------------------------------------------------------------
+#Dormand-Prince 5(4) coefficients
+_c = np.array([0, 1/5, 3/10, 4/5, 8/9, 1])
+_A = [[],
+      [1/5],
+      [3/40, 9/40],
+      [44/45, -56/15, 32/9],
+      [19372/6561, -25360/2187, 64448/6561, -212/729],
+      [9017/3168, -355/33, 46732/5247, 49/176, -5103/18656]]
+_b = np.array([35/384, 0, 500/1113, 125/192, -2187/6784, 11/84])
+_e = np.array([71/57600, 0, -71/16695, 71/1920, -17253/339200, 22/525, -1/40])
+
+
+def dopri_vec(rhs, X0, t, rtol = 1e-6, atol = 1e-9, max_steps = 100000, event = None):
+
+    """
+    Explicit Runge-Kutta integration (Dormand-Prince 5(4)) of a stack of independent systems.
+    Every member of the stack has its own adaptive step size, so that one stiff or fast member
+    does not slow down all others.
+
+    rhs(X, tm) -> derivatives for the stack X (shape (..., n)) at the member times tm (shape X.shape[:-1])
+    X0 -> initial states, shape (m, ..., n) with at least one stack axis, given at t[0]
+    t -> output times (increasing)
+    event(X, tm) -> optional function with one value per member; the first time at which it becomes <= 0 is
+                    located on the dense output (cubic Hermite interpolation within each step)
+
+    Returns an array of shape (len(t), ..., n), and with an event also the event times (nan if it did not occur).
+    float32 initial states are integrated in single precision (e.g. for cheap pre-scans), all others in double precision.
+    """
+
+    dtype = np.float32 if np.asarray(X0).dtype == np.float32 else float
+    X0 = np.asarray(X0, dtype = dtype)
+    t = np.asarray(t, dtype = dtype)
+    c_, b_, e_ = _c.astype(dtype), _b.astype(dtype), _e.astype(dtype)
+
+    batch = X0.shape[:-1]
+
+    out = np.empty((len(t),) + X0.shape, dtype = dtype)
+    out[0] = X0
+
+    y = X0.copy()
+    tm = np.full(batch, t[0])
+    k_out = np.ones(batch, dtype = int)       # index of the next output time of each member
+    f = rhs(y, tm)
+
+    #initial step size from the size of the derivatives (ratio bounded where d1 is small, that branch is not used)
+    scale = atol + rtol * np.abs(y)
+    d0 = np.sqrt(np.mean((y / scale)**2, axis = -1))
+    d1 = np.sqrt(np.mean((f / scale)**2, axis = -1))
+    h = np.where((d0 < 1e-5) | (d1 < 1e-5), 1e-6, 0.01 * d0 / np.maximum(d1, 1e-5))
+    if len(t) > 1:
+        h = np.minimum(h, t[-1] - t[0])
+
+    if event is not None:
+        g = event(y, tm)
+        t_event = np.where(g <= 0, tm, np.nan)
+
+    n_steps = 0
+    while np.any(k_out < len(t)):
+
+        n_steps += 1
+        if n_steps > max_steps:
+            raise RuntimeError("dopri_vec: maximum number of steps exceeded")
+
+        active = k_out < len(t)
+        t_target = t[np.minimum(k_out, len(t) - 1)]
+        h_try = np.where(active, np.minimum(h, t_target - tm), 0.0)
+        hh = h_try[..., None]
+
+        #Runge-Kutta stages
+        K = [f]
+        for s in range(1, 6):
+            ys = y + hh * sum(a_sj * K[j] for j, a_sj in enumerate(_A[s]))
+            K.append(rhs(ys, tm + c_[s] * h_try))
+        y_new = y + hh * sum(b_j * K[j] for j, b_j in enumerate(b_) if b_j != 0)
+        f_new = rhs(y_new, tm + h_try)
+        K.append(f_new)
+
+        #error estimate
+        err_vec = hh * sum(e_j * K[j] for j, e_j in enumerate(e_) if e_j != 0)
+        scale = atol + rtol * np.maximum(np.abs(y), np.abs(y_new))
+        err = np.sqrt(np.mean((err_vec / scale)**2, axis = -1))
+
+        accept = active & (err <= 1)
+        hit = accept & (h_try >= t_target - tm)
+
+        if event is not None:
+            g_new = np.where(accept, event(y_new, tm + h_try), g)
+            crossed = accept & np.isnan(t_event) & (g_new <= 0)
+            if np.any(crossed):
+                #bisection on the cubic Hermite interpolant between the old and the new state
+                lo = np.zeros(batch)
+                hi = np.ones(batch)
+                for i in range(30):
+                    theta = (lo + hi)/2
+                    th = theta[..., None]
+                    y_theta = (1 + 2*th)*(1 - th)**2*y + th*(1 - th)**2*hh*f + th**2*(3 - 2*th)*y_new - th**2*(1 - th)*hh*f_new
+                    below = event(y_theta, tm + theta*h_try) <= 0
+                    hi = np.where(below, theta, hi)
+                    lo = np.where(below, lo, theta)
+                t_event = np.where(crossed, tm + hi*h_try, t_event)
+            g = g_new
+
+        y = np.where(accept[..., None], y_new, y)
+        f = np.where(accept[..., None], f_new, f)
+        tm = np.where(hit, t_target, np.where(accept, tm + h_try, tm))
+
+        #store output for members that reached their next output time
+        if np.any(hit):
+            idx = np.nonzero(hit)
+            out[(k_out[idx],) + idx] = y[idx]
+            k_out = k_out + hit
+
+        #new step sizes
+        factor = np.clip(0.9 * np.maximum(err, 1e-10)**(-0.2), 0.2, 10.0)
+        factor = np.where(accept, factor, np.minimum(factor, 1.0))
+        h = np.where(hit, np.maximum(h, h_try * factor), h_try * factor)
+        h = np.where(active, h, 0.0)
+
+    if event is not None:
+        return out, t_event
+    return out
+
+
+def integrate_vec(X0, t, fb, fd, params = None, threshold = epsilon, rtol = 1e-6, atol = 1e-9, event = None):
+
+    """
+    Integrates a whole stack of initial conditions X0 (shape (..., 4)) at once.
+    fb, fd and all entries of params broadcast against X0[..., 0], so that every simulation
+    can have its own parameter values. fb and fd can also be functions of time (schedules), which
+    are called with the current time of every member and return values that broadcast in the same way.
+    Returns an array of shape (len(t), ..., 4), analogous to the output of integ.odeint,
+    and with an event function (see dopri_vec) also the event times. float32 initial states are integrated in single precision.
+    """
+
+    X0 = np.asarray(X0, dtype = np.float32 if np.asarray(X0).dtype == np.float32 else float)
+    t0 = np.asarray(t[0], dtype = float)
+    fb_0 = fb(t0) if callable(fb) else fb
+    fd_0 = fd(t0) if callable(fd) else fd
+    shape = np.broadcast(X0[..., 0], fb_0, fd_0, *[np.asarray(v) for v in get_parameters(params).values()]).shape + (4,)
+
+    #a single system is integrated as a stack of one
+    if len(shape) == 1:
+        single_event = None if event is None else (lambda X, tm: np.asarray(event(X[0], tm[0]))[None])
+        result = integrate_vec(X0[None], t, fb, fd, params, threshold, rtol, atol, single_event)
+        return result[:, 0] if event is None else (result[0][:, 0], result[1][0])
+
+    X0 = np.broadcast_to(X0, shape)
+
+    def rhs(X, tm):
+        fb_t = fb(tm) if callable(fb) else fb
+        fd_t = fd(tm) if callable(fd) else fd
+        return savannas_vec(X, fb_t, fd_t, params, threshold).astype(X.dtype, copy = False)
+
+    return dopri_vec(rhs, X0, t, rtol, atol, event = event)
+
+
+def newton_vec(X, fb, fd, params = None, tol = 1e-10, max_iter = 20, threshold = epsilon):
+
+    """
+    Refines a stack of approximate equilibria X (shape (..., 4)) with Newton's method, using the analytic Jacobian.
+    Populations below the extinction threshold are kept fixed.
+    Returns the refined states and the largest component of the right hand side at each of them.
+    """
+
+    X = np.array(X, dtype = float)
+    extinct = X < threshold
+    eye = np.eye(4)
+
+    for i in range(max_iter):
+        F = np.where(extinct, 0.0, savannas_vec(X, fb, fd, params, threshold = None))
+        residual = np.max(np.abs(F), axis = -1)
+        if np.all(residual < tol):
+            break
+        J = jacobian_vec(X, fb, fd, params)
+        #rows of extinct populations are replaced by the identity, so that they do not move
+        J = np.where(extinct[..., :, None], eye, J)
+        J = np.where(extinct[..., None, :] & ~extinct[..., :, None], 0.0, J)
+        with np.errstate(all = 'ignore'):
+            step = np.linalg.solve(J, F[..., None])[..., 0]
+        X = np.where(np.isfinite(step), X - step, X)
+
+    F = np.where(extinct, 0.0, savannas_vec(X, fb, fd, params, threshold = None))
+
+    return X, np.max(np.abs(F), axis = -1)
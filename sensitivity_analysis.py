@@ -0,0 +1,249 @@
+"""
+Global and local sensitivity analysis of the model with respect to the 12 free parameters in our_parameter_set
+(the preferences for shrubs follow from those for grasses, pSB = 1 - pHB and pSG = 1 - pHG)
+
+Global: Sobol indices (first order and total) from a Saltelli design. For every parameter sample,
+the system is simulated on a grid of fb values from a grassy and an encroached initial state,
+which gives the position and width of the bistable fb window. Samples are generated and
+evaluated in chunks, so that the memory needed does not depend on the total number of evaluations.
+
+Local: derivatives of the equilibrium densities with respect to all parameters, from the implicit
+function theorem: dx*/dp = -J^-1 df/dp.
+
+Output: sobol_indices.csv
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.stats import qmc
+
+import savanna_setup as ss
+
+#preferences for shrubs are not free parameters: pSB = 1 - pHB, pSG = 1 - pHG
+derived_parameters = {'pSB': 'pHB', 'pSG': 'pHG'}
+parameter_names = [p for p in ss.our_parameter_set if p not in derived_parameters]
+
+#initial conditions that lead to the grassy and the encroached state (same as in Fig1b_example_timeseries.py)
+x0_grassy = [1.0, 0.2, 0.5, 0.1]
+x0_encroached = [0.2, 1.0, 0.1, 0.5]
+
+#threshold for shrub density that separates grassy and encroached states
+PS_threshold = 1.3
+
+#-----------------------------------------------------------------------
+#Define functions
+#-----------------------------------------------------------------------
+def default_bounds(rel_range = 0.2):
+
+    """
+    Returns lower and upper bounds of +- rel_range around the standard parameter values.
+    Preferences are kept within [0, 1].
+    """
+
+    values = np.array([ss.our_parameter_set[p] for p in parameter_names], dtype = float)
+    lower = values*(1 - rel_range)
+    upper = values*(1 + rel_range)
+    is_pref = np.array([p.startswith('p') for p in parameter_names])
+    upper[is_pref] = np.minimum(upper[is_pref], 1.0)
+
+    return np.column_stack([lower, upper])
+
+
+def complete_parameters(params):
+
+    "Adds the preferences for shrubs to a dictionary of parameter values that contains those for grasses"
+
+    params = dict(params)
+    for derived, source in derived_parameters.items():
+        if source in params:
+            params[derived] = 1 - np.asarray(params[source])
+    return params
+
+
+def bistability_outcomes(params, fb_vals, fd = 0.0, t_end = 1000, rtol = 1e-5):
+
+    """
+    Simulates every parameter sample (params: dict of arrays of shape (n,)) for all fb values,
+    starting from a grassy and an encroached initial state, in one batch. pSB and pSG are derived from pHB and pHG.
+
+    Returns a dictionary of arrays of shape (n,):
+    - window_lower -> smallest fb value with two different stable states (largest fb value if there is none)
+    - window_width -> length of the fb range with two different stable states
+    - shrub_ratio -> mean shrub ratio of the state reached from the grassy initial state
+    """
+
+    fb_vals = np.asarray(fb_vals, dtype = float)
+    p = {k: np.asarray(v, dtype = float)[:, None, None] for k, v in complete_parameters(params).items()}   # (n, fb, start)
+    x0 = np.array([x0_grassy, x0_encroached])[None, None, :, :]                        # (1, 1, start, 4)
+
+    X = ss.integrate_vec(x0, [0, t_end], fb_vals[None, :, None], fd, p, rtol = rtol)[-1]
+
+    PH = X[..., 0]
+    PS = X[..., 1]
+    encroached = PS > PS_threshold
+    bistable = encroached[..., 0] != encroached[..., 1]
+
+    df_b = fb_vals[1] - fb_vals[0] if len(fb_vals) > 1 else 0.0
+    lower = np.where(bistable.any(axis = 1), fb_vals[np.argmax(bistable, axis = 1)], fb_vals[-1])
+    shrub_ratio = np.mean(PS[..., 0]/(PH[..., 0] + PS[..., 0]), axis = 1)
+
+    return {'window_lower': lower, 'window_width': bistable.sum(axis = 1)*df_b, 'shrub_ratio': shrub_ratio}
+
+
+def saltelli_chunks(n, bounds, chunk_size = 1000, seed = None):
+
+    """
+    Generator for the Saltelli design in chunks of chunk_size base samples.
+    Yields matrices A, B (shape (m, k)) and AB (shape (k, m, k)), where AB[i] is A with column i taken from B.
+    n should be a power of two (Sobol sequence).
+    """
+
+    k = len(bounds)
+    sampler = qmc.Sobol(d = 2*k, scramble = True, seed = seed)
+
+    done = 0
+    while done < n:
+        m = min(chunk_size, n - done)
+        base = qmc.scale(sampler.random(m), np.tile(bounds[:, 0], 2), np.tile(bounds[:, 1], 2))
+        A = base[:, :k]
+        B = base[:, k:]
+        AB = np.repeat(A[None, :, :], k, axis = 0)
+        AB[np.arange(k), :, np.arange(k)] = B.T
+        done = done + m
+        yield A, B, AB
+
+
+def sobol_indices(fA, fB, fAB, n_bootstrap = 200, confidence = 0.95, seed = None):
+
+    """
+    First order (Saltelli 2010) and total (Jansen) Sobol indices with bootstrap confidence intervals.
+    fA, fB -> model outputs for matrices A and B (shape (n,)), fAB -> outputs for AB (shape (k, n))
+    """
+
+    rng = np.random.default_rng(seed)
+    n = len(fA)
+
+    def estimate(idx):
+        a = fA[idx]
+        b = fB[idx]
+        ab = fAB[:, idx]
+        var = np.var(np.concatenate([a, b]))
+        if var == 0:
+            return np.zeros(len(fAB)), np.zeros(len(fAB))
+        S1 = np.mean(b*(ab - a), axis = -1)/var
+        ST = 0.5*np.mean((a - ab)**2, axis = -1)/var
+        return S1, ST
+
+    S1, ST = estimate(np.arange(n))
+
+    boot = [estimate(rng.integers(0, n, n)) for _ in range(n_bootstrap)]
+    S1_boot = np.array([s for s, _ in boot])
+    ST_boot = np.array([s for _, s in boot])
+    q = [(1 - confidence)/2*100, (1 + confidence)/2*100]
+
+    return pd.DataFrame({'S1': S1,
+                         'S1_low': np.percentile(S1_boot, q[0], axis = 0),
+                         'S1_high': np.percentile(S1_boot, q[1], axis = 0),
+                         'ST': ST,
+                         'ST_low': np.percentile(ST_boot, q[0], axis = 0),
+                         'ST_high': np.percentile(ST_boot, q[1], axis = 0)})
+
+
+def global_sensitivity(n = 1024, fb_vals = np.linspace(0.0, 0.8, 17), fd = 0.0, bounds = None,
+                       chunk_size = 256, n_bootstrap = 200, seed = None):
+
+    """
+    Sobol indices of all outputs of bistability_outcomes() for all parameters.
+    The model is evaluated n*(k+2) times, in chunks of chunk_size*(k+2) samples.
+    Returns one data frame with columns output, parameter, S1, ..., ST_high
+    """
+
+    if bounds is None:
+        bounds = default_bounds()
+    k = len(parameter_names)
+
+    fA, fB, fAB = {}, {}, {}
+    start = 0
+    for A, B, AB in saltelli_chunks(n, bounds, chunk_size, seed):
+        m = len(A)
+        #all samples of this chunk are evaluated in one batch
+        samples = np.concatenate([A, B, AB.reshape(-1, k)])
+        outcomes = bistability_outcomes(dict(zip(parameter_names, samples.T)), fb_vals, fd)
+
+        for name, y in outcomes.items():
+            if name not in fA:
+                fA[name] = np.empty(n)
+                fB[name] = np.empty(n)
+                fAB[name] = np.empty((k, n))
+            fA[name][start:start+m] = y[:m]
+            fB[name][start:start+m] = y[m:2*m]
+            fAB[name][:, start:start+m] = y[2*m:].reshape(k, m)
+        start = start + m
+
+    results = []
+    for name in fA:
+        indices = sobol_indices(fA[name], fB[name], fAB[name], n_bootstrap, seed = seed)
+        indices.insert(0, 'parameter', parameter_names)
+        indices.insert(0, 'output', name)
+        results.append(indices)
+
+    return pd.concat(results, ignore_index = True)
+
+
+def local_sensitivities(X, fb, fd = 0.0, params = None, rel_step = 1e-6):
+
+    """
+    Derivatives of the equilibrium densities X (shape (..., 4)) with respect to all free parameters and fb,
+    using the implicit function theorem. df/dp is obtained by central differences of savannas_vec
+    (a change of pHB or pHG also changes pSB or pSG).
+    Returns an array of shape (..., 4, k+1), columns in the order parameter_names + ['fb'].
+    """
+
+    X = np.asarray(X, dtype = float)
+    p = ss.get_parameters(params)
+    J = ss.jacobian_vec(X, fb, fd, params)
+
+    df_dp = []
+    for name in parameter_names + ['fb']:
+        value = np.asarray(fb if name == 'fb' else p[name], dtype = float)
+        step = rel_step*np.maximum(np.abs(value), 1.0)
+        up = dict(p)
+        down = dict(p)
+        fb_up, fb_down = fb, fb
+        if name == 'fb':
+            fb_up, fb_down = value + step, value - step
+        else:
+            up[name] = value + step
+            down[name] = value - step
+        up = complete_parameters(up) if name in derived_parameters.values() else up
+        down = complete_parameters(down) if name in derived_parameters.values() else down
+        diff = ss.savannas_vec(X, fb_up, fd, up, threshold = None) - ss.savannas_vec(X, fb_down, fd, down, threshold = None)
+        df_dp.append(diff/(2*np.asarray(step)[..., None]))
+
+    df_dp = np.stack(df_dp, axis = -1)
+
+    return -np.linalg.solve(J, df_dp)
+
+
+def local_sensitivity_table(points_df, fd = 0.0):
+
+    "Local sensitivities for every row of a table of equilibria, one column per state variable and parameter"
+
+    X = points_df[ss.state_names].to_numpy(dtype = float)
+    S = local_sensitivities(X, points_df['fb'].to_numpy(dtype = float), fd)
+
+    columns = {}
+    for i, var in enumerate(ss.state_names):
+        for j, name in enumerate(parameter_names + ['fb']):
+            columns["d" + var + "/d" + name] = S[:, i, j]
+
+    return pd.concat([points_df.reset_index(drop = True), pd.DataFrame(columns)], axis = 1)
+
+#-----------------------------------------------------------------------
+#Run the global sensitivity analysis
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+
+    indices = global_sensitivity(n = 1024, seed = 1)
+    print(indices.to_string())
+    indices.to_csv("sobol_indices.csv")
@@ -0,0 +1,140 @@
+"""
+Spatially explicit version of the savannas model on a 2-D lattice
+
+The four equations of savanna_setup are evaluated at every cell of a periodic n x n lattice.
+Seed dispersal of grasses and shrubs and movement of browsers and grazers are modelled as diffusion:
+
+dX/dt = savannas(X) + D * Laplacian(X)
+
+Diffusion is treated spectrally (FFT) and implicitly, the local dynamics explicitly (semi-implicit Euler):
+X_hat(t+dt) = (X_hat(t) + dt*F_hat(X(t))) / (1 + dt*D*k^2)
+
+Snapshots are written to a memory-mapped .npy file with shape (n_snapshots, 4, n, n).
+"""
+
+import numpy as np
+from matplotlib import pyplot as plt
+
+import savanna_setup as ss
+
+#threshold for shrub density that separates grassy and encroached states
+PS_threshold = 1.3
+
+#standard diffusion coefficients: grasses, shrubs, browsers, grazers
+D_standard = [0.01, 0.005, 0.1, 0.1]
+
+#-----------------------------------------------------------------------
+#Define functions
+#-----------------------------------------------------------------------
+def wave_numbers(n, length):
+
+    "Squared wave numbers k^2 of a periodic n x n lattice, for use with rfft2"
+
+    kx = 2*np.pi*np.fft.fftfreq(n, d = length/n)
+    ky = 2*np.pi*np.fft.rfftfreq(n, d = length/n)
+    return kx[:, None]**2 + ky[None, :]**2
+
+
+def kinetics(U, fb, fd, params = None):
+
+    "Local dynamics at every cell. U has shape (4, n, n), fb and fd can be scalars or (n, n) arrays"
+
+    dX = ss.savannas_vec(np.moveaxis(U, 0, -1), fb, fd, params)
+    return np.moveaxis(dX, -1, 0)
+
+
+def grassy_with_patch(n, grassy_state, encroached_state, radius = 0.1, dtype = np.float64):
+
+    """
+    Initial lattice in the grassy state, with a circular encroached patch in the centre.
+    radius is given as a fraction of the lattice size.
+    """
+
+    y, x = np.mgrid[0:n, 0:n]
+    patch = (x - n/2)**2 + (y - n/2)**2 < (radius*n)**2
+
+    U = np.empty((4, n, n), dtype = dtype)
+    for i in range(4):
+        U[i] = np.where(patch, encroached_state[i], grassy_state[i])
+    return U
+
+
+def simulate_lattice(U0, t_end, dt, fb, fd = 0.0, D = D_standard, length = 100.0, params = None,
+                     snapshot_every = None, snapshot_file = None, dtype = np.float64):
+
+    """
+    Integrates the reaction-diffusion system from the initial lattice U0 (shape (4, n, n)).
+
+    D -> diffusion coefficients of grasses, shrubs, browsers and grazers
+    length -> side length of the (periodic) domain
+    dtype -> np.float32 halves the memory and speeds up FFTs on large lattices
+    snapshot_every -> time between snapshots; snapshots are written to snapshot_file (.npy, memory-mapped)
+
+    Returns the final lattice and the fraction of encroached cells at every snapshot time
+    (or only at the end, if no snapshots are requested).
+    """
+
+    U = np.array(U0, dtype = dtype)
+    n = U.shape[-1]
+    n_steps = int(round(t_end/dt))
+
+    #denominator of the implicit diffusion step, one for every species
+    k2 = wave_numbers(n, length).astype(dtype)
+    implicit = (1 + dt*np.asarray(D, dtype = dtype)[:, None, None]*k2[None, :, :]).astype(dtype)
+
+    snapshots = None
+    encroached_area = []
+    if snapshot_every is not None:
+        stride = max(int(round(snapshot_every/dt)), 1)
+        n_snap = n_steps//stride + 1
+        if snapshot_file is not None:
+            snapshots = np.lib.format.open_memmap(snapshot_file, mode = 'w+', dtype = dtype, shape = (n_snap, 4, n, n))
+            snapshots[0] = U
+        encroached_area.append(np.mean(U[1] > PS_threshold))
+
+    for step in range(1, n_steps + 1):
+
+        #explicit reaction step, implicit spectral diffusion step
+        U_hat = np.fft.rfft2(U + dt*kinetics(U, fb, fd, params), axes = (-2, -1))
+        U = np.fft.irfft2(U_hat/implicit, s = (n, n), axes = (-2, -1)).astype(dtype, copy = False)
+        U = np.maximum(U, 0)
+
+        if snapshot_every is not None and step % stride == 0:
+            if snapshots is not None:
+                snapshots[step//stride] = U
+            encroached_area.append(np.mean(U[1] > PS_threshold))
+
+    if snapshots is not None:
+        snapshots.flush()
+    if snapshot_every is None:
+        encroached_area.append(np.mean(U[1] > PS_threshold))
+
+    return U, np.array(encroached_area)
+
+#-----------------------------------------------------------------------
+#Example: does an encroached patch spread into the grassy state?
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+
+    fb = 0.35
+    fd = 0
+
+    #grassy and encroached states at fb = 0.35 (see Fig1b_example_timeseries.py)
+    states = ss.integrate_vec([[1.0, 0.2, 0.5, 0.1], [0.2, 1.0, 0.1, 0.5]], [0, 3000], fb, fd)[-1]
+
+    U0 = grassy_with_patch(512, states[0], states[1], dtype = np.float32)
+    U, encroached_area = simulate_lattice(U0, t_end = 500, dt = 0.5, fb = fb, fd = fd, snapshot_every = 10,
+                                          snapshot_file = "output/lattice_snapshots.npy", dtype = np.float32)
+
+    fig = plt.figure(figsize = (12, 5))
+    ax1 = fig.add_subplot(121)
+    ax2 = fig.add_subplot(122)
+    im = ax1.imshow(U[1]/(U[0] + U[1]), vmin = 0, vmax = 1)
+    ax1.set_title("ratio of shrubs within total plant population")
+    plt.colorbar(im, ax = ax1)
+    ax2.plot(np.arange(len(encroached_area))*10, encroached_area)
+    ax2.set_xlabel("Time t")
+    ax2.set_ylabel("encroached area")
+
+    plt.tight_layout()
+    fig.savefig("output/lattice_front.png", dpi = 150)
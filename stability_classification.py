@@ -0,0 +1,107 @@
+"""
+Classifies equilibria by the eigenvalues of their Jacobian matrices
+
+Instead of assuming that simulation end points are stable and XPP points are unstable,
+all Jacobians of a table of equilibria are evaluated in one batch and their eigenvalues
+are computed for the whole stack at once.
+
+Input: any table with columns PH, PS, CB, CG, fb (and optionally fd), e.g.
+- grassy_states_densities.csv
+- encroached_states_densities.csv
+- unstable_fixed_points.csv
+
+Output: the same tables with additional columns
+- stability -> "stable node", "stable focus", "saddle", "unstable node" or "unstable focus"
+- dominant_eigenvalue -> largest real part of all eigenvalues
+- return_rate -> -dominant_eigenvalue (rate at which small perturbations decay)
+- n_unstable -> number of eigenvalues with positive real part
+- state -> "grassy" or "encroached"
+"""
+
+import numpy as np
+import pandas as pd
+
+import savanna_setup as ss
+
+#threshold for shrub density that separates grassy and encroached states (as in equilibrium_densities_stable_points.py)
+PS_threshold = 1.3
+
+#-----------------------------------------------------------------------
+#Define functions
+#-----------------------------------------------------------------------
+def eigenvalues_vec(X, fb, fd, params = None):
+
+    """
+    Returns the eigenvalues of the Jacobians at all states of X (shape (..., 4)) as an array of shape (..., 4)
+    """
+
+    J = ss.jacobian_vec(X, fb, fd, params)
+    return np.linalg.eigvals(J)
+
+
+def stability_type(eigenvalues, tol = 1e-9):
+
+    """
+    Turns a stack of eigenvalues (shape (..., 4)) into stability labels, the dominant eigenvalue
+    and the number of unstable directions
+    """
+
+    real = eigenvalues.real
+    n_unstable = np.sum(real > tol, axis = -1)
+
+    #leading eigenvalue decides between node and focus
+    lead = np.take_along_axis(eigenvalues, np.argmax(real, axis = -1)[..., None], axis = -1)[..., 0]
+    dominant = lead.real
+    oscillating = np.abs(lead.imag) > tol
+
+    labels = np.where(n_unstable == 0, "stable", np.where(n_unstable == eigenvalues.shape[-1], "unstable", "saddle"))
+    kind = np.where(oscillating, " focus", " node")
+    labels = np.where(labels == "saddle", labels, np.char.add(labels.astype(str), kind))
+
+    return labels, dominant, n_unstable
+
+
+def state_label(X, threshold = PS_threshold):
+
+    "grassy/encroached label from the shrub density"
+
+    return np.where(np.asarray(X)[..., 1] > threshold, "encroached", "grassy")
+
+
+def classify_equilibria(points_df, fd = 0.0, params = None):
+
+    """
+    Adds stability type, dominant eigenvalue, return rate and state label to every row of a table of equilibria.
+    If the table has no fd column, the given fd value is used for all rows.
+    """
+
+    X = points_df[ss.state_names].to_numpy(dtype = float)
+    fb_vals = points_df['fb'].to_numpy(dtype = float)
+    fd_vals = points_df['fd'].to_numpy(dtype = float) if 'fd' in points_df else fd
+
+    labels, dominant, n_unstable = stability_type(eigenvalues_vec(X, fb_vals, fd_vals, params))
+
+    results = points_df.copy()
+    results['stability'] = labels
+    results['dominant_eigenvalue'] = dominant
+    results['return_rate'] = -dominant
+    results['n_unstable'] = n_unstable
+    results['state'] = state_label(X)
+
+    return results
+
+#-----------------------------------------------------------------------
+#Classify the fixed points of the three csv files
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+
+    for name in ["grassy_states_densities", "encroached_states_densities", "unstable_fixed_points"]:
+
+        points = pd.read_csv(name + ".csv")
+        points = points.loc[:, ~points.columns.str.startswith('Unnamed')]
+
+        results = classify_equilibria(points)
+        print(name, ":")
+        print(results['stability'].value_counts().to_string())
+
+        results.to_csv(name + "_stability.csv")
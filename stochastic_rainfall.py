@@ -0,0 +1,171 @@
+"""
+Stochastic rainfall forcing: ensembles of the savannas model with environmental noise on plant growth
+
+Rainfall variability enters as multiplicative noise on the intrinsic growth rates rH and rS:
+rH -> rH*(1 + sigma_H*xi_H(t)), rS -> rS*(1 + sigma_S*xi_S(t)), with (possibly correlated) white noise xi.
+The resulting stochastic differential equations are integrated with Euler-Maruyama or Milstein
+for thousands of realisations at once. Every member has its own random stream, so results
+for a member do not depend on the size of the ensemble.
+
+Only ensemble statistics are kept (no full paths):
+- encroachment probability over time (fraction of members with PS > 1.3)
+- mean and standard deviation of all densities over time
+- first passage time of every member into the encroached state
+"""
+
+import numpy as np
+from matplotlib import pyplot as plt
+
+import savanna_setup as ss
+
+#threshold for shrub density that separates grassy and encroached states
+PS_threshold = 1.3
+
+#-----------------------------------------------------------------------
+#Define functions
+#-----------------------------------------------------------------------
+def growth_noise(X, sigma_H, sigma_S, params = None):
+
+    """
+    Diffusion terms g (noise on rH and rS) and their derivatives dg_i/dx_i for a stack of states X (..., 4).
+    Returns two arrays of shape (..., 2) for grasses and shrubs.
+    """
+
+    p = ss.get_parameters(params)
+    PH = X[..., 0]
+    PS = X[..., 1]
+
+    g = np.stack([sigma_H*p['rH']*PH*(1 - (PH + p['c']*PS)/p['KH']),
+                  sigma_S*p['rS']*PS*(1 - (PS + p['c']*PH)/p['KS'])], axis = -1)
+    dg = np.stack([sigma_H*p['rH']*(1 - (2*PH + p['c']*PS)/p['KH']),
+                   sigma_S*p['rS']*(1 - (2*PS + p['c']*PH)/p['KS'])], axis = -1)
+
+    return g, dg
+
+
+def member_streams(n_members, seed = None):
+
+    "One independent random generator per ensemble member"
+
+    return [np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(n_members)]
+
+
+def simulate_ensemble(x0, n_members, t_end, fb, fd = 0.0, sigma_H = 0.1, sigma_S = 0.1, rho = 0.0,
+                      dt = 0.05, scheme = "milstein", record_every = 1.0, seed = None, chunk_steps = 2000,
+                      params = None, threshold = ss.epsilon, callback = None):
+
+    """
+    Integrates n_members realisations of the stochastic model from x0 (shape (4,) or (n_members, 4)).
+    fb and fd can be scalars or arrays of shape (n_members,).
+    rho is the correlation between the noise on grasses and shrubs (both driven by rainfall).
+    scheme -> "euler" (Euler-Maruyama) or "milstein". The Milstein correction uses the diagonal
+    derivatives dg_i/dx_i only, the dependence of the grass noise on shrubs (and vice versa) is neglected.
+    callback -> optional function callback(t, X), called after every step (e.g. to update early-warning indicators)
+
+    Returns a dictionary with
+    - time -> recording times
+    - encroachment_probability -> fraction of members with PS > PS_threshold at each recording time
+    - mean, std -> ensemble mean and standard deviation of all densities, shape (len(time), 4)
+    - first_passage -> first time each member enters the encroached state (nan if it never does)
+    - final -> states of all members at t_end
+    """
+
+    if scheme not in ("euler", "milstein"):
+        raise ValueError("scheme must be 'euler' or 'milstein'")
+
+    X = np.array(np.broadcast_to(x0, (n_members, 4)), dtype = float)
+    streams = member_streams(n_members, seed)
+
+    n_steps = int(round(t_end/dt))
+    record_stride = max(int(round(record_every/dt)), 1)
+    n_records = n_steps//record_stride + 1
+    sqrt_dt = np.sqrt(dt)
+
+    time = np.arange(n_records)*record_stride*dt
+    probability = np.zeros(n_records)
+    mean = np.zeros((n_records, 4))
+    std = np.zeros((n_records, 4))
+    first_passage = np.full(n_members, np.nan)
+
+    def record(k, X):
+        probability[k] = np.mean(X[:, 1] > PS_threshold)
+        mean[k] = X.mean(axis = 0)
+        std[k] = X.std(axis = 0)
+
+    record(0, X)
+    first_passage[X[:, 1] > PS_threshold] = 0.0
+
+    step = 0
+    while step < n_steps:
+
+        #draw the noise of the next chunk of steps, member by member, so every member keeps its own stream
+        m = min(chunk_steps, n_steps - step)
+        Z = np.stack([g.standard_normal((m, 2)) for g in streams], axis = 1)     # (m, n_members, 2)
+        Z[..., 1] = rho*Z[..., 0] + np.sqrt(1 - rho**2)*Z[..., 1]
+
+        for i in range(m):
+            dW = Z[i]*sqrt_dt
+            drift = ss.savannas_vec(X, fb, fd, params, threshold)
+            g, dg = growth_noise(X, sigma_H, sigma_S, params)
+
+            dX = drift*dt
+            incr = g*dW
+            if scheme == "milstein":
+                incr = incr + 0.5*g*dg*(dW**2 - dt)
+            dX[:, :2] = dX[:, :2] + incr
+
+            #extinct populations stay extinct, densities can not become negative
+            alive = X >= threshold
+            X = np.maximum(np.where(alive, X + dX, X), 0.0)
+
+            step = step + 1
+            new = np.isnan(first_passage) & (X[:, 1] > PS_threshold)
+            first_passage[new] = step*dt
+
+            if callback is not None:
+                callback(step*dt, X)
+
+            if step % record_stride == 0:
+                record(step//record_stride, X)
+
+    return {'time': time, 'encroachment_probability': probability, 'mean': mean, 'std': std,
+            'first_passage': first_passage, 'final': X}
+
+
+def first_passage_distribution(first_passage, bins = 50, t_end = None):
+
+    """
+    Histogram (density) of first passage times and the fraction of members that did not make the transition
+    """
+
+    fpt = first_passage[~np.isnan(first_passage)]
+    density, edges = np.histogram(fpt, bins = bins, range = (0, t_end) if t_end else None, density = True)
+
+    return density, edges, 1 - len(fpt)/len(first_passage)
+
+#-----------------------------------------------------------------------
+#Example: noise-induced transitions from the grassy state
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+
+    x0 = [1.2, 0.64, 0.29, 1.45]     # approximately the grassy state at fb = 0.35
+    t_end = 1000
+
+    fig = plt.figure(figsize = (12, 5))
+    ax1 = fig.add_subplot(121)
+    ax2 = fig.add_subplot(122)
+
+    for sigma in [0.2, 0.4, 0.6]:
+        res = simulate_ensemble(x0, 2000, t_end, fb = 0.35, sigma_H = sigma, sigma_S = sigma, rho = 0.5, seed = 1)
+        ax1.plot(res['time'], res['encroachment_probability'], label = "$\\sigma$ = {}".format(sigma))
+        density, edges, never = first_passage_distribution(res['first_passage'], t_end = t_end)
+        ax2.step(edges[:-1], density, where = 'post', label = "$\\sigma$ = {}".format(sigma))
+
+    ax1.set_xlabel("Time t")
+    ax1.set_ylabel("encroachment probability")
+    ax2.set_xlabel("first passage time")
+    ax2.set_ylabel("density")
+    ax1.legend()
+
+    plt.tight_layout()
+    fig.savefig("output/noise_induced_transitions.png", dpi = 150)
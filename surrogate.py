@@ -0,0 +1,342 @@
+"""
+Gaussian-process surrogate of simulated outcomes with active learning near the bistable boundary
+
+An emulator is trained on simulated outcomes and then answers whole batches of queries without simulating:
+- space "fb_fd" -> shrub_ratio and encroachment_probability (fraction of random initial conditions that end
+  in the encroached state), seeded with the grid of Fig. 2a-c
+- space "fb_disturbance" -> shrub_ratio and encroachment_probability after a drought, seeded with the grid of Fig. 4
+- space "critical_disturbance" -> critical drought severity (drought_resistance.py) as a 1-D surrogate over fb,
+  defined only in the bistable region (simulated points without a value are not used for training)
+
+The Gaussian process has a squared exponential kernel with one length scale per input; the hyperparameters
+are fitted by maximising the log marginal likelihood. New simulation points are chosen by active learning:
+from a large set of random candidates, those closest to a contour level (e.g. probability 0.05 or 0.95, the
+edges of the bistable region) relative to the predictive standard deviation are simulated next
+(without contour levels: those with the largest standard deviation).
+For fast batch queries, the trained process can be tabulated on a fine grid and interpolated.
+
+Output: surrogate_fb_fd.csv (training data) and maps of the prediction and its uncertainty
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+from matplotlib import pyplot as plt
+from scipy import interpolate, linalg, optimize
+
+import savanna_setup as ss
+
+#set carrying capacities (used for initial conditions)
+KH = 2     # carrying capacity of producer 1 (grasses)   2
+KS = 3
+
+#threshold for shrub density that separates grassy and encroached states
+PS_threshold = 1.3
+
+#extent of the parameter spaces, as in Fig. 2a-c and Fig. 4
+bounds = {'fb_fd': [(0.0, 0.8), (0.0, 0.8)], 'fb_disturbance': [(0.0, 0.8), (50.0, 99.0)], 'critical_disturbance': [(0.0, 0.8)]}
+
+#define time array for simulations
+t_end = 1000
+t_stationary = np.arange(t_end - 300, t_end + 1, 10)     # stationary part of the time series
+
+#-----------------------------------------------------------------------
+#Simulated outcomes
+#-----------------------------------------------------------------------
+def stationary_outcomes(X):
+
+    "Shrub ratio and encroachment (PS > PS_threshold) of every run, from the stationary part X (shape (len(t), ..., 4))"
+
+    shrub_ratio = X[..., 1].mean(axis = 0)/(X[..., 0] + X[..., 1]).mean(axis = 0)
+    return shrub_ratio, X[-1, ..., 1] > PS_threshold
+
+
+def simulate_fb_fd(points, n_init = 8, seed = 0):
+
+    "Outcomes at points (fb, fd) of shape (n, 2), each from n_init random initial conditions as in Fig. 2a-c"
+
+    points = np.asarray(points, dtype = float)
+    rng = np.random.default_rng(seed)
+    x0 = rng.random((len(points), n_init, 4))*[KH/2, KS, KS/5, KH/2]
+    X = ss.integrate_vec(x0, np.concatenate([[0], t_stationary]), points[:, :1], points[:, 1:])[1:]
+    shrub_ratio, encroached = stationary_outcomes(X)
+
+    return {'shrub_ratio': shrub_ratio.mean(axis = -1), 'encroachment_probability': encroached.mean(axis = -1)}
+
+
+def simulate_fb_disturbance(points, n_init = 8, seed = 0):
+
+    """
+    Outcomes after a drought at points (fb, d) of shape (n, 2), as in Fig. 4: the pre-drought state is reached
+    from the end point of a reference run at fb = 0.3, which starts from n_init random initial conditions.
+    """
+
+    points = np.asarray(points, dtype = float)
+    rng = np.random.default_rng(seed)
+    x0 = rng.random((n_init, 4))*[KH/2, KS/5, KH/5, KS/2]
+    reference = ss.integrate_vec(x0, [0, t_end], 0.3, 0.0)[-1]
+    pre = ss.integrate_vec(np.broadcast_to(reference, (len(points), n_init, 4)), [0, t_end], points[:, :1], 0.0)[-1]
+
+    d = points[:, 1:]/100
+    x0 = pre*np.stack(np.broadcast_arrays(1 - d, 1 - d/5, np.ones_like(d), np.ones_like(d)), axis = -1)
+    X = ss.integrate_vec(x0, np.concatenate([[0], t_stationary]), points[:, :1], 0.0)[1:]
+    shrub_ratio, encroached = stationary_outcomes(X)
+
+    return {'shrub_ratio': shrub_ratio.mean(axis = -1), 'encroachment_probability': encroached.mean(axis = -1)}
+
+
+def simulate_critical_disturbance(points):
+
+    "Critical drought severity at points (fb,) of shape (n, 1), nan outside of the bistable region"
+
+    import drought_resistance as dr
+    return {'critical_disturbance': dr.critical_disturbance(np.asarray(points, dtype = float)[:, 0])['critical_disturbance'].to_numpy()}
+
+
+simulators = {'fb_fd': simulate_fb_fd, 'fb_disturbance': simulate_fb_disturbance,
+              'critical_disturbance': simulate_critical_disturbance}
+
+
+def seed_points(space, num_vals = 40):
+
+    """
+    The parameter grid of Fig. 2a-c (space fb_fd) or Fig. 4 (space fb_disturbance), shape (num_vals**2, 2),
+    or num_vals fb values (space critical_disturbance), shape (num_vals, 1)
+    """
+
+    axes = [np.linspace(lo, hi, num_vals) for lo, hi in bounds[space]]
+    grid = np.meshgrid(*axes)
+    return np.column_stack([values.ravel() for values in grid])
+
+#-----------------------------------------------------------------------
+#Gaussian process
+#-----------------------------------------------------------------------
+class GaussianProcess:
+
+    """
+    Gaussian process regression with a squared exponential kernel.
+
+    bounds -> list of (min, max) for every input, used to scale the inputs to [0, 1]
+    length_scale, signal, noise -> initial hyperparameters (in scaled units, for the standardised outcome)
+    """
+
+    def __init__(self, bounds, length_scale = 0.1, signal = 1.0, noise = 0.05):
+
+        self.bounds = np.asarray(bounds, dtype = float)
+        self.length_scale = np.full(len(self.bounds), float(length_scale))
+        self.signal = signal
+        self.noise = noise
+
+    def scale(self, X):
+        return (np.asarray(X, dtype = float) - self.bounds[:, 0])/(self.bounds[:, 1] - self.bounds[:, 0])
+
+    def kernel(self, A, B, length_scale = None, signal = None):
+
+        "Covariance matrix between the scaled inputs A (shape (n, k)) and B (shape (m, k))"
+
+        length_scale = self.length_scale if length_scale is None else length_scale
+        signal = self.signal if signal is None else signal
+        A = A/length_scale
+        B = B/length_scale
+        sq = np.sum(A**2, axis = 1)[:, None] + np.sum(B**2, axis = 1)[None, :] - 2*A @ B.T
+        return signal**2*np.exp(-0.5*np.maximum(sq, 0.0))
+
+    def negative_log_likelihood(self, theta, Xs, ys):
+
+        "Negative log marginal likelihood for log hyperparameters theta = (log length scales, log signal, log noise)"
+
+        length_scale, signal, noise = np.exp(theta[:-2]), np.exp(theta[-2]), np.exp(theta[-1])
+        K = self.kernel(Xs, Xs, length_scale, signal) + (noise**2 + 1e-8)*np.eye(len(Xs))
+        try:
+            L = linalg.cholesky(K, lower = True)
+        except linalg.LinAlgError:
+            return 1e10
+        alpha = linalg.cho_solve((L, True), ys)
+        return 0.5*ys @ alpha + np.sum(np.log(np.diag(L))) + 0.5*len(Xs)*np.log(2*np.pi)
+
+    def fit(self, X, y, optimise = True, max_points = 400, seed = 0):
+
+        """
+        Conditions the process on the outcomes y at the inputs X (non-finite outcomes are dropped).
+        If optimise is True, the hyperparameters are fitted first, on at most max_points random training points.
+        """
+
+        X = np.asarray(X, dtype = float).reshape(len(y), -1)
+        y = np.asarray(y, dtype = float)
+        finite = np.isfinite(y)
+        self.X = self.scale(X[finite])
+        self.y_mean = y[finite].mean()
+        self.y_std = y[finite].std() if y[finite].std() > 0 else 1.0
+        ys = (y[finite] - self.y_mean)/self.y_std
+
+        if optimise:
+            rng = np.random.default_rng(seed)
+            sub = rng.permutation(len(ys))[:max_points]
+            theta0 = np.log(np.concatenate([self.length_scale, [self.signal, self.noise]]))
+            result = optimize.minimize(self.negative_log_likelihood, theta0, args = (self.X[sub], ys[sub]), method = "L-BFGS-B",
+                                       bounds = [(np.log(1e-3), np.log(10))]*len(self.length_scale) + [(np.log(1e-2), np.log(10)), (np.log(1e-4), np.log(1))])
+            self.length_scale = np.exp(result.x[:-2])
+            self.signal, self.noise = np.exp(result.x[-2]), np.exp(result.x[-1])
+
+        K = self.kernel(self.X, self.X) + (self.noise**2 + 1e-8)*np.eye(len(self.X))
+        self.L = linalg.cholesky(K, lower = True)
+        self.alpha = linalg.cho_solve((self.L, True), ys)
+
+        return self
+
+    def predict(self, X, return_std = True, chunk_size = 10000):
+
+        "Predictive mean (and standard deviation) for a batch of inputs X of shape (n, k)"
+
+        Xs = self.scale(np.asarray(X, dtype = float).reshape(len(X), -1))
+        mean = np.empty(len(Xs))
+        std = np.empty(len(Xs))
+        for start in range(0, len(Xs), chunk_size):
+            Ks = self.kernel(Xs[start:start + chunk_size], self.X)
+            mean[start:start + chunk_size] = Ks @ self.alpha
+            if return_std:
+                v = linalg.solve_triangular(self.L, Ks.T, lower = True)
+                std[start:start + chunk_size] = np.sqrt(np.maximum(self.signal**2 - np.sum(v**2, axis = 0), 0.0))
+
+        if not return_std:
+            return mean*self.y_std + self.y_mean
+        return mean*self.y_std + self.y_mean, std*self.y_std
+
+    def tabulate(self, n = 256):
+
+        """
+        Predictive mean and standard deviation on a regular grid of n points per input, returned as a function
+        X -> (mean, std) that interpolates linearly between grid points. Meant for inputs of low dimension,
+        where it answers large batches of queries much faster than predict().
+        """
+
+        axes = [np.linspace(lo, hi, n) for lo, hi in self.bounds]
+        grid = np.stack(np.meshgrid(*axes, indexing = 'ij'), axis = -1)
+        mean, std = self.predict(grid.reshape(-1, len(axes)))
+        mean_table = interpolate.RegularGridInterpolator(axes, mean.reshape(grid.shape[:-1]))
+        std_table = interpolate.RegularGridInterpolator(axes, std.reshape(grid.shape[:-1]))
+
+        def query(X):
+            X = np.clip(np.asarray(X, dtype = float).reshape(len(X), -1), self.bounds[:, 0], self.bounds[:, 1])
+            return mean_table(X), std_table(X)
+
+        return query
+
+#-----------------------------------------------------------------------
+#Active learning
+#-----------------------------------------------------------------------
+def boundary_acquisition(mean, std, levels):
+
+    "Distance to the closest contour level in units of the predictive standard deviation (small = informative)"
+
+    distance = np.min(np.abs(mean[:, None] - np.asarray(levels)[None, :]), axis = 1)
+    return distance/np.maximum(std, 1e-12)
+
+
+def select_batch(candidates, score, gp, batch_size, min_distance = 0.02):
+
+    "The batch_size candidates with the lowest score, at least min_distance (scaled units) apart"
+
+    order = np.argsort(score)
+    scaled = gp.scale(candidates)
+    chosen = []
+    for i in order:
+        if all(np.linalg.norm(scaled[i] - scaled[j]) >= min_distance for j in chosen):
+            chosen.append(i)
+        if len(chosen) == batch_size:
+            break
+    return candidates[chosen]
+
+
+def active_learning(gp, simulator, outcome, X, y, levels = (0.05, 0.95), n_rounds = 5, batch_size = 40,
+                    n_candidates = 5000, refit_every = 1, seed = 0):
+
+    """
+    Adds n_rounds batches of simulations to the training data (X, y) of one outcome, each at the candidates
+    closest to the contour levels (levels = None: with the largest predictive standard deviation).
+    simulator(points) returns a dictionary of outcomes. Points with outcome nan are kept in X and y but not
+    used for training, and candidates whose nearest simulated point is nan are not simulated.
+    Returns the trained process, the extended training data and one row per round with the number of training
+    points and the mean predictive standard deviation at the selected points.
+    """
+
+    rng = np.random.default_rng(seed)
+    X = np.asarray(X, dtype = float)
+    y = np.asarray(y, dtype = float)
+    defined = np.isfinite(y)
+    gp.fit(X[defined], y[defined])
+    history = []
+
+    for k in range(n_rounds):
+        candidates = gp.bounds[:, 0] + rng.random((n_candidates, len(gp.bounds)))*(gp.bounds[:, 1] - gp.bounds[:, 0])
+        if not np.all(defined):
+            distance = np.linalg.norm(gp.scale(candidates)[:, None, :] - gp.scale(X)[None, :, :], axis = -1)
+            candidates = candidates[defined[np.argmin(distance, axis = 1)]]
+        mean, std = gp.predict(candidates)
+        score = -std if levels is None else boundary_acquisition(mean, std, levels)
+        new = select_batch(candidates, score, gp, batch_size)
+        history.append([k, len(X), np.mean(gp.predict(new)[1])])
+
+        X = np.concatenate([X, new])
+        y = np.concatenate([y, simulator(new)[outcome]])
+        defined = np.isfinite(y)
+        gp.fit(X[defined], y[defined], optimise = (k + 1) % refit_every == 0)
+
+    return gp, X, y, pd.DataFrame(history, columns = ['round', 'n_train', 'mean_std_selected'])
+
+#-----------------------------------------------------------------------
+#Surrogate of the encroachment probability over fb and fd (Fig. 2a-c)
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+
+    space, outcome = 'fb_fd', 'encroachment_probability'
+    X = seed_points(space)
+    n_seed = len(X)
+    start = time.perf_counter()
+    y = simulators[space](X)[outcome]
+    print("seed simulations: {:.1f} s".format(time.perf_counter() - start))
+
+    gp = GaussianProcess(bounds[space])
+    gp, X, y, history = active_learning(gp, simulators[space], outcome, X, y)
+    print(history.to_string())
+    pd.DataFrame({'fb': X[:, 0], 'fd': X[:, 1], outcome: y}).to_csv("surrogate_" + space + ".csv")
+
+    #batch queries
+    fb, fd = np.meshgrid(np.linspace(0, 0.8, 200), np.linspace(0, 0.8, 200))
+    queries = np.column_stack([fb.ravel(), fd.ravel()])
+    start = time.perf_counter()
+    mean, std = gp.predict(queries)
+    print("prediction time per query: {:.1f} microseconds".format(1e6*(time.perf_counter() - start)/len(queries)))
+
+    query = gp.tabulate()
+    start = time.perf_counter()
+    mean_table, std_table = query(queries)
+    print("tabulated: {:.2f} microseconds per query, largest difference {:.1e}".format(
+        1e6*(time.perf_counter() - start)/len(queries), np.max(np.abs(mean_table - mean))))
+
+    label_size = 20
+    fig = plt.figure(figsize = (14, 6))
+    for k, (values, title) in enumerate([(mean, "encroachment probability"), (std, "predictive standard deviation")]):
+        ax = fig.add_subplot(1, 2, k + 1)
+        im = ax.pcolor(fb, fd, values.reshape(fb.shape))
+        ax.plot(X[n_seed:, 0], X[n_seed:, 1], 'w.', markersize = 3)     # actively learned points
+        ax.set_title(title, fontsize = label_size)
+        ax.set_xlabel('farmer support $f_{b}$', fontsize = label_size)
+        ax.set_ylabel('farmer support $f_{d}$', fontsize = label_size)
+        plt.colorbar(im, ax = ax)
+    plt.tight_layout()
+    fig.savefig("output/surrogate_" + space + ".png", dpi = 150)
+
+    #1-D surrogate of the critical drought severity, learned where its predictive uncertainty is largest
+    space, outcome = 'critical_disturbance', 'critical_disturbance'
+    X = seed_points(space, num_vals = 17)
+    y = simulators[space](X)[outcome]
+    gp = GaussianProcess(bounds[space])
+    gp, X, y, history = active_learning(gp, simulators[space], outcome, X, y, levels = None, n_rounds = 3, batch_size = 4)
+    print(history.to_string())
+    check = np.linspace(0.35, 0.7, 8)[:, None]
+    mean, std = gp.predict(check)
+    print(pd.DataFrame({'fb': check[:, 0], 'simulated': simulators[space](check)[outcome],
+                        'surrogate': mean, 'std': std}).to_string())
+    pd.DataFrame({'fb': X[:, 0], outcome: y}).to_csv("surrogate_" + space + ".csv")
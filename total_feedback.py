@@ -18,6 +18,8 @@ import numpy as np
 import random as rd
 import pandas as pd
 
+import feedback_loops as fl
+
 #-----------------------------------------------------------------------
 #Define functions
 #----------------------------------------------------------------------
@@ -86,50 +88,10 @@ def find_savannah_loop_weights(A):
     calculates the loop weights of all loops (n > 1) in the system  
     """
     
-    #----------------------------------------------
-    #2-link loops:
-    #a12a21: positive loop between grasses and shrubs
-    l2_1 = (A[1,0]*A[0,1])**(1/2)
-    
-    #a13a31: weak negative loop between grasses and browsers
-    l2_2 = (abs(A[0,2]*A[2,0]))**(1/2)
-    
-    #a14a41: strong negative loop between grasses and grazers
-    l2_3 = (abs(A[0,3]*A[3,0]))**(1/2)
-    
-    #a23a32: strong negative loop between shrubs and browsers
-    l2_4 = (abs(A[1,2]*A[2,1]))**(1/2)
-    
-    #a24a42: weak negative loop between shrubs and grasses
-    l2_5 = (abs(A[1,3]*A[3,1]))**(1/2)
-    
-    #----------------------------------------------
-    #3-link loops:
-    #grasses -> shrubs -> grazers -> grasses: a21a42a14
-    l3_1 = (A[1,0]*A[3,1]*A[0,3])**(1/3)
-    
-    #grasses -> grazers -> shrubs -> grasses: a41a24a21
-    l3_2 = (A[3,0]*A[1,3]*A[1,0])**(1/3)
-    
-    #grasses -> browsers -> shrubs -> grasses: a31a23a12
-    l3_3 = (A[2,0]*A[1,2]*A[0,1])**(1/3)
-    
-    #grasses -> shrubs -> browsers -> grasses:a21a32a13
-    l3_4 = (A[1,0]*A[2,1]*A[0,2])**(1/3)
-    
-    #--------------------------------------------------
-    #4-link loops:
-    #grasses -> grazers -> shrubs -> browser -> grasses: a41a24a32a13
-    l4_1 = (A[3,0]*A[1,3]*A[2,1]*A[0,2])**(1/4)
-    
-    #grasses -> browsers -> shrubs -> grazers -> grasses: a31a23a42a14
-    l4_2 = (A[2,0]*A[1,2]*A[3,1]*A[0,3])**(1/4)
-    
-    
-    #combine values into list
-    results = [l2_1, -l2_2, -l2_3,-l2_4,-l2_5,l3_1,l3_2, l3_3,l3_4, l4_1,l4_2]
+    #loops are enumerated from the sparsity pattern of the Jacobian (see feedback_loops.py)
+    weights, names = fl.loop_weights(A, fl.savanna_pattern)
    
-    return(results)
+    return(list(weights))
 
 
 def get_all_Fks(points_df, f_values):
@@ -159,7 +121,7 @@ def get_all_Fks(points_df, f_values):
         all_loops.append(loop_list)
 
     #turn results into a dataframe
-    loop_names = ["a12a21", "a13a31","a14a41", "a23a32","a24a42","a21a42a14", "a41a24a12","a31a23a12", "a21a32a13","a41a24a32a13", "a31a23a42a14"]
+    loop_names = fl.loop_index(fl.savanna_pattern)[2]
     all_Fks = pd.DataFrame(all_Fks, columns = ["F1", "F2", "F3", "F4"])
     loops = pd.DataFrame(all_loops, columns = loop_names)
 
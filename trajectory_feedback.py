@@ -0,0 +1,130 @@
+"""
+Time-resolved feedback analysis along transient trajectories
+
+total_feedback.py evaluates the total feedback values F1-F4 and the loop weights at the fixed points only.
+Here the same quantities are evaluated at every stored time point of a simulation (e.g. the output of
+simulate_droughts() in Fig3_timeseries_transitions.py), which shows which loops drive a transition while
+it is happening. All time points are analysed as one batch:
+- Jacobians from savanna_setup.jacobian_vec() -> stack of shape (T, 4, 4)
+- F1-F4 from the characteristic polynomial, F_k = -(coefficient k of np.poly(J)) as in total_feedback.py,
+  computed from the traces of the powers of J (Newton's identities) for the whole stack
+- loop weights of all feedback loops (feedback_loops.py)
+- leading eigenvalue (largest real part, and its imaginary part)
+
+Output: trajectory_feedback.csv and a plot of the loop weights during the transitions of Fig. 3a
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+from matplotlib import pyplot as plt
+
+import savanna_setup as ss
+import feedback_loops as fl
+
+#-----------------------------------------------------------------------
+#Define functions
+#-----------------------------------------------------------------------
+def total_feedback_vec(J):
+
+    """
+    Total feedback values F1, ..., Fn for a stack of matrices J (shape (..., n, n)), same as total_feedback() in
+    total_feedback.py. Returns an array of shape (..., n).
+    """
+
+    n = J.shape[-1]
+    #traces of J, J^2, ..., J^n
+    power = J
+    traces = [np.trace(J, axis1 = -2, axis2 = -1)]
+    for k in range(1, n):
+        power = power @ J
+        traces.append(np.trace(power, axis1 = -2, axis2 = -1))
+
+    #elementary symmetric polynomials of the eigenvalues (Newton's identities)
+    e = [np.ones(J.shape[:-2])]
+    for k in range(1, n + 1):
+        e.append(sum((-1)**(m - 1)*e[k - m]*traces[m - 1] for m in range(1, k + 1))/k)
+
+    #np.poly(J)[k] = (-1)^k e_k and F_k = -np.poly(J)[k]
+    return np.stack([(-1)**(k + 1)*e[k] for k in range(1, n + 1)], axis = -1)
+
+
+def feedback_along_trajectory(N, fb, fd = 0.0, t = None, params = None, pattern = fl.savanna_pattern):
+
+    """
+    Feedback analysis at every state of a trajectory N (shape (T, 4)). fb and fd can be scalars or arrays of
+    length T (e.g. from section_support()). Returns a data frame with the time, the state, F1-F4, all loop weights
+    and the leading eigenvalue at every time point.
+    """
+
+    N = np.asarray(N, dtype = float)
+    J = ss.jacobian_vec(N, fb, fd, params)
+
+    F = total_feedback_vec(J)
+    weights, names = fl.loop_weights(J, pattern)
+    eigenvalues = np.linalg.eigvals(J)
+    lead = np.take_along_axis(eigenvalues, np.argmax(eigenvalues.real, axis = -1)[..., None], axis = -1)[..., 0]
+
+    results = pd.DataFrame(N, columns = ss.state_names)
+    results.insert(0, 'time', np.arange(len(N)) if t is None else t)
+    results[['F1', 'F2', 'F3', 'F4']] = F
+    results[names] = weights
+    results['leading_eigenvalue'] = lead.real
+    results['leading_eigenvalue_imag'] = lead.imag
+
+    return results
+
+
+def section_support(values, season_length):
+
+    """
+    Value of farmer support at every row of the output of simulate_droughts(): the initial state, season_length
+    rows per section and the state after the drought at the end of each section, which starts the next section
+    """
+
+    values = np.asarray(values, dtype = float)
+    rows = [values[:1]]
+    for k in range(len(values)):
+        rows.append(np.full(season_length, values[k]))
+        rows.append(values[min(k + 1, len(values) - 1)][None])
+    return np.concatenate(rows)
+
+#-----------------------------------------------------------------------
+#Feedback loops during the transitions of Fig. 3a
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+
+    import parareal as pr
+
+    f_values = [0, 0, 0.35, 0.35, 0, 0]
+    d_values = [0.95, 0, 0.95, 0, 0, 0]
+    introduce_browsers = [0, 0, 0, 0, 1, 0]
+    season_length = 1000
+
+    N = pr.simulate_droughts_serial(len(f_values), season_length, [1.0, 0.2, 0.5, 0.1], f_values, d_values, introduce_browsers)
+    fb = section_support(f_values, season_length)
+
+    start = time.perf_counter()
+    results = feedback_along_trajectory(N, fb, 0.0)
+    print("{} time points: {:.1f} ms".format(len(N), 1000*(time.perf_counter() - start)))
+    results.to_csv("trajectory_feedback.csv")
+
+    label_size = 20
+    loops = [column for column in results.columns if column.startswith('a')]
+    fig, axes = plt.subplots(3, 1, figsize = (15, 12), sharex = True)
+    axes[0].plot(results['time'], results['PH'], 'g', label = "Grasses ($P_H$)")
+    axes[0].plot(results['time'], results['PS'], 'y', label = "Shrubs ($P_S$)")
+    axes[0].plot(results['time'], results['CB'], 'r', label = "Browsers ($C_B$)")
+    axes[0].plot(results['time'], results['CG'], 'm', label = "Grazers ($C_G$)")
+    axes[0].set_ylabel("Population density", fontsize = label_size)
+    for loop in loops:
+        axes[1].plot(results['time'], results[loop], label = loop)
+    axes[1].set_ylabel("loop weight [1/t]", fontsize = label_size)
+    axes[2].plot(results['time'], results['leading_eigenvalue'], 'k')
+    axes[2].axhline(y = 0, color = "grey")
+    axes[2].set_ylabel("leading eigenvalue", fontsize = label_size)
+    axes[2].set_xlabel("Time t", fontsize = label_size)
+    for ax in axes[:2]:
+        ax.legend(bbox_to_anchor = (1.02, 1), loc = 2)
+    fig.savefig("output/trajectory_feedback.png", dpi = 150, bbox_inches = 'tight')
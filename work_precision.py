@@ -0,0 +1,259 @@
+"""
+Work-precision benchmark of solver and tolerance choices
+
+A tight-tolerance reference (DOP853, rtol = 1e-12) is computed for a representative set of cases (fb, fd, x0) taken from
+the figure scripts. Every available solver/tolerance combination is then compared to the reference:
+
+- error in the equilibrium densities (end point of the run)
+- error in the shrub ratio (stationary part, as in Fig. 2a-c)
+- error in the total feedback values F1-F4 at the end point (as in total_feedback.py)
+- error in the weights of the feedback loops at the end point (as in feedback_loops.py)
+- agreement of the grassy/encroached classification (PS > 1.3)
+
+against wall time and the number of right hand side evaluations.
+Combinations that are not beaten by any other combination in both error and time form the Pareto front.
+
+Output: work_precision.csv and work_precision.png
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+from matplotlib import pyplot as plt
+from scipy import integrate as integ
+
+import feedback_loops as fl
+import savanna_setup as ss
+
+#threshold for shrub density that separates grassy and encroached states
+PS_threshold = 1.3
+
+#set carrying capacities (used for initial conditions)
+KH = 2     # carrying capacity of producer 1 (grasses)   2
+KS = 3
+
+#define time array for simulations
+t_end = 1000
+t = np.arange(0, t_end, 1.0)
+
+#runs that need more right hand side evaluations than this count as failed
+max_nfev = 200000
+
+#-----------------------------------------------------------------------
+#Define functions
+#-----------------------------------------------------------------------
+def representative_cases(n_random = 20, seed = 1):
+
+    """
+    Cases (fb, fd, x0) from the figure scripts:
+    - both initial conditions of Fig1b_example_timeseries.py
+    - random initial conditions and farmer support as in Fig2a-c_heatmaps_bistable_region.py
+    - post-drought states as in Fig4_resistance_to_drought_heatmap.py
+    """
+
+    rng = np.random.default_rng(seed)
+    cases = [(0.35, 0.0, [1.0, 0.2, 0.5, 0.1]), (0.35, 0.0, [0.2, 1.0, 0.1, 0.5])]
+
+    for i in range(n_random):
+        x0 = [KH/2*rng.random(), KS*rng.random(), KS/5*rng.random(), KH/2*rng.random()]
+        cases.append((0.8*rng.random(), 0.8*rng.random(), x0))
+
+    x_ref = integ.odeint(ss.savannas, [KH/4, KS/10, KH/10, KS/4], t, args = (0.3, 0))[-1]
+    for fb, d in [(0.4, 90), (0.5, 75), (0.6, 60)]:
+        x_pre = integ.odeint(ss.savannas, x_ref, t, args = (fb, 0))[-1]
+        cases.append((fb, 0.0, list(x_pre*[1 - d/100, 1 - d/500, 1, 1])))
+
+    return cases
+
+
+def solver_configurations(tolerances = (1e-3, 1e-4, 1e-5, 1e-6, 1e-7, 1e-8, 1e-9)):
+
+    "All solver/tolerance combinations: odeint, the methods of solve_ivp and the batched integrator"
+
+    configs = []
+    for tol in tolerances:
+        configs.append(("odeint", tol))
+        for method in ["RK45", "DOP853", "LSODA", "BDF", "Radau"]:
+            configs.append((method, tol))
+        configs.append(("integrate_vec", tol))
+    return configs
+
+
+def solver_jacobian(x, fb, fd):
+
+    "Analytic Jacobian for the solvers, rows of populations below the extinction threshold are zero (as their derivatives in ss.savannas)"
+
+    x = np.asarray(x, dtype = float)
+    return np.where((x < ss.epsilon)[:, None], 0.0, ss.jacobian_vec(x, fb, fd))
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+def run_case(solver, tol, fb, fd, x0):
+
+    """
+    One run, returns the time series and the number of right hand side evaluations.
+    The implicit methods get the analytic Jacobian (with the extinction threshold). Runs that exceed max_nfev return None.
+    """
+
+    if solver == "odeint":
+        X, info = integ.odeint(ss.savannas, x0, t, args = (fb, fd), rtol = tol, atol = tol*1e-3, full_output = True,
+                               Dfun = lambda x, s, fb, fd: solver_jacobian(x, fb, fd), mxstep = max_nfev//len(t))
+        return (X if info['message'] == 'Integration successful.' else None), int(info['nfe'][-1])
+
+    n_calls = [0]
+
+    def rhs(s, x):
+        n_calls[0] += 1
+        if n_calls[0] > max_nfev:
+            raise BudgetExceeded
+        return ss.savannas(x, s, fb, fd)
+
+    options = {}
+    if solver in ["LSODA", "BDF", "Radau"]:
+        options['jac'] = lambda s, x: solver_jacobian(x, fb, fd)
+    try:
+        sol = integ.solve_ivp(rhs, (t[0], t[-1]), x0, method = solver, t_eval = t, rtol = tol, atol = tol*1e-3, **options)
+    except BudgetExceeded:
+        return None, n_calls[0]
+    return (sol.y.T if sol.success else None), n_calls[0]
+
+
+def run_batch(tol, cases):
+
+    "All cases at once with the batched integrator, returns the time series and the number of right hand side evaluations"
+
+    fb = np.array([c[0] for c in cases])
+    fd = np.array([c[1] for c in cases])
+    x0 = np.array([c[2] for c in cases])
+    n_calls = [0]
+
+    def rhs(X, tm):
+        n_calls[0] += 1
+        return ss.savannas_vec(X, fb, fd)
+
+    X = ss.dopri_vec(rhs, x0, t, rtol = tol, atol = tol*1e-3)
+    return X, n_calls[0]*len(cases)
+
+
+def outcome_metrics(X, fb, fd):
+
+    "End state, shrub ratio, classification, total feedback F1-F4 and loop weights of a time series X (shape (len(t), 4))"
+
+    x_end = X[-1]
+    PH, PS = X[-300:, 0], X[-300:, 1]
+    shrub_ratio = np.mean(PS)/np.mean(PH + PS) if np.mean(PH + PS) > 0 else 0.0
+    J = ss.jacobian_vec(x_end, fb, fd)
+    F = -np.poly(J)[1:]
+    loops = fl.loop_weights(J, fl.savanna_pattern)[0]
+
+    return {'x_end': x_end, 'shrub_ratio': shrub_ratio, 'encroached': np.mean(PS) > PS_threshold, 'F': F,
+            'loop_weights': loops}
+
+
+def pareto_front(cost, error):
+
+    "True for all points that are not dominated (lower cost and lower error) by another point"
+
+    cost = np.asarray(cost)
+    error = np.asarray(error)
+    dominated = (cost[None, :] <= cost[:, None]) & (error[None, :] <= error[:, None]) & \
+                ((cost[None, :] < cost[:, None]) | (error[None, :] < error[:, None]))
+    return ~dominated.any(axis = 1)
+
+
+def work_precision(cases = None, configs = None, reference_tol = 1e-12):
+
+    """
+    Runs all solver configurations on all cases and compares them to the reference.
+    Returns one row per configuration with the largest errors over all cases, the fraction of
+    misclassified cases, the number of failed runs, the total wall time and the total number of right hand side evaluations.
+    A configuration with failed runs has infinite error.
+    """
+
+    if cases is None:
+        cases = representative_cases()
+    if configs is None:
+        configs = solver_configurations()
+
+    reference = []
+    for fb, fd, x0 in cases:
+        sol = integ.solve_ivp(lambda s, x: ss.savannas(x, s, fb, fd), (t[0], t[-1]), x0, method = "DOP853",
+                              t_eval = t, rtol = reference_tol, atol = reference_tol*1e-2)
+        reference.append(outcome_metrics(sol.y.T, fb, fd))
+
+    rows = []
+    for solver, tol in configs:
+        start = time.perf_counter()
+        if solver == "integrate_vec":
+            X_all, nfev = run_batch(tol, cases)
+            runs = [X_all[:, k] for k in range(len(cases))]
+        else:
+            runs = []
+            nfev = 0
+            for fb, fd, x0 in cases:
+                X, n = run_case(solver, tol, fb, fd, x0)
+                runs.append(X)
+                nfev += n
+        wall_time = time.perf_counter() - start
+
+        err_x, err_ratio, err_F, err_loops, wrong, failed = 0.0, 0.0, 0.0, 0.0, 0, 0
+        for (fb, fd, x0), X, ref in zip(cases, runs, reference):
+            if X is None or not np.all(np.isfinite(X)):
+                err_x, err_ratio, err_F, err_loops, failed = np.inf, np.inf, np.inf, np.inf, failed + 1
+                continue
+            m = outcome_metrics(X, fb, fd)
+            err_x = max(err_x, np.max(np.abs(m['x_end'] - ref['x_end'])))
+            err_ratio = max(err_ratio, abs(m['shrub_ratio'] - ref['shrub_ratio']))
+            err_F = max(err_F, np.max(np.abs(m['F'] - ref['F'])))
+            err_loops = max(err_loops, np.max(np.abs(m['loop_weights'] - ref['loop_weights'])))
+            wrong += m['encroached'] != ref['encroached']
+
+        rows.append([solver, tol, wall_time, nfev, err_x, err_ratio, err_F, err_loops, wrong/len(cases), failed])
+
+    results = pd.DataFrame(rows, columns = ['solver', 'rtol', 'wall_time', 'nfev', 'error_densities', 'error_shrub_ratio',
+                                            'error_feedback', 'error_loop_weights', 'misclassified', 'failed'])
+    results['pareto_time'] = pareto_front(results['wall_time'], results['error_densities'])
+    results['pareto_nfev'] = pareto_front(results['nfev'], results['error_densities'])
+
+    return results
+
+#-----------------------------------------------------------------------
+#Work-precision diagrams
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+
+    results = work_precision()
+    results.to_csv("work_precision.csv")
+    print(results.loc[results['pareto_time']].sort_values('wall_time').to_string())
+
+    fig = plt.figure(figsize = (24, 10))
+    panels = [('wall_time', 'error_densities', 'error in equilibrium densities'),
+              ('wall_time', 'error_shrub_ratio', 'error in shrub ratio'),
+              ('wall_time', 'error_feedback', 'error in total feedback $F_k$'),
+              ('wall_time', 'error_loop_weights', 'error in feedback loop weights'),
+              ('nfev', 'error_densities', 'error in equilibrium densities'),
+              ('wall_time', 'misclassified', 'fraction of misclassified cases')]
+    for k, (cost, metric, label) in enumerate(panels):
+        ax = fig.add_subplot(2, 4, k + 1)
+        for solver, data in results.groupby('solver'):
+            ax.plot(data[cost], data[metric], 'o-', label = solver)
+        front = results.loc[pareto_front(results[cost], results[metric])].sort_values(cost)
+        ax.plot(front[cost], front[metric], 'k--', label = 'Pareto front')
+        ax.set_xscale('log')
+        #the classification error is often exactly 0
+        if metric == 'misclassified':
+            ax.set_ylim(-0.02, 1.02)
+        else:
+            ax.set_yscale('log')
+        ax.set_xlabel('wall time [s]' if cost == 'wall_time' else 'right hand side evaluations')
+        ax.set_ylabel(label)
+    handles, labels = ax.get_legend_handles_labels()
+    fig.add_subplot(2, 4, 7).axis('off')
+    fig.add_subplot(2, 4, 8).axis('off')
+    fig.legend(handles, labels, loc = 'center', bbox_to_anchor = (0.75, 0.27))
+    plt.tight_layout()
+    fig.savefig("output/work_precision.png", dpi = 150)